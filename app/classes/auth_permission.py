@@ -1,10 +1,11 @@
 from dataclasses import dataclass
-from typing import Callable, List, Literal,Dict,NotRequired
+from typing import Callable, Iterable, List, Literal,Dict,NotRequired
 from pydantic import BaseModel
 from typing_extensions import TypedDict
 from enum import Enum
 
 from app.definition._error import BaseError
+from app.classes.prefix_trie import PrefixTrie
 
 PermissionScope= Literal['custom','all']
 
@@ -22,6 +23,27 @@ class Role(Enum):
     CONTACTS = 'CONTACTS'
 
 
+# NOTE the bit of a role is its position in `Role`, new roles must be appended at the end of the enum
+ROLE_BITS: dict[Role, int] = {role: 1 << i for i, role in enumerate(Role)}
+ALL_ROUTES = None
+
+def roles_to_mask(roles: Iterable[Role | str]) -> int:
+    mask = 0
+    for role in roles:
+        mask |= ROLE_BITS[role if isinstance(role, Role) else Role._member_map_[role]]
+    return mask
+
+def mask_to_roles(mask: int) -> list[Role]:
+    return [role for role, bit in ROLE_BITS.items() if mask & bit]
+
+
+@dataclass(slots=True, frozen=True)
+class RouteACL:
+    required: int
+    excluded: int
+    options: tuple[Callable, ...]
+
+
 class FuncMetaData(TypedDict):
     operation_id:str
     roles:set[Role]
@@ -44,13 +66,16 @@ class AuthPermission(TypedDict):
     domain_name:str=None # TODO accept sudomains 
     client_id: str= None # TODO
     application_id: str = None # TODO
-    roles:list[str]
+    roles:NotRequired[list[str]] # NOTE tokens issued before role_mask, decoded into the mask
+    role_mask:NotRequired[int]
     issued_for: str # Subnets
     created_at: float
     expired_at: float
     allowed_routes: Dict[str, RoutePermission]
     #allowed_assets:Dict[str,AssetsPermission]
     allowed_assets:List[str]
+    route_index:NotRequired[Dict[str, frozenset[str] | None]] # NOTE built once the token is verified, never encoded
+    asset_trie:NotRequired[PrefixTrie] # NOTE built once the token is verified, never encoded
 
 
 class TokensModel(BaseModel):
@@ -68,7 +93,8 @@ class WSPathNotFoundError(BaseError):
 
 def MustHave(role:Role):
 
+    bit = ROLE_BITS[role]
     def verify(authPermission:AuthPermission):
-        return role.value in authPermission
+        return authPermission['role_mask'] & bit != 0
 
     return verify
@@ -0,0 +1,36 @@
+from hashlib import blake2b
+import math
+
+
+class BloomFilter:
+    """
+    Fixed size bloom filter sized for `capacity` items at the `error_rate` false positive rate. The k bit positions of
+    an item come from the two halves of one blake2b digest (double hashing), a lookup is one hash and k bit tests.
+    """
+
+    def __init__(self, capacity: int = 100_000, error_rate: float = 0.01) -> None:
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        digest = blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    def clear(self):
+        self.bits = bytearray(len(self.bits))
+        self.count = 0
@@ -12,6 +12,9 @@ from redbeat.schedules import rrule
 from celery.schedules import solar
 from celery.schedules import crontab
 from inspect import signature
+from dataclasses import dataclass, field
+from threading import Event, Lock, Thread
+from typing import Callable
 
 class CeleryTaskNotFoundError(BaseError):
     ...
@@ -77,3 +80,146 @@ class CeleryTask(TypedDict):
     task_id:Optional[str] = None
     heaviness:TaskHeaviness
 
+
+
+@dataclass
+class WorkerState:
+    hostname: str
+    alive: bool = True
+    active: int = 0
+    reserved: int = 0
+    processed: int = 0
+    freq: float = 2.0
+    last_heartbeat: float = field(default_factory=time.time)
+
+
+class CeleryWorkerMonitor:
+    """
+    Live table of the celery workers fed by their heartbeat events, consumed in a dedicated thread so the event loop
+    never waits on the broker. A second thread refreshes the reserved and queued counts and drops the workers whose
+    heartbeats stopped. The counters can be read from the request path without any broker round trip.
+    """
+
+    def __init__(self, app, interval: float = 5, on_change: Callable[[int], None] = None) -> None:
+        self.app = app
+        self.interval = interval
+        self.on_change = on_change
+        self.workers: dict[str, WorkerState] = {}
+        self.queued: dict[str, int] = {}
+        self.available_workers_count = -1 # NOTE unknown until the first update
+        self.lock = Lock()
+        self.stop_event = Event()
+        self.receiver = None
+        self.threads: list[Thread] = []
+
+    def start(self):
+        if any(thread.is_alive() for thread in self.threads):
+            return
+        self.stop_event.clear()
+        self.threads = [Thread(target=self._consume_events, name='celery-events', daemon=True),
+                        Thread(target=self._refresh, name='celery-inspect', daemon=True)]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.receiver is not None:
+            self.receiver.should_stop = True
+
+    def _consume_events(self):
+        handlers = {
+            'worker-online': self._on_heartbeat,
+            'worker-heartbeat': self._on_heartbeat,
+            'worker-offline': self._on_offline,
+        }
+        retry = 1
+        while not self.stop_event.is_set():
+            try:
+                with self.app.connection_for_read() as connection:
+                    self.receiver = self.app.events.Receiver(connection, handlers=handlers)
+                    retry = 1
+                    self.receiver.capture(limit=None, timeout=None, wakeup=True)
+            except Exception:
+                # NOTE the broker is not reachable, every worker is considered lost until the events come back
+                self._set_all_offline()
+                self.stop_event.wait(retry)
+                retry = min(retry * 2, 60)
+
+    def _on_heartbeat(self, event: dict):
+        hostname = event['hostname']
+        with self.lock:
+            worker = self.workers.get(hostname)
+            if worker is None:
+                worker = self.workers[hostname] = WorkerState(hostname)
+            worker.alive = True
+            worker.active = event.get('active', worker.active)
+            worker.processed = event.get('processed', worker.processed)
+            worker.freq = event.get('freq', worker.freq)
+            worker.last_heartbeat = time.time()
+        self._update_count()
+
+    def _on_offline(self, event: dict):
+        with self.lock:
+            worker = self.workers.get(event['hostname'])
+            if worker is not None:
+                worker.alive = False
+        self._update_count()
+
+    def _set_all_offline(self):
+        with self.lock:
+            for worker in self.workers.values():
+                worker.alive = False
+        self._update_count()
+
+    def _refresh(self):
+        while not self.stop_event.wait(self.interval):
+            self._expire()
+            try:
+                self._refresh_reserved()
+                self._refresh_queued()
+            except Exception:
+                ...
+
+    def _expire(self):
+        now = time.time()
+        with self.lock:
+            for worker in self.workers.values():
+                # NOTE same rule as celery.events.state: a worker missing two heartbeats is considered offline
+                if worker.alive and now - worker.last_heartbeat > worker.freq * 2 + 1:
+                    worker.alive = False
+        self._update_count()
+
+    def _refresh_reserved(self):
+        if not self.available_workers_count:
+            return
+        reserved = self.app.control.inspect(timeout=1).reserved() or {}
+        with self.lock:
+            for hostname, tasks in reserved.items():
+                if hostname in self.workers:
+                    self.workers[hostname].reserved = len(tasks)
+
+    def _refresh_queued(self):
+        queue = self.app.conf.task_default_queue
+        with self.app.connection_for_read() as connection:
+            message_count = connection.default_channel.queue_declare(queue=queue, passive=True).message_count
+        with self.lock:
+            self.queued[queue] = message_count
+
+    def _update_count(self):
+        with self.lock:
+            count = sum(1 for worker in self.workers.values() if worker.alive)
+            changed = count != self.available_workers_count
+            self.available_workers_count = count
+        if changed and self.on_change is not None:
+            self.on_change(count)
+
+    @property
+    def table(self) -> dict[str, dict[str, Any]]:
+        with self.lock:
+            return {
+                'workers': {hostname: {'alive': worker.alive, 'active': worker.active, 'reserved': worker.reserved,
+                                       'processed': worker.processed, 'last_heartbeat': worker.last_heartbeat}
+                            for hostname, worker in self.workers.items()},
+                'queued': dict(self.queued),
+                'available_workers_count': self.available_workers_count,
+            }
@@ -0,0 +1,145 @@
+from threading import Event, Lock, Thread
+import time
+from typing import Any
+from redis import Redis
+from redis.exceptions import RedisError
+from app.classes.auth_permission import ROLE_BITS, Role
+
+KEY = 'token_generations'
+CHANNEL = 'token_generations:rotated'
+CLIENT_PREFIX = 'client:'
+ROLE_PREFIX = 'role:'
+RECONNECT_DELAY = 1
+
+
+class GenerationMap:
+    """
+    Generations scoped to a client (`issued_for`) or to a role, next to the global generation id: each scope maps to
+    the time it was last rotated, the tokens of the scope created before that are no longer valid. Rotating a scope
+    only makes its own clients authenticate again.
+
+    The map is persisted in the meta of the config file and, when redis is given, shared by every process through a
+    hash and the rotations published on a channel. Without redis a rotation only reaches the process receiving it.
+    A check is one dict lookup for the client and one for the role mask of the token, the latest rotation of each mask
+    being kept until a role is rotated again.
+    """
+
+    def __init__(self, redis: Redis | None, retention: float = 36000000) -> None:
+        self.redis = redis
+        self.retention = retention
+        self.rotations: dict[str, float] = {}
+        self.role_rotations: list[float] = [0.0] * len(ROLE_BITS)
+        self.mask_rotations: dict[int, float] = {}
+        self.lock = Lock()
+        self.stop_event = Event()
+        self.thread: Thread | None = None
+
+    def start(self):
+        if self.redis is None or (self.thread is not None and self.thread.is_alive()):
+            return
+        self.stop_event.clear()
+        self.thread = Thread(target=self._listen, name='token-generations', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def after_fork(self):
+        self.lock = Lock()
+        self.thread = None
+        self.start()
+
+    def load(self, rotations: dict[str, float]):
+        """
+        Replace the map, dropping the rotations older than the lifetime of a token
+        """
+        oldest = time.time() - self.retention
+        role_rotations = [0.0] * len(ROLE_BITS)
+        kept = {}
+        for scope, rotated_at in rotations.items():
+            rotated_at = float(rotated_at)
+            if rotated_at < oldest:
+                continue
+            kept[scope] = rotated_at
+            if scope.startswith(ROLE_PREFIX):
+                role = Role._member_map_.get(scope[len(ROLE_PREFIX):])
+                if role is not None:
+                    role_rotations[ROLE_BITS[role].bit_length() - 1] = rotated_at
+        with self.lock:
+            self.rotations = kept
+            self.role_rotations = role_rotations
+            self.mask_rotations = {}
+
+    def merge(self, rotations: dict[str, float]):
+        """
+        Keep the latest rotation of each scope between the map and `rotations`
+        """
+        for scope, rotated_at in rotations.items():
+            self._set(scope, float(rotated_at))
+
+    def _set(self, scope: str, rotated_at: float):
+        with self.lock:
+            self.rotations[scope] = max(rotated_at, self.rotations.get(scope, 0.0))
+            if scope.startswith(ROLE_PREFIX):
+                role = Role._member_map_.get(scope[len(ROLE_PREFIX):])
+                if role is not None:
+                    index = ROLE_BITS[role].bit_length() - 1
+                    self.role_rotations[index] = max(rotated_at, self.role_rotations[index])
+                    self.mask_rotations = {}
+
+    def _listen(self):
+        while not self.stop_event.is_set():
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(CHANNEL)
+                # NOTE merged with the map loaded from the config file, the hash is empty on the first deployment
+                self.load({**self.rotations, **{scope.decode(): float(rotated_at) for scope, rotated_at in self.redis.hgetall(KEY).items()}})
+                while not self.stop_event.is_set():
+                    message = pubsub.get_message(timeout=1)
+                    if message is not None:
+                        scope, rotated_at = message['data'].decode().rsplit('|', 1)
+                        self._set(scope, float(rotated_at))
+            except RedisError:
+                self.stop_event.wait(RECONNECT_DELAY)
+            finally:
+                pubsub.close()
+
+    def rotate(self, scope: str) -> float:
+        rotated_at = time.time()
+        self._set(scope, rotated_at)
+        if self.redis is not None:
+            pipeline = self.redis.pipeline()
+            pipeline.hset(KEY, scope, rotated_at)
+            pipeline.publish(CHANNEL, f'{scope}|{rotated_at}')
+            pipeline.execute()
+        return rotated_at
+
+    def rotate_client(self, client_id: str) -> float:
+        return self.rotate(CLIENT_PREFIX + client_id)
+
+    def rotate_role(self, role: Role) -> float:
+        return self.rotate(ROLE_PREFIX + role.value)
+
+    def _mask_rotation(self, role_mask: int) -> float:
+        # NOTE a rotation replaces the cache, a value computed meanwhile lands in the dropped one
+        cache = self.mask_rotations
+        rotated_at = cache.get(role_mask)
+        if rotated_at is None:
+            role_rotations = self.role_rotations
+            rotated_at = max((role_rotations[i] for i in range(len(role_rotations)) if role_mask >> i & 1), default=0.0)
+            cache[role_mask] = rotated_at
+        return rotated_at
+
+    def is_outdated(self, client_id: str, role_mask: int, created_at: float) -> bool:
+        return created_at <= self.rotations.get(CLIENT_PREFIX + client_id, 0.0) or created_at <= self._mask_rotation(role_mask)
+
+    @property
+    def data(self) -> dict[str, float]:
+        return dict(self.rotations)
+
+    @property
+    def metrics(self) -> dict[str, Any]:
+        return {
+            'scopes': len(self.rotations),
+            'listening': self.thread is not None and self.thread.is_alive(),
+        }
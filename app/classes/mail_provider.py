@@ -1,7 +1,11 @@
 import smtplib as smtp
 import imaplib as imap
+import os
+import time
+from collections import deque
+from threading import BoundedSemaphore, Lock
 from enum import Enum
-from typing import Literal
+from typing import Callable, Literal
 from .mail_oauth_access import GoogleFlowType,MailOAuthFactory
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
@@ -77,6 +81,160 @@ class IMAPConfig (EmailConnInterface, Enum):
     ).strip() == "ssl" else IMAP_NORMAL_PORT
 
 
+class SMTPConnectionPool:
+    """
+    Bounded pool of connected and authenticated `smtplib.SMTP` sessions for one host/account.
+
+    Idle sessions are kept in a LIFO stack so the warmest one is reused first. A session idle for more than
+    `keepalive` seconds is probed with NOOP before being handed out, and the pool is safe to share between threads.
+    Sessions inherited through a fork are dropped without sending QUIT since the socket belongs to the parent.
+    """
+
+    def __init__(self, factory: Callable[[], smtp.SMTP | None], closer: Callable[[smtp.SMTP], None], max_size: int = 4, keepalive: float = 60, idle_timeout: float = 300, acquire_timeout: float = 30):
+        self.factory = factory
+        self.closer = closer
+        self.max_size = max_size
+        self.keepalive = keepalive
+        self.idle_timeout = idle_timeout
+        self.acquire_timeout = acquire_timeout
+
+        self._idle: deque[tuple[smtp.SMTP, float]] = deque()
+        self._lock = Lock()
+        self._slots = BoundedSemaphore(max_size)
+        self._pid = os.getpid()
+
+        self.hits = 0
+        self.misses = 0
+        self.reconnects = 0
+
+    def _check_fork(self):
+        if self._pid == os.getpid():
+            return
+        self.after_fork()
+
+    def after_fork(self):
+        # NOTE the lock might have been held by a thread of the parent at the time of the fork
+        self._lock = Lock()
+        self._idle.clear()
+        self._slots = BoundedSemaphore(self.max_size)
+        self._pid = os.getpid()
+
+    @staticmethod
+    def is_alive(connector: smtp.SMTP) -> bool:
+        try:
+            code, _ = connector.noop()
+            return code == 250
+        except (smtp.SMTPException, OSError):
+            return False
+
+    def _pop_idle(self) -> smtp.SMTP | None:
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                connector, last_used = self._idle.pop()
+
+            idle_for = time.monotonic() - last_used
+            if idle_for < self.keepalive:
+                return connector
+            if idle_for < self.idle_timeout and self.is_alive(connector):
+                return connector
+            self.closer(connector)
+
+    def acquire(self) -> smtp.SMTP | None:
+        self._check_fork()
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            return None
+
+        connector = self._pop_idle()
+        with self._lock:
+            if connector is not None:
+                self.hits += 1
+                return connector
+            self.misses += 1
+
+        connector = self.factory()
+        if connector is None:
+            self._slots.release()
+        return connector
+
+    def release(self, connector: smtp.SMTP, discard: bool = False):
+        if discard:
+            self.closer(connector)
+        else:
+            with self._lock:
+                self._idle.append((connector, time.monotonic()))
+        self._slots.release()
+
+    def reconnect(self, connector: smtp.SMTP) -> smtp.SMTP | None:
+        """
+        Discard a session the server dropped and hand back a freshly authenticated one in the same slot
+        """
+        self.closer(connector)
+        with self._lock:
+            self.reconnects += 1
+        connector = self.factory()
+        if connector is None:
+            self._slots.release()
+        return connector
+
+    def _pop_stale(self, now: float) -> tuple[smtp.SMTP, float] | None:
+        with self._lock:
+            if not self._idle:
+                return None
+            connector, last_used = self._idle[0]
+            if now - last_used < self.keepalive:
+                return None
+            return self._idle.popleft()
+
+    def ping_idle(self):
+        """
+        Send NOOP on the idle sessions that reached the keepalive interval and drop the dead or expired ones.
+
+        The sessions are probed one at a time, oldest first, each one holding a slot while it is out of the idle stack
+        so a concurrent acquire waits for it instead of opening a session beyond `max_size`
+        """
+        self._check_fork()
+        with self._lock:
+            pending = len(self._idle)
+
+        for _ in range(pending):
+            if not self._slots.acquire(blocking=False):
+                return # NOTE every slot is in use, the stale sessions are probed when acquired
+            try:
+                now = time.monotonic()
+                stale = self._pop_stale(now)
+                if stale is None:
+                    return
+                connector, last_used = stale
+                if now - last_used < self.idle_timeout and self.is_alive(connector):
+                    with self._lock:
+                        self._idle.append((connector, time.monotonic()))
+                else:
+                    self.closer(connector)
+            finally:
+                self._slots.release()
+
+    def close(self):
+        with self._lock:
+            idle = list(self._idle)
+            self._idle.clear()
+        for connector, _ in idle:
+            self.closer(connector)
+
+    @property
+    def metrics(self):
+        with self._lock:
+            idle = len(self._idle)
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'reconnects': self.reconnects,
+            'idle': idle,
+            'max_size': self.max_size,
+        }
+
+
 class MailAPI:
     ...
 
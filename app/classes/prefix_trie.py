@@ -0,0 +1,31 @@
+from typing import Iterable
+
+
+class PrefixTrie:
+    """
+    Index of path prefixes, `allows(path)` is `path.startswith(tuple(prefixes))`.
+
+    The trie is kept flattened on the depths where a prefix ends: one set of prefixes and their distinct lengths, a
+    lookup is one slice and one hashed set lookup per distinct length, whatever the number of prefixes. A prefix
+    covered by a shorter one is dropped.
+    """
+
+    __slots__ = ('prefixes', 'lengths')
+
+    def __init__(self, prefixes: Iterable[str] = ()) -> None:
+        kept: list[str] = []
+        for prefix in sorted(set(prefixes), key=len):
+            if not prefix.startswith(tuple(kept)):
+                kept.append(prefix)
+        self.prefixes = frozenset(kept)
+        self.lengths = tuple(sorted({len(prefix) for prefix in kept}))
+
+    def allows(self, path: str) -> bool:
+        prefixes = self.prefixes
+        for length in self.lengths:
+            if path[:length] in prefixes:
+                return True
+        return False
+
+    def __bool__(self) -> bool:
+        return bool(self.prefixes)
@@ -0,0 +1,212 @@
+from dataclasses import dataclass
+import os
+from threading import Lock
+import time
+from typing import Callable
+from limits import RateLimitItem
+from limits.storage import MemoryStorage
+from limits.strategies import MovingWindowRateLimiter, RateLimiter
+from limits.util import WindowStats
+from redis import Redis
+from redis.exceptions import RedisError
+from slowapi import Limiter
+
+KEY_PREFIX = 'rate_limit:'
+
+# NOTE GCRA: the key holds the theoretical arrival time (tat) of the next request, a full bucket lets `period` seconds of
+# requests in at once. The script first gives back the `refund` tokens a process leased but did not use, then grants up
+# to `requested` tokens but never less than `minimum`, and returns
+# [granted, tokens left, seconds until the bucket is full again, seconds until `minimum` tokens are available]
+GCRA_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local emission = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local minimum = tonumber(ARGV[4])
+local refund = tonumber(ARGV[5])
+
+local tat = tonumber(redis.call('GET', KEYS[1]) or now) - refund * emission
+if tat < now then
+    tat = now
+end
+
+local allowed = math.floor((now + period - tat) / emission + 1e-9)
+local granted = 0
+if allowed >= minimum and requested > 0 then
+    granted = math.min(requested, allowed)
+    tat = tat + granted * emission
+end
+if granted > 0 or refund > 0 then
+    if tat > now then
+        redis.call('SET', KEYS[1], tostring(tat), 'PX', math.ceil((tat - now) * 1000))
+    else
+        redis.call('DEL', KEYS[1])
+    end
+end
+
+local retry_after = 0
+if granted == 0 then
+    retry_after = math.max(tat + minimum * emission - period - now, 0)
+end
+return {granted, allowed - granted, tostring(tat - now), tostring(retry_after)}
+"""
+
+
+@dataclass
+class LocalBucket:
+    tokens: int = 0
+    expires_at: float = 0
+    deny_until: float = 0
+    remaining: int = 0
+    reset_at: float = 0
+
+
+class DistributedRateLimiter(RateLimiter):
+    """
+    Rate limit strategy shared by every process through atomic GCRA scripts on redis.
+
+    Each process leases a batch of tokens from redis and admits the next requests from its local bucket, so most
+    requests never reach redis. The batch is a fraction of the limit, small limits go to redis on every hit. A denied
+    key is refused locally until a token is available again. When redis is not reachable the limits fall back to a
+    per-process moving window.
+
+    A lease expires after `lease_ttl`, its unused tokens are given back with the next lease of the key by the same
+    process. Until then, or when the key is not hit again, they stay out of the limit, so N processes can hold up to
+    N batches of a limit that nobody spends.
+    """
+
+    def __init__(self, redis: Redis, batch_max: int = 50, lease_ttl: float = 5) -> None:
+        super().__init__(MemoryStorage())
+        self.redis = redis
+        self.script = redis.register_script(GCRA_SCRIPT)
+        self.batch_max = batch_max
+        self.lease_ttl = lease_ttl
+        self.fallback = MovingWindowRateLimiter(self.storage)
+        self.buckets: dict[str, LocalBucket] = {}
+        self.lock = Lock()
+        self.local_hits = 0
+        self.local_rejects = 0
+        self.redis_calls = 0
+        self.fallback_hits = 0
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # NOTE the tokens leased by the parent would be spent once per child, the children lease their own
+        self.lock = Lock()
+        self.buckets = {}
+
+    def batch_for(self, item: RateLimitItem) -> int:
+        return max(1, min(self.batch_max, item.amount // 100))
+
+    def _lease(self, item: RateLimitItem, key: str, requested: int, minimum: int, refund: int = 0) -> LocalBucket:
+        period = item.get_expiry()
+        granted, remaining, reset_after, retry_after = self.script(keys=[KEY_PREFIX + key],
+                                                                   args=[period / item.amount, period, requested, minimum, refund])
+        self.redis_calls += 1
+        now = time.time()
+        bucket = LocalBucket(int(granted), now + min(period, self.lease_ttl), 0, int(remaining), now + float(reset_after))
+        if not granted:
+            bucket.deny_until = now + float(retry_after)
+        return bucket
+
+    def hit(self, item: RateLimitItem, *identifiers: str, cost: int = 1) -> bool:
+        key = item.key_for(*identifiers)
+        now = time.time()
+        refund = 0
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is not None:
+                if bucket.tokens >= cost and now < bucket.expires_at:
+                    bucket.tokens -= cost
+                    self.local_hits += 1
+                    return True
+                if now < bucket.deny_until:
+                    self.local_rejects += 1
+                    return False
+                # NOTE the tokens left in the bucket are given back to the other processes by the next lease
+                refund, bucket.tokens = bucket.tokens, 0
+        try:
+            bucket = self._lease(item, key, max(cost, self.batch_for(item)), cost, refund)
+        except RedisError:
+            self.fallback_hits += 1
+            return self.fallback.hit(item, *identifiers, cost=cost)
+
+        with self.lock:
+            self.buckets[key] = bucket
+            if bucket.tokens < cost:
+                return False
+            bucket.tokens -= cost
+            return True
+
+    def test(self, item: RateLimitItem, *identifiers: str, cost: int = 1) -> bool:
+        key = item.key_for(*identifiers)
+        now = time.time()
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is not None:
+                if bucket.tokens >= cost and now < bucket.expires_at:
+                    return True
+                if now < bucket.deny_until:
+                    return False
+        try:
+            return self._lease(item, key, 0, cost).remaining >= cost
+        except RedisError:
+            return self.fallback.test(item, *identifiers, cost=cost)
+
+    def get_window_stats(self, item: RateLimitItem, *identifiers: str) -> WindowStats:
+        # NOTE answered from the last lease, the headers do not cost a redis round trip
+        with self.lock:
+            bucket = self.buckets.get(item.key_for(*identifiers))
+        if bucket is None:
+            return WindowStats(int(time.time()), item.amount)
+        return WindowStats(int(bucket.reset_at), bucket.remaining + bucket.tokens)
+
+    def clear(self, item: RateLimitItem, *identifiers: str) -> None:
+        key = item.key_for(*identifiers)
+        with self.lock:
+            self.buckets.pop(key, None)
+        self.fallback.clear(item, *identifiers)
+        try:
+            self.redis.delete(KEY_PREFIX + key)
+        except RedisError:
+            ...
+
+    @property
+    def metrics(self):
+        return {
+            'local_hits': self.local_hits,
+            'local_rejects': self.local_rejects,
+            'redis_calls': self.redis_calls,
+            'fallback_hits': self.fallback_hits,
+            'keys': len(self.buckets),
+        }
+
+
+class DistributedLimiter(Limiter):
+    """
+    slowapi Limiter whose limits are enforced by `DistributedRateLimiter` once configured with a redis url,
+    the routes keep declaring their limits with `UseLimiter`
+    """
+
+    def __init__(self, key_func: Callable[..., str], **kwargs) -> None:
+        super().__init__(key_func, **kwargs)
+        self.configured = False
+
+    def configure(self, redis_url: str | None = None, batch_max: int = 50, lease_ttl: float = 5):
+        """
+        Set the strategy once, the limits declared before keep working since it is read on every request
+        """
+        if self.configured:
+            return
+        self.configured = True
+        if redis_url:
+            # NOTE slowapi has no public hook for the strategy, it reads this attribute on every request: the version
+            # is pinned in the requirements
+            self._limiter = DistributedRateLimiter(Redis.from_url(redis_url), batch_max, lease_ttl)
+
+    @property
+    def metrics(self):
+        if isinstance(self._limiter, DistributedRateLimiter):
+            return self._limiter.metrics
+        return None
@@ -0,0 +1,155 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from threading import Lock
+import time
+import traceback
+from typing import Any
+from starlette.background import BackgroundTask
+from app.classes.celery import TaskHeaviness
+from app.definition._error import BaseError
+from app.utils.prettyprint import PrettyPrinter_
+
+
+class TaskQueueFullError(BaseError):
+    ...
+
+
+@dataclass
+class HeavinessPool:
+    heaviness: TaskHeaviness
+    workers: int
+    capacity: int
+    threads: ThreadPoolExecutor
+    queue: asyncio.Queue | None = None
+    tasks: list[asyncio.Task] = field(default_factory=list)
+    pending: int = 0  # NOTE reserved by a request or waiting in the queue
+    running: int = 0
+    completed: int = 0
+    failed: int = 0
+    rejected: int = 0
+    wait_time: float = 0
+    max_wait_time: float = 0
+    run_time: float = 0
+    max_run_time: float = 0
+
+
+class BoundedTaskExecutor:
+    """
+    In process executor of the background tasks, one bounded queue and a fixed number of workers per `TaskHeaviness`.
+
+    A slot is reserved in the queue of the task heaviness when the request adds the task, so a full queue is refused
+    while the request can still answer 503, and the task only enters the queue once the response is sent. The blocking
+    tasks run on a thread pool of the same size as the workers of their heaviness, a burst of heavy tasks never takes
+    the threads of the light ones. Each heavier class gets half the workers and queue slots of the previous one.
+
+    The tasks of a same request run concurrently and in no particular order, a task must not rely on the ones added
+    before it by the request.
+    """
+
+    def __init__(self, max_workers: int = 8, max_queue_size: int = 256) -> None:
+        self.max_workers = max_workers
+        self.max_queue_size = max_queue_size
+        self.lock = Lock()
+        self.pools = self._create_pools()
+
+    def _create_pools(self) -> dict[TaskHeaviness, HeavinessPool]:
+        pools = {}
+        for heaviness in TaskHeaviness:
+            shift = heaviness.value - 1
+            workers = max(1, self.max_workers >> shift)
+            pools[heaviness] = HeavinessPool(heaviness, workers, max(1, self.max_queue_size >> shift),
+                                             ThreadPoolExecutor(workers, thread_name_prefix=f'bkg-{heaviness.name.lower()}'))
+        return pools
+
+    def reserve(self, heaviness: TaskHeaviness):
+        pool = self.pools[heaviness]
+        with self.lock:
+            if pool.pending >= pool.capacity:
+                pool.rejected += 1
+                raise TaskQueueFullError(heaviness)
+            pool.pending += 1
+
+    def release(self, heaviness: TaskHeaviness):
+        pool = self.pools[heaviness]
+        with self.lock:
+            pool.pending -= 1
+
+    def submit(self, heaviness: TaskHeaviness, task: BackgroundTask):
+        """
+        Queue a task whose slot was reserved, from the event loop
+        """
+        pool = self.pools[heaviness]
+        if pool.queue is None:
+            pool.queue = asyncio.Queue()  # NOTE bounded by the reservations
+            pool.tasks = [asyncio.create_task(self._work(pool)) for _ in range(pool.workers)]
+        pool.queue.put_nowait((time.perf_counter(), task))
+
+    async def _work(self, pool: HeavinessPool):
+        loop = asyncio.get_running_loop()
+        while True:
+            enqueued_at, task = await pool.queue.get()
+            started_at = time.perf_counter()
+            with self.lock:
+                pool.pending -= 1
+                pool.running += 1
+                waited = started_at - enqueued_at
+                pool.wait_time += waited
+                pool.max_wait_time = max(pool.max_wait_time, waited)
+            try:
+                if task.is_async:
+                    await task.func(*task.args, **task.kwargs)
+                else:
+                    await loop.run_in_executor(pool.threads, partial(task.func, *task.args, **task.kwargs))
+                failed = False
+            except Exception as e:
+                failed = True
+                self._report_failure(pool, task, e)
+
+            elapsed = time.perf_counter() - started_at
+            with self.lock:
+                pool.running -= 1
+                pool.failed += failed
+                pool.completed += not failed
+                pool.run_time += elapsed
+                pool.max_run_time = max(pool.max_run_time, elapsed)
+
+    @staticmethod
+    def _report_failure(pool: HeavinessPool, task: BackgroundTask, error: Exception):
+        name = getattr(task.func, '__qualname__', repr(task.func))
+        if PrettyPrinter_.headless:
+            PrettyPrinter_.event('background_task_failed', task=name, heaviness=pool.heaviness.name, error=repr(error),
+                                 traceback=''.join(traceback.format_exception(error)))
+        else:
+            PrettyPrinter_.error(f'[{name}] - Background task failed: {error!r}', saveable=False)
+
+    def after_fork(self):
+        # NOTE the queues belong to the loop of the parent and its threads are gone
+        self.lock = Lock()
+        self.pools = self._create_pools()
+
+    @property
+    def count(self) -> int:
+        return sum(pool.pending + pool.running for pool in self.pools.values())
+
+    @property
+    def metrics(self) -> dict[str, Any]:
+        metrics = {}
+        for heaviness, pool in self.pools.items():
+            done = pool.completed + pool.failed
+            started = done + pool.running
+            metrics[heaviness.name] = {
+                'workers': pool.workers,
+                'capacity': pool.capacity,
+                'depth': pool.pending,
+                'running': pool.running,
+                'completed': pool.completed,
+                'failed': pool.failed,
+                'rejected': pool.rejected,
+                'avg_wait_time': pool.wait_time / started if started else 0.0,
+                'max_wait_time': pool.max_wait_time,
+                'avg_run_time': pool.run_time / done if done else 0.0,
+                'max_run_time': pool.max_run_time,
+            }
+        return metrics
@@ -1,6 +1,6 @@
 
 from enum import Enum
-from typing import Any
+from typing import Any, Callable
 from bs4 import BeautifulSoup, PageElement, Tag, element
 from app.definition._error import BaseError
 from app.utils.schema import HtmlSchemaBuilder
@@ -8,9 +8,10 @@ from app.utils.helper import strict_parseToBool, flatten_dict
 from app.utils.validation import CustomValidator
 # import fitz as pdf
 from cerberus import DocumentError, SchemaError
-from googletrans import Translator
+from app.classes.translation import TranslationMemory
 import os
 import re
+from html import escape, unescape
 from app.utils.prettyprint import printJSON
 from cerberus import schema_registry
 
@@ -24,7 +25,10 @@ class XMLLikeParser(Enum):
 ROUTE_SEP = "-"
 VALIDATION_CSS_SELECTOR = "head > validation"
 VALIDATION_REGISTRY_SELECTOR = "validation-registry"
+PLACEHOLDER_REGEX = re.compile(r"\{\{\{\s*([^{}]+?)\s*\}\}\}|\{\{\s*([^{}]+?)\s*\}\}")
 def BODY_SELECTOR(select): return f"body {select}"
+PLACEHOLDER_TOKEN = "[[{}]]"
+UNTRANSLATED_TAGS = frozenset(("style", "script"))
 # ============================================================================================================
 
 
@@ -36,9 +40,79 @@ class TemplateBuildError(BaseError):
 
 class TemplateValidationError(BaseError):
     ...
+
+class AssetNotFoundError(BaseError):
+    ...
 # ============================================================================================================
 
 
+class CompiledContent():
+    """
+    Content split once into static segments and placeholder slots so a render is a single join.
+
+    `{{key}}` is replaced by the html escaped value and `{{{key}}}` by the raw value. Keys use the `flatten_dict`
+    syntax (`parent->child`) and are unescaped since the html5 formatter turns `->` into `-&gt;`. A placeholder
+    without a matching key is left untouched.
+    """
+
+    def __init__(self, content: str) -> None:
+        self.statics: list[str] = []
+        self.slots: list[tuple[str, bool]] = []
+        self.placeholders: list[str] = []
+
+        position = 0
+        for match in PLACEHOLDER_REGEX.finditer(content):
+            self.statics.append(content[position:match.start()])
+            raw_key, key = match.group(1), match.group(2)
+            if raw_key is not None:
+                self.slots.append((unescape(raw_key), False))
+            else:
+                self.slots.append((unescape(key), True))
+            self.placeholders.append(match.group(0))
+            position = match.end()
+        self.statics.append(content[position:])
+        self.keys = frozenset(key for key, _ in self.slots)
+
+    def render(self, flattened_data: dict[str, Any], value_func: Callable[[str], str] = None) -> str:
+        parts = [self.statics[0]]
+        for i, (key, escaped) in enumerate(self.slots):
+            if key in flattened_data:
+                value = flattened_data[key]
+                value = value_func(value) if value_func is not None and isinstance(value, str) else str(value)
+                parts.append(escape(value) if escaped else value)
+            else:
+                parts.append(self.placeholders[i])
+            parts.append(self.statics[i + 1])
+        return "".join(parts)
+
+
+def translate_html(content: str, memory: TranslationMemory, dest: str, src: str = 'auto') -> str:
+    """
+    Translate the text nodes of the html, the style and script ones excepted. A node is sent whole with its placeholders
+    swapped for numbered tokens so the sentence keeps its context, a node whose tokens do not come back intact is kept
+    untranslated
+    """
+    bs4 = BeautifulSoup(content, XMLLikeParser.LXML.value)
+    for node in bs4.find_all(string=True):
+        # NOTE the comments, doctype and cdata are NavigableString subclasses
+        if type(node) is not element.NavigableString or node.isspace() or node.parent.name in UNTRANSLATED_TAGS:
+            continue
+        placeholders: list[str] = []
+
+        def tokenize(match: re.Match) -> str:
+            placeholders.append(match.group(0))
+            return PLACEHOLDER_TOKEN.format(len(placeholders) - 1)
+
+        translated = memory.translate_segment(PLACEHOLDER_REGEX.sub(tokenize, str(node)), dest, src)
+        tokens = [PLACEHOLDER_TOKEN.format(i) for i in range(len(placeholders))]
+        if any(translated.count(token) != 1 for token in tokens):
+            continue
+        for token, placeholder in zip(tokens, placeholders):
+            translated = translated.replace(token, placeholder)
+        node.replace_with(translated)
+    return bs4.decode(formatter="html5")
+
+
 class Asset():
     def __init__(self, filename: str, content: str, dirName: str) -> None:
         super().__init__()
@@ -53,12 +127,12 @@ class Asset():
 
 class Template(Asset):
     LANG = None
+    LANGUAGES: list[str] = []
+    TRANSLATION_MEMORY: TranslationMemory = None
 
     def __init__(self, filename: str, content: str, dirName: str) -> None:
         super().__init__(filename, content, dirName)
         self.keys: list[str] = []
-        self.translator = Translator(
-            ['translate.google.com', 'translate.google.com'])
         self.load()
 
     def inject(self, data:  dict) -> bool:
@@ -120,25 +194,24 @@ class HTMLTemplate(Template):
         self.images: list[tuple[str, str]] = []
         self.image_needed: list[str] = []
         self.content_to_inject = None
+        self.compiled_content: CompiledContent = None
+        self.translated_contents: dict[str, CompiledContent] = {}
+        self.Validator: CustomValidator | None = None
         super().__init__(filename, content, dirName)
 
-    def inject(self, data: dict):
-        try:
-            if not super().inject(data):
-                # TODO Raise Error
-                pass
-            content_html = str(self.content_to_inject)
-            flattened_data = flatten_dict()
-            for key in flattened_data:
-                regex = re.compile(rf"{{{{{key}}}}}")
-                content_html = regex.sub(
-                    str(flattened_data[key]), content_html)
-            content_text = self.exportText(data)
-            return content_html, content_text
-        except KeyError as e:
-            pass
-        except:
+    def inject(self, data: dict, target_lang: str = None):
+        # NOTE the translator errors (network, translation memory) reach the caller as they did when build translated
+        if not super().inject(data):
+            # TODO Raise Error
             pass
+        flattened_data = flatten_dict(data, flattenedDict={})
+        if target_lang is None or target_lang == Template.LANG:
+            content_html = self.compiled_content.render(flattened_data)
+        else:
+            compiled_content = self.compiled_for(target_lang)
+            content_html = compiled_content.render(flattened_data, lambda value: self.translate(target_lang, value))
+        content_text = self.exportText(content_html)
+        return content_html, content_text
 
     def validate(self, document: dict):
         # TODO See: https://docs.python-cerberus.org/errors.html
@@ -219,8 +292,9 @@ class HTMLTemplate(Template):
 
     def exportText(self, content: str):
         bs4 = BeautifulSoup(content, XMLLikeParser.LXML.value)
-        title = bs4.find("title", recursive=False)
-        title.decompose()
+        title = bs4.find("title")
+        if title is not None:
+            title.decompose()
         return bs4.get_text("\n", True)
 
     def save(self):
@@ -232,22 +306,46 @@ class HTMLTemplate(Template):
         self.extractExtraSchemaRegistry()
         self.extractValidation()
         self.extractImageKey()
+        self.compile()
+
+    def compile(self):
+        if self.content_to_inject is None:
+            self.content_to_inject = self.bs4.prettify(formatter="html5")
+        self.compiled_content = CompiledContent(self.content_to_inject)
+        self.translated_contents = {}
+
+    def pretranslate(self):
+        """
+        Translate the content in every language of `Template.LANGUAGES`
+        """
+        for lang in Template.LANGUAGES:
+            try:
+                self.compiled_for(lang)
+            except Exception:
+                # NOTE the content will be translated on the first build for this language
+                pass
+
+    def compiled_for(self, target_lang: str) -> CompiledContent:
+        if target_lang == Template.LANG:
+            return self.compiled_content
+        if target_lang not in self.translated_contents:
+            src = 'auto' if Template.LANG is None else Template.LANG
+            self.translated_contents[target_lang] = CompiledContent(translate_html(self.content_to_inject, Template.TRANSLATION_MEMORY, target_lang, src))
+        return self.translated_contents[target_lang]
 
     def translate(self, targetLang: str, text: str):
         if targetLang == Template.LANG:
             return text
         src = 'auto' if Template.LANG is None else Template.LANG
-        translated = self.translator.translate(text, dest=targetLang, src=src)
-        return translated.text
+        return Template.TRANSLATION_MEMORY.translate(text, targetLang, src)
 
     def build(self,  data,target_lang):
         is_valid, data = super().build(target_lang, data)
         if not is_valid:
             raise TemplateValidationError(data)
         
-        content_html, content_text = self.inject(data)
-        content_html = self.translate(target_lang, content_html)
-        content_text = self.translate(target_lang, content_text)
+        # NOTE the text of the content is already translated, only the injected values go through the translation memory
+        content_html, content_text = self.inject(data, target_lang)
         return True, (content_html, content_text)
 
     def extractImageKey(self,):
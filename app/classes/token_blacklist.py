@@ -0,0 +1,137 @@
+from threading import Event, Lock, Thread
+import time
+from typing import Any
+from redis import Redis
+from redis.exceptions import RedisError
+from app.classes.bloom_filter import BloomFilter
+
+KEY = 'token_blacklist'
+CHANNEL = 'token_blacklist:revoked'
+TOKEN_PREFIX = 'token:'
+CLIENT_PREFIX = 'client:'
+RECONNECT_DELAY = 1
+
+
+class TokenBlacklist:
+    """
+    Revoked tokens and clients, a redis sorted set scored by the revocation time. A token is revoked when its digest
+    or the client it was issued for was revoked after the token was created, the tokens issued to a client once it
+    was blacklisted stay valid.
+
+    Each process keeps a bloom filter of the revoked ids, filled from the sorted set then by the revocations published
+    on a channel, so a token that was never revoked is accepted without any network call. Only a bloom positive is
+    confirmed against redis. The entries older than `retention` (the lifetime of a token) are dropped. Without redis
+    the revocations only apply to the process that received them.
+    """
+
+    def __init__(self, redis: Redis | None, capacity: int = 100_000, retention: float = 36000000) -> None:
+        self.redis = redis
+        self.capacity = capacity
+        self.retention = retention
+        self.bloom = BloomFilter(capacity)
+        self.local: dict[str, float] = {}
+        self.lock = Lock()
+        self.stop_event = Event()
+        self.thread: Thread | None = None
+        self.checks = 0
+        self.bloom_positives = 0
+        self.confirmed = 0
+        self.received = 0
+
+    def start(self):
+        if self.redis is None or (self.thread is not None and self.thread.is_alive()):
+            return
+        self.stop_event.clear()
+        self.thread = Thread(target=self._listen, name='token-blacklist', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def after_fork(self):
+        # NOTE the listener thread of the parent is gone, the bloom filter copied from it stays valid
+        self.lock = Lock()
+        self.thread = None
+        self.start()
+
+    def load(self):
+        """
+        Rebuild the bloom filter from redis, done on every (re)subscription so no revocation published while the
+        listener was disconnected is missed
+        """
+        self.redis.zremrangebyscore(KEY, '-inf', time.time() - self.retention)
+        members = [m.decode() for m in self.redis.zrange(KEY, 0, -1)]
+        bloom = BloomFilter(max(self.capacity, 2 * len(members)))
+        for member in members:
+            bloom.add(member)
+        with self.lock:
+            self.bloom = bloom
+
+    def _listen(self):
+        while not self.stop_event.is_set():
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(CHANNEL)
+                self.load()
+                while not self.stop_event.is_set():
+                    message = pubsub.get_message(timeout=1)
+                    if message is not None:
+                        self._add(message['data'].decode())
+                        self.received += 1
+            except RedisError:
+                self.stop_event.wait(RECONNECT_DELAY)
+            finally:
+                pubsub.close()
+
+    def _add(self, member: str):
+        with self.lock:
+            self.bloom.add(member)
+
+    def _revoke(self, member: str):
+        now = time.time()
+        self._add(member)
+        if self.redis is None:
+            self.local[member] = now
+            return
+        pipeline = self.redis.pipeline()
+        pipeline.zremrangebyscore(KEY, '-inf', now - self.retention)
+        pipeline.zadd(KEY, {member: now})
+        pipeline.publish(CHANNEL, member)
+        pipeline.execute()
+
+    def revoke_token(self, digest: str):
+        self._revoke(TOKEN_PREFIX + digest)
+
+    def revoke_client(self, client_id: str):
+        self._revoke(CLIENT_PREFIX + client_id)
+
+    def is_revoked(self, digest: str, client_id: str, created_at: float) -> bool:
+        """
+        Raise `RedisError` when a bloom positive cannot be confirmed
+        """
+        self.checks += 1
+        bloom = self.bloom
+        members = [m for m in (TOKEN_PREFIX + digest, CLIENT_PREFIX + client_id) if m in bloom]
+        if not members:
+            return False
+
+        self.bloom_positives += 1
+        if self.redis is None:
+            scores = [self.local.get(m) for m in members]
+        else:
+            scores = self.redis.zmscore(KEY, members)
+        revoked = any(score is not None and created_at <= score for score in scores)
+        self.confirmed += revoked
+        return revoked
+
+    @property
+    def metrics(self) -> dict[str, Any]:
+        return {
+            'checks': self.checks,
+            'bloom_positives': self.bloom_positives,
+            'confirmed': self.confirmed,
+            'unconfirmed': self.bloom_positives - self.confirmed,
+            'received': self.received,
+            'bloom_items': self.bloom.count,
+            'listening': self.thread is not None and self.thread.is_alive(),
+        }
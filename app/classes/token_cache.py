@@ -0,0 +1,88 @@
+from collections import OrderedDict
+from hashlib import sha256
+from threading import Lock
+import time
+from typing import Any, Generic, TypeVar
+
+V = TypeVar('V')
+
+
+class VerifiedTokenCache(Generic[V]):
+    """
+    Bounded LRU of tokens that already went through the full verification, keyed by (token sha256, client ip).
+
+    Each entry expires at the `expired_at` of its token and the whole cache is dropped as soon as the
+    generation id it was filled with changes. Safe to share between threads.
+    """
+
+    def __init__(self, capacity: int = 4096) -> None:
+        self.capacity = capacity
+        self.entries: OrderedDict[tuple[str, str], tuple[float, V]] = OrderedDict()
+        self.generation_id: str | None = None
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def digest(token: str) -> str:
+        return sha256(token.encode()).hexdigest()
+
+    def _check_generation(self, generation_id: str | None):
+        if generation_id != self.generation_id:
+            if self.entries:
+                self.invalidations += 1
+            self.entries.clear()
+            self.generation_id = generation_id
+
+    def get(self, token: str, client_ip: str, generation_id: str | None) -> V | None:
+        key = (self.digest(token), client_ip)
+        with self.lock:
+            self._check_generation(generation_id)
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expired_at, value = entry
+            if expired_at < time.time():
+                del self.entries[key]
+                self.expired += 1
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, token: str, client_ip: str, generation_id: str | None, expired_at: float, value: V):
+        key = (self.digest(token), client_ip)
+        with self.lock:
+            self._check_generation(generation_id)
+            self.entries[key] = (expired_at, value)
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+
+    def after_fork(self):
+        self.lock = Lock()
+
+    def invalidate(self):
+        with self.lock:
+            if self.entries:
+                self.invalidations += 1
+            self.entries.clear()
+
+    @property
+    def metrics(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'expired': self.expired,
+            'invalidations': self.invalidations,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'size': len(self.entries),
+            'capacity': self.capacity,
+        }
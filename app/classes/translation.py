@@ -0,0 +1,158 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from hashlib import sha256
+from threading import Lock
+from typing import Literal, Protocol
+import sqlite3
+
+
+TranslatorType = Literal['google', 'fake']
+
+
+class TranslatorProtocol(Protocol):
+    def translate(self, text: str, dest: str, src: str = 'auto') -> 'Translated': ...
+
+
+@dataclass
+class Translated:
+    text: str
+    src: str
+    dest: str
+
+
+class FakeTranslator:
+    """
+    Offline translator with the same `translate` signature as googletrans. It returns the text from
+    `mapping` when present, the original text otherwise. With `record` every call is kept in `calls`, the
+    translator used by the server does not record anything.
+    """
+
+    def __init__(self, mapping: dict[str, str] = None, record: bool = False) -> None:
+        self.mapping = {} if mapping is None else mapping
+        self.calls: list[tuple[str, str, str]] | None = [] if record else None
+
+    def translate(self, text: str, dest: str, src: str = 'auto') -> Translated:
+        if self.calls is not None:
+            self.calls.append((text, src, dest))
+        return Translated(self.mapping.get(text, text), src, dest)
+
+
+def TranslatorFactory(translator_type: TranslatorType) -> TranslatorProtocol:
+    if translator_type == 'fake':
+        return FakeTranslator()
+    from googletrans import Translator
+    return Translator(['translate.google.com', 'translate.google.com'])
+
+
+class TranslationMemory:
+    """
+    Translation cache keyed by (content sha256, source language, target language).
+
+    Lookups go through an in-process LRU first, then a SQLite store so translations survive restarts,
+    and only then through the translator. Safe to share between threads.
+    """
+
+    def __init__(self, translator: TranslatorProtocol, filepath: str | None = None, capacity: int = 4096) -> None:
+        self.translator = translator
+        self.capacity = capacity
+        self.lru: OrderedDict[tuple[str, str, str], str] = OrderedDict()
+        self.lock = Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self.filepath = filepath
+        self.db: sqlite3.Connection | None = None
+        self._connect()
+
+    def _connect(self):
+        if not self.filepath:
+            return
+        self.db = sqlite3.connect(self.filepath, check_same_thread=False)
+        self.db.execute('CREATE TABLE IF NOT EXISTS translation_memory (digest TEXT NOT NULL, src TEXT NOT NULL, dest TEXT NOT NULL, translated TEXT NOT NULL, PRIMARY KEY (digest, src, dest))')
+        self.db.commit()
+
+    @staticmethod
+    def digest(text: str) -> str:
+        return sha256(text.encode()).hexdigest()
+
+    def _lru_get(self, key: tuple[str, str, str]) -> str | None:
+        with self.lock:
+            value = self.lru.get(key)
+            if value is not None:
+                self.lru.move_to_end(key)
+            return value
+
+    def _lru_set(self, key: tuple[str, str, str], value: str):
+        with self.lock:
+            self.lru[key] = value
+            self.lru.move_to_end(key)
+            if len(self.lru) > self.capacity:
+                self.lru.popitem(last=False)
+
+    def _disk_get(self, key: tuple[str, str, str]) -> str | None:
+        if self.db is None:
+            return None
+        with self.lock:
+            row = self.db.execute('SELECT translated FROM translation_memory WHERE digest = ? AND src = ? AND dest = ?', key).fetchone()
+        return None if row is None else row[0]
+
+    def _disk_set(self, key: tuple[str, str, str], value: str):
+        if self.db is None:
+            return
+        with self.lock:
+            self.db.execute('INSERT OR REPLACE INTO translation_memory (digest, src, dest, translated) VALUES (?, ?, ?, ?)', (*key, value))
+            self.db.commit()
+
+    def translate(self, text: str, dest: str, src: str = 'auto') -> str:
+        if not text or text.isspace():
+            return text
+
+        key = (self.digest(text), src, dest)
+        translated = self._lru_get(key)
+        if translated is not None:
+            self.hits += 1
+            return translated
+
+        translated = self._disk_get(key)
+        if translated is not None:
+            self.disk_hits += 1
+            self._lru_set(key, translated)
+            return translated
+
+        self.misses += 1
+        translated = self.translator.translate(text, dest=dest, src=src).text
+        self._lru_set(key, translated)
+        self._disk_set(key, translated)
+        return translated
+
+    def translate_segment(self, text: str, dest: str, src: str = 'auto') -> str:
+        """
+        Translate the text while keeping its leading and trailing whitespace, so segments can be joined back
+        """
+        core = text.strip()
+        if not core:
+            return text
+        start = text.index(core)
+        return text[:start] + self.translate(core, dest, src) + text[start + len(core):]
+
+    def after_fork(self):
+        # NOTE a sqlite connection must not be used across a fork, the one of the parent is dropped without closing it
+        self.lock = Lock()
+        self.db = None
+        self._connect()
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    @property
+    def metrics(self):
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'size': len(self.lru),
+            'capacity': self.capacity,
+        }
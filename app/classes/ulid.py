@@ -0,0 +1,68 @@
+from base64 import b32encode
+import os
+from threading import Lock
+import time
+
+CROCKFORD = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+_RFC4648 = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ234567'
+_TO_CROCKFORD = bytes.maketrans(_RFC4648.encode(), CROCKFORD.encode())
+
+ULID_LENGTH = 26
+RANDOM_BITS = 80
+
+
+class ULIDGenerator:
+    """
+    ULID ids: 48 bits of unix milliseconds then 80 random bits, 26 crockford base32 characters that sort by creation
+    time. Ids created in the same millisecond increment the random part of the previous one, so the ids of a process
+    are strictly increasing even when the clock goes back. A forked child draws a new random part, it never continues
+    the sequence of its parent.
+    """
+
+    def __init__(self) -> None:
+        self.lock = Lock()
+        self.last_ms = 0
+        self.last_random = 0
+        os.register_at_fork(after_in_child=self.after_fork)
+
+    def after_fork(self):
+        self.lock = Lock()
+        self.last_ms = 0
+
+    def new_int(self) -> int:
+        with self.lock:
+            ms = time.time_ns() // 1_000_000
+            if ms > self.last_ms:
+                rand = int.from_bytes(os.urandom(10), 'big')
+            else:
+                ms = self.last_ms
+                rand = self.last_random + 1
+                if rand >> RANDOM_BITS:
+                    # NOTE 2^80 ids in one millisecond, borrow the next one
+                    ms += 1
+                    rand = int.from_bytes(os.urandom(10), 'big')
+            self.last_ms = ms
+            self.last_random = rand
+        return ms << RANDOM_BITS | rand
+
+    def new(self) -> str:
+        # NOTE the 130 bits of the 26 characters are left aligned on 17 bytes, base32 in C then a translate
+        return b32encode((self.new_int() << 6).to_bytes(17, 'big'))[:ULID_LENGTH].translate(_TO_CROCKFORD).decode()
+
+
+def ulid_timestamp(ulid: str) -> float:
+    """
+    Creation time of the id in seconds, the bound of a range scan over sorted ids
+    """
+    ms = 0
+    for char in ulid[:10]:
+        ms = ms * 32 + CROCKFORD.index(char)
+    return ms / 1000
+
+
+def ulid_lower_bound(timestamp: float) -> str:
+    """
+    Smallest id created at `timestamp`
+    """
+    ms = int(timestamp * 1000)
+    return ''.join(CROCKFORD[(ms >> shift) & 31] for shift in range(45, -5, -5)) + '0' * 16
@@ -1,4 +1,11 @@
-from threading import Thread
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from enum import Enum
+from threading import Lock, RLock, Thread
+import gc
+import os
+import time
+from types import MappingProxyType
 import injector
 from inspect import signature, getmro
 # from dependencies import __DEPENDENCY
@@ -9,9 +16,10 @@ from app.utils.prettyprint import printJSON,PrettyPrinter_
 from typing import TypeVar, Type
 from deprecated import deprecated
 from ordered_set import OrderedSet
-from app.definition._service import S, Service, AbstractDependency, AbstractServiceClasses, BuildOnlyIfDependencies, PossibleDependencies, __DEPENDENCY
+from app.definition._service import S, Service, AbstractDependency, AbstractServiceClasses, BuildOnlyIfDependencies, LazyServices, PossibleDependencies, __DEPENDENCY
 import app.services
 import functools
+import asyncio
 
 
 
@@ -55,6 +63,10 @@ class InvalidDependencyError(ContainerError):
     pass  # Abstract class in the dependency list
 
 
+class RequestScopeError(ContainerError):
+    pass  # Request scoped dependency injected outside of a request scope
+
+
 def issubclass(cls): return issubclass_of(Service, cls)
 
 
@@ -73,21 +85,30 @@ def isabstract(cls):
 
 class Container():
 
-    def __init__(self, D: list[type],quiet=False) -> None:  # TODO add the scope option
+    def __init__(self, D: list[type],quiet=False, max_workers: int | None = None, roots: list[type] | None = None) -> None:
         self.__app = injector.Injector()
 
         self.DEPENDENCY_MetaData = {}
         self.__hashKeyAbsResolving: dict = {}
+        self.max_workers = max_workers
+        self.layers: list[list[str]] = []
+        self.build_times: dict[str, float] = {}
+        self.__lazy_lock = RLock()
+        self.__services: dict[str, Service] = {}  # NOTE the services created so far, in the order of creation
 
         self.__D: set[str] = self.__load_baseSet(D)
         dep_count = self.__load_dep(D)
         self.__D: OrderedSet[str] = self.__order_dependency(dep_count)
+        self.__lazy: set[str] = self.__lazy_services(roots)
 
         PrettyPrinter_.show()
         PrettyPrinter_.message('Building the Container... !')
         PrettyPrinter_.space_line()
 
+        start = time.perf_counter()
         self.__buildContainer()
+        self.build_duration = time.perf_counter() - start
+        self.__print_build_report()
         # TODO print success  in building the app
 
     def __bind(self, type_:type, obj:Any, scope=None):
@@ -106,12 +127,15 @@ class Container():
             provider: dict[type, Type[S]] = {}
             for d in self.dependencies:
                 if issubclass_of(typ, d):
+                    self.__ensure_built(d.__name__)
                     provider[d] = self.__app.get(d, scope)
             return provider
 
+        self.__ensure_built(typ.__name__)
         return self.__app.get(typ, scope)
 
     def getFromClassName(self, classname: str, scope=None):
+        self.__ensure_built(classname)
         return self.__app.get(self.DEPENDENCY_MetaData[classname][DependencyConstant.TYPE_KEY], scope)
 
     def __load_dep(self, D: list[type]):
@@ -193,7 +217,8 @@ class Container():
     def __getAbstractResolving(self, typ: type):
         return AbstractDependency[typ.__name__]
 
-    def getSignature(self, t: type | Callable):
+    @staticmethod
+    def getSignature(t: type | Callable):
         params = signature(t).parameters.values()
         types: list[str] = []
         paramNames: list[str] = []
@@ -222,19 +247,129 @@ class Container():
 
     def __buildContainer(self):
         D = self.__D.copy()
-        while D.__len__() != 0:
-            no_dep = []
-            for x in D:
-                d: set[str] = self.DEPENDENCY_MetaData[x][DependencyConstant.DEP_KEY]
-                if len(d.intersection(D)) == 0:
-                    no_dep.append(x)
-            if len(no_dep) == 0:
-                raise CircularDependencyError
-            D.difference_update(no_dep)
-            for x in no_dep:
-                self.__inject(x)
-
-    def __inject(self, x: str):
+        with ThreadPoolExecutor(self.max_workers, thread_name_prefix='container-build') as executor:
+            while D.__len__() != 0:
+                no_dep = []
+                for x in D:
+                    d: set[str] = self.DEPENDENCY_MetaData[x][DependencyConstant.DEP_KEY]
+                    if len(d.intersection(D)) == 0:
+                        no_dep.append(x)
+                if len(no_dep) == 0:
+                    raise CircularDependencyError
+                D.difference_update(no_dep)
+                # NOTE the lazy services still go through the layers so the cycles are detected at startup
+                no_dep = [x for x in no_dep if x not in self.__lazy]
+                if no_dep:
+                    self.layers.append(no_dep)
+                    self.__build_layer(no_dep, executor)
+
+    def __hard_dependencies(self, x: str) -> set[str]:
+        # NOTE a possible dependency only orders the build, it does not require the service
+        possible = PossibleDependencies.get(x, [])
+        return {d for d in self.DEPENDENCY_MetaData[x][DependencyConstant.DEP_KEY] if d in self.__D and d not in possible}
+
+    def __closure(self, required: list[str]) -> set[str]:
+        closure = set(required)
+        while required:
+            for d in self.__hard_dependencies(required.pop()):
+                if d not in closure:
+                    closure.add(d)
+                    required.append(d)
+        return closure
+
+    def __lazy_services(self, roots: list[type] | None) -> set[str]:
+        """
+        The services left to their first use: the lazy services that no eager service depends on, directly or not. When
+        `roots` are given, every service outside of their closure.
+        """
+        if roots is None:
+            required = [x for x in self.__D if x not in LazyServices]
+        else:
+            required = [r.__name__ for r in roots]
+        closure = self.__closure(required)
+        return {x for x in self.__D if x not in closure}
+
+    def preload(self, types: list[type]):
+        """
+        Build the services of `types` still pending and their dependencies, layer by layer like the startup build
+        """
+        with self.__lazy_lock:
+            D = self.__closure([t.__name__ for t in types]) & self.__lazy
+            with ThreadPoolExecutor(self.max_workers, thread_name_prefix='container-build') as executor:
+                while D:
+                    no_dep = [x for x in self.__D if x in D and not self.DEPENDENCY_MetaData[x][DependencyConstant.DEP_KEY] & D]
+                    if len(no_dep) == 0:
+                        raise CircularDependencyError
+                    D.difference_update(no_dep)
+                    self.layers.append(no_dep)
+                    self.__build_layer(no_dep, executor)
+                    self.__lazy.difference_update(no_dep)
+
+    def __ensure_built(self, x: str):
+        if x not in self.__lazy:
+            return
+        with self.__lazy_lock:
+            if x not in self.__lazy:
+                return  # NOTE built by another thread while waiting for the lock
+            for d in self.__hard_dependencies(x):
+                self.__ensure_built(d)
+            self.__inject(x)
+            self.__lazy.discard(x)
+
+    def before_fork(self):
+        for service in list(self.__services.values()):
+            service.before_fork()
+
+    def after_fork(self):
+        """
+        Reset the state inherited by a forked child, without resolving anything through the injector: its lock might
+        have been held by a thread of the parent at the time of the fork
+        """
+        self.__lazy_lock = RLock()
+        for service in list(self.__services.values()):
+            service.after_fork()
+
+    @property
+    def pending_services(self) -> set[str]:
+        """
+        The lazy services that were not used yet
+        """
+        return set(self.__lazy)
+
+    def __build_layer(self, layer: list[str], executor: ThreadPoolExecutor):
+        """
+        The services of a layer only depend on the previous layers: they are created and bound in the layer order on the
+        main thread, then built concurrently. The results are collected in the layer order once every build is over, so the
+        first service of the layer that aborts is the one that stops the process, whatever the order the threads finish in.
+        """
+        to_build: list[tuple[str, Service]] = []
+        for x in layer:
+            obj = self.__inject(x, build=False)
+            if obj is not None:
+                to_build.append((x, obj))
+
+        futures = {x: executor.submit(self.__timed_build, x, obj) for x, obj in to_build if not obj.BUILD_ON_MAIN_THREAD}
+        for x, obj in to_build:
+            if obj.BUILD_ON_MAIN_THREAD:
+                self.__timed_build(x, obj)
+
+        for x, _ in to_build:
+            if x in futures:
+                futures[x].exception()  # NOTE wait for the whole layer before raising
+        for x, _ in to_build:
+            if x in futures:
+                futures[x].result()  # NOTE re raise the exit(-1) of a BuildAbortError
+
+    def __timed_build(self, x: str, obj: Service):
+        start = time.perf_counter()
+        try:
+            obj._builder()
+        finally:
+            self.build_times[x] = time.perf_counter() - start
+            status = obj.service_status.name if obj.service_status is not None else None
+            PrettyPrinter_.event('service_built', service=x, status=status, seconds=round(self.build_times[x], 4))
+
+    def __inject(self, x: str, build: bool = True):
         current_type: type = self.DEPENDENCY_MetaData[x][DependencyConstant.TYPE_KEY]
         if isabstract(current_type):
             return
@@ -249,6 +384,52 @@ class Container():
         params = self.toParams(dep, params_names)
         obj = self.__createDep(current_type, params)
         self.__bind(current_type, obj)
+        if issubclass(current_type):
+            self.__services[x] = obj
+        if not self.__will_build(current_type):
+            return
+        if not build:
+            return obj
+        self.__timed_build(x, obj)
+        return obj
+
+    @property
+    def critical_path(self) -> tuple[float, list[str]]:
+        """
+        The chain of dependencies that bounds the build time: each service finishes the longest of its dependencies
+        after, plus its own build time.
+        """
+        finish: dict[str, tuple[float, list[str]]] = {}
+        for layer in self.layers:
+            for x in layer:
+                deps = [finish[d] for d in self.DEPENDENCY_MetaData[x][DependencyConstant.DEP_KEY] if d in finish]
+                duration, path = max(deps, default=(0.0, []), key=lambda f: f[0])
+                finish[x] = (duration + self.build_times.get(x, 0.0), path + [x])
+        return max(finish.values(), default=(0.0, []), key=lambda f: f[0])
+
+    @property
+    def build_report(self) -> dict[str, Any]:
+        duration, path = self.critical_path
+        return {
+            'duration': self.build_duration,
+            'sequential_duration': sum(self.build_times.values()),
+            'critical_path_duration': duration,
+            'critical_path': path,
+            'layers': self.layers,
+            'pending': sorted(self.__lazy),
+            'build_times': dict(sorted(self.build_times.items(), key=lambda t: t[1], reverse=True)),
+        }
+
+    def __print_build_report(self):
+        duration, path = self.critical_path
+        PrettyPrinter_.event('container_built', seconds=round(self.build_duration, 4), layers=len(self.layers),
+                             critical_path=path, critical_path_seconds=round(duration, 4), pending=sorted(self.__lazy))
+        if PrettyPrinter_.headless:
+            return
+        PrettyPrinter_.info(
+            f'Container built in {self.build_duration:.2f}s ({len(self.layers)} layers, {sum(self.build_times.values()):.2f}s of builds). Critical path {duration:.2f}s: {" -> ".join(path)}', saveable=True)
+        if self.__lazy:
+            PrettyPrinter_.info(f'Built on first use: {", ".join(sorted(self.__lazy))}', saveable=True)
 
     def __order_dependency(self, dep_count):
         temp_dep_list = list(self.__D)
@@ -352,24 +533,26 @@ class Container():
         
         if flag:
             obj.service_list= list(params.values())
-            willBuild = self.DEPENDENCY_MetaData[typ.__name__][DependencyConstant.FLAG_BUILD_KEY]
-            if willBuild:
-                obj._builder()  # create the dependency but not calling the builder
         else:
             # WARNING raise we cant verify the data provided
             pass
         return obj
 
+    def __will_build(self, typ: type):
+        return issubclass(typ) and self.DEPENDENCY_MetaData[typ.__name__][DependencyConstant.FLAG_BUILD_KEY]
+
     def need(self, typ: Type[S]) -> Type[S]:
-        if not self.DEPENDENCY_MetaData[typ.__name__][DependencyConstant.BUILD_ONLY_FLAG_KEY]:
-            dependency: Type[S] = self.get(typ)
-            try:
-                dependency._builder()
-                self.DEPENDENCY_MetaData[typ.__name__][DependencyConstant.BUILD_ONLY_FLAG_KEY] = True
-                return dependency
-            except:
-                pass
-        return self.get(typ)
+        dependency: Type[S] = self.get(typ)
+        # NOTE build the service skipped by its BuildOnlyIf condition
+        if not self.DEPENDENCY_MetaData[typ.__name__][DependencyConstant.FLAG_BUILD_KEY]:
+            with self.__lazy_lock:
+                if not self.DEPENDENCY_MetaData[typ.__name__][DependencyConstant.FLAG_BUILD_KEY]:
+                    try:
+                        dependency._builder()
+                        self.DEPENDENCY_MetaData[typ.__name__][DependencyConstant.FLAG_BUILD_KEY] = True
+                    except:
+                        pass
+        return dependency
 
     def destroyAllDependency(self, scope=None):
         raise NotImplementedError
@@ -409,10 +592,143 @@ class Container():
 
 CONTAINER: Container = None #Container(__DEPENDENCY)
 
-def build_container(quiet=False):
+def build_container(quiet=False, max_workers: int | None = None, roots: list[type] | None = None):
+    """
+    Build the services of the process. With `roots`, only their closure is built at startup and every other service
+    is left to its first use.
+    """
     PrettyPrinter_.quiet=quiet
     global CONTAINER
-    CONTAINER = Container(__DEPENDENCY)
+    CONTAINER = Container(__DEPENDENCY, quiet, max_workers, roots)
+
+class Scope(Enum):
+    SINGLETON = 'singleton'  # NOTE one instance for the process, every service is a singleton
+    REQUEST = 'request'  # NOTE one instance per request scope, closed when the scope exits
+    TRANSIENT = 'transient'  # NOTE a new instance on each injection
+
+
+ScopedDependencies: dict[str, tuple[type, Scope]] = {}
+_scoped_singletons: dict[type, Any] = {}
+_scoped_singletons_lock = Lock()
+_request_instances: ContextVar[dict[type, Any] | None] = ContextVar('request_instances', default=None)
+
+
+def _after_fork_in_child():
+    global _scoped_singletons_lock
+    _scoped_singletons_lock = Lock()
+    if CONTAINER is not None:
+        CONTAINER.after_fork()
+
+
+os.register_at_fork(after_in_child=_after_fork_in_child)  # NOTE once for the process, whatever the container built
+
+
+class RequestScope:
+    """
+    Open a request scope for the current context: the `Scope.REQUEST` dependencies are created once inside it and
+    their `close` method, if any, is called when it exits, in the reverse order of creation. The instances live in a
+    context variable, so concurrent requests never share them and no lock is needed.
+
+    `example::`
+
+    async with RequestScope():
+        await call_next()
+    """
+
+    def __init__(self) -> None:
+        self.token = None
+
+    def __enter__(self):
+        self.token = _request_instances.set({})
+        return self
+
+    def __exit__(self, *exc):
+        for close in self._release():
+            close()
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, *exc):
+        for close in self._release():
+            result = close()
+            if asyncio.iscoroutine(result):
+                await result
+
+    def _release(self) -> list[Callable]:
+        instances = _request_instances.get()
+        _request_instances.reset(self.token)
+        closes = [getattr(obj, 'close', None) for obj in reversed(instances.values())]
+        return [close for close in closes if callable(close)]
+
+
+def provide(typ: type, scope: Scope):
+    match scope:
+        case Scope.TRANSIENT:
+            return typ()
+
+        case Scope.REQUEST:
+            instances = _request_instances.get()
+            if instances is None:
+                raise RequestScopeError(typ.__name__)
+            if typ not in instances:
+                instances[typ] = typ()
+            return instances[typ]
+
+        case Scope.SINGLETON:
+            if typ not in _scoped_singletons:
+                with _scoped_singletons_lock:
+                    if typ not in _scoped_singletons:
+                        _scoped_singletons[typ] = typ()
+            return _scoped_singletons[typ]
+
+
+class InjectionPlan:
+    """
+    Computed once per decorated function: which parameters are container services and which are scoped dependencies,
+    split on the first use so the container does not have to be built when the function is decorated. The services
+    are resolved on the first call into a read-only mapping, each call then only merges the scoped instances and the
+    caller kwargs into a new dict.
+    """
+    __slots__ = ('types', 'paramNames', 'split', 'singletons')
+
+    def __init__(self, types: list[str], paramNames: list[str]) -> None:
+        self.types = types
+        self.paramNames = paramNames
+        self.split: tuple[tuple, tuple] | None = None
+        self.singletons: MappingProxyType | None = None
+
+    def _split(self) -> tuple[tuple, tuple]:
+        if self.split is None:
+            # NOTE the parameters that are neither a dependency nor a scoped dependency are left to the caller
+            pairs = list(zip(self.types, self.paramNames))
+            self.split = (tuple((n, t) for t, n in pairs if t in CONTAINER.DEPENDENCY_MetaData or isabstract(t)),
+                          tuple((n, ScopedDependencies[t]) for t, n in pairs if t in ScopedDependencies))
+        return self.split
+
+    @property
+    def services(self) -> tuple[tuple[str, str], ...]:
+        return self._split()[0]
+
+    @property
+    def scoped(self) -> tuple[tuple[str, tuple[type, 'Scope']], ...]:
+        return self._split()[1]
+
+    def params(self, kwargs: dict[str, Any]) -> MappingProxyType | dict[str, Any]:
+        services, scoped = self.split or self._split()
+        if self.singletons is None:
+            # NOTE resolved on the first call so that a lazy service is only built when it is used
+            self.singletons = MappingProxyType(CONTAINER.toParams([t for _, t in services], [n for n, _ in services]))
+        if not scoped and not kwargs:
+            return self.singletons
+
+        params = dict(self.singletons)
+        for name, (typ, scope) in scoped:
+            if name not in kwargs:
+                params[name] = provide(typ, scope)
+        params.update(kwargs)
+        return params
+
 
 def InjectInFunction(func: Callable):
     """
@@ -446,13 +762,13 @@ def InjectInFunction(func: Callable):
         <__main__.A object at 0x000001A76EC3FB90>
         ok
     """
-    types, paramNames = CONTAINER.getSignature(func)  # ERROR if theres is other parameter that is not in dependencies
-    paramsToInject = CONTAINER.toParams(types, paramNames)
+    types, paramNames = Container.getSignature(func)  # ERROR if theres is other parameter that is not in dependencies
+    plan = InjectionPlan(types, paramNames)
 
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        paramsToInject.update(kwargs)
-        return func(**paramsToInject)
+        return func(**plan.params(kwargs))
+    wrapper.plan = plan
     return wrapper
 
 
@@ -501,19 +817,38 @@ def InjectInMethod(func: Callable):
     >>> TypeError: Test.__init__() missing 2 required positional arguments: 'securityService' and 'test'
 
     """
-    types, paramNames = CONTAINER.getSignature(func) # ERROR if the function is not a method and if theres is other parameter that is not in depencies
+    types, paramNames = Container.getSignature(func) # ERROR if the function is not a method and if theres is other parameter that is not in depencies
     del types[0]
     del paramNames[0]
-    paramsToInject = CONTAINER.toParams(types, paramNames)
+    plan = InjectionPlan(types, paramNames)
 
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        paramsToInject.update(kwargs)
-        return func(*args, **paramsToInject)
+        return func(*args, **plan.params(kwargs))
+    wrapper.plan = plan
     return wrapper
 
-def Injectable(scope: Any |None = None ):
+def Injectable(scope: Scope = Scope.TRANSIENT):
+    """
+    Register a class that is not a service so that `InjectInMethod` and `InjectInFunction` inject it with the given
+    scope. The class is created without arguments, decorate its `__init__` with `InjectInMethod` to give it services.
+
+    `example::`
+
+    @Injectable(Scope.REQUEST)
+    class DBSession:
+        @InjectInMethod
+        def __init__(self, sqlService: SQLService): ...
+
+        def close(self): ...
+
+    @InjectInFunction
+    def handler(session: DBSession): ...
+    """
     def class_decorator(cls:type) -> type:
+        if issubclass(cls):
+            raise InvalidDependencyError  # NOTE the services are singletons built by the container
+        ScopedDependencies[cls.__name__] = (cls, scope)
         return cls
     return class_decorator
 
@@ -541,6 +876,32 @@ def Register(typ:Type[S],scope=None)->Type[S]:
     CONTAINER.register_new_dep(typ,scope)
     return Get(typ,scope)
 
+def InjectedServices(*funcs: Callable) -> list[type]:
+    """
+    The service classes injected in the functions decorated with `InjectInMethod` or `InjectInFunction`, the abstract
+    ones are left out since their implementation is only resolved on the first call
+    """
+    names = {t for func in funcs for _, t in getattr(func, 'plan', InjectionPlan([], [])).services}
+    return [CONTAINER.DEPENDENCY_MetaData[x][DependencyConstant.TYPE_KEY] for x in names if x in CONTAINER.DEPENDENCY_MetaData]
+
+def Preload(*types: Type[S]):
+    """
+    Build now the services given and their dependencies that were left to their first use
+    """
+    CONTAINER.preload(list(types))
+
+def PreloadForFork(*types: Type[S]):
+    """
+    Build the services given, then move every object allocated so far to the permanent generation of the garbage
+    collector. The processes forked from here share the built services, parsed templates and compiled schemas
+    copy-on-write: the collector no longer touches them, so their pages are not copied. Each built service runs its
+    `before_fork` hook first and re-creates its connections in its `after_fork` hook.
+    """
+    Preload(*types)
+    CONTAINER.before_fork()
+    gc.collect()
+    gc.freeze()
+
 def Need(typ: Type[S]) -> Type[S]:
     """
     The function `Need` takes a type parameter `Service` and returns the result of calling the `need`
@@ -7,7 +7,8 @@ from app.services.config_service import ConfigService
 from app.services.contacts_service import ContactsService
 from app.utils.constant  import HTTPHeaderConstant
 from app.classes.celery import TaskHeaviness, TaskType,SchedulerModel
-from app.utils.helper import flatten_dict
+from app.utils.helper import key_accessor
+from app.classes.prefix_trie import PrefixTrie
 
 class TwilioGuard(Guard):
     ...
@@ -38,14 +39,14 @@ class AssetGuard(Guard):
         self.configService = Get(ConfigService)
         self.options = options
         self.allowed_path = [self.configService.ASSET_DIR +p for p in  allowed_path]
+        self.allowed_trie = PrefixTrie(self.allowed_path)
         self.content_keys = content_keys
+        self.accessors = [(key,key_accessor(key)) for key in content_keys]
 
     def guard(self,scheduler:SchedulerModel):
         if scheduler == None:
-            return True,_
-        content = scheduler.model_dump(include={'content'})
-        content = flatten_dict(content)
-        flag = self.assetService.verify_asset_permission(content,self.content_keys,self.allowed_path,self.options)
+            return True,''
+        flag = self.assetService.verify_asset_permission(scheduler,self.accessors,self.allowed_trie,self.allowed_path,self.options)
         if not flag:
             return False, 'message'
         return True,''
@@ -60,7 +61,10 @@ class TaskWorkerGuard(Guard):
     
     def guard(self,scheduler:SchedulerModel):
         task_heaviness:TaskHeaviness = scheduler.heaviness
-        ...
+        # NOTE reads the live worker table kept by the monitor, no broker round trip here
+        if self.celeryService.available_workers_count == 0 and scheduler.task_type not in ('now','once'):
+            return False, 'No celery worker available to run the scheduled task'
+        return True,''
 
     class ForceContactsGuard(Guard):
 
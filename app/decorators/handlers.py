@@ -6,6 +6,7 @@ from app.definition._utils_decorator import Handler,HandlerDefaultException,Next
 from app.definition._service import ServiceNotAvailableError,MethodServiceNotAvailableError, ServiceTemporaryNotAvailableError
 from fastapi import status, HTTPException
 from app.classes.celery import CelerySchedulerOptionError, CeleryTaskNameNotExistsError,CeleryTaskNotFoundError
+from app.classes.task_executor import TaskQueueFullError
 from celery.exceptions import AlreadyRegistered,MaxRetriesExceededError,BackendStoreError,QueueNotFound,NotRegistered
 
 
@@ -79,4 +80,7 @@ class CeleryTaskHandler(Handler):
         
         except NotRegistered as e:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,detail={})
+
+        except TaskQueueFullError as e:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,detail='Background task queue full',headers={'Retry-After':'1'})
             
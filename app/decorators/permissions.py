@@ -4,10 +4,12 @@ from app.services.assets_service import DIRECTORY_SEPARATOR, REQUEST_DIRECTORY_S
 from app.definition._utils_decorator import Permission
 from app.container import InjectInMethod, Get
 from app.services.security_service import SecurityService,JWTAuthService
-from app.classes.auth_permission import AuthPermission, Role, RoutePermission,FuncMetaData
-from app.utils.helper import flatten_dict
+from app.classes.auth_permission import ALL_ROUTES, ROLE_BITS, AuthPermission, Role, RoutePermission,FuncMetaData
+from app.definition._ressource import ROUTE_ACL
+from app.utils.helper import key_accessor
+
+CUSTOM_BIT = ROLE_BITS[Role.CUSTOM]
 
- 
 class JWTRouteHTTPPermission(Permission):
     
     @InjectInMethod
@@ -17,33 +19,32 @@ class JWTRouteHTTPPermission(Permission):
     
     def permission(self,class_name:str, func_meta:FuncMetaData, authPermission:AuthPermission):
         operation_id = func_meta["operation_id"]
-        roles= func_meta['roles']
-        auth_roles = authPermission["roles"]
-        roles_excluded =func_meta['excludes']
+        acl = ROUTE_ACL[(class_name, operation_id)]
+        role_mask = authPermission["role_mask"]
 
-        for options in func_meta['options']:
+        for options in acl.options:
             if not options(authPermission):
                 raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,detail="Role details not allowed")
                     
-        if len(roles_excluded.intersection(auth_roles)) > 0:
+        if role_mask & acl.excluded:
                 raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,detail="Role not allowed")
 
-        if len(roles.intersection(auth_roles)) > 0:
+        if role_mask & acl.required:
                 return True
                
-        if Role.CUSTOM not in auth_roles:
+        if not role_mask & CUSTOM_BIT:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,detail="Role not allowed")
                 
         # Role.CUSTOM available
-        if class_name not in authPermission["allowed_routes"]:
+        route_index = authPermission["route_index"]
+        if class_name not in route_index:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Ressource not allowed")
 
-        routePermission: RoutePermission =authPermission["allowed_routes"][class_name]
-        
-        if routePermission["scope"] == "all":
+        custom_routes = route_index[class_name]
+        if custom_routes is ALL_ROUTES:
             return True
 
-        if operation_id not in routePermission['custom_routes']:
+        if operation_id not in custom_routes:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Route not allowed")
 
         return True
@@ -57,19 +58,18 @@ class JWTAssetPermission(Permission):
         self.jwtAuthService:JWTAuthService = Get(JWTAuthService)
         self.assetService:AssetService = Get(AssetService)
         self.model_keys=model_keys
+        self.accessors = [(key,key_accessor(key)) for key in model_keys]
         self.template_type = template_type
         self.options = options
 
     def permission(self,template:str, scheduler:SchedulerModel, authPermission:AuthPermission):
-        assetPermission = authPermission['allowed_assets']
-        permission = tuple(assetPermission)
+        # NOTE the trie is compiled once per verified token, see JWTAuthService._compile_permission
+        assetTrie = authPermission['asset_trie']
         if template:
-            content = scheduler.model_dump(include={'content'})
             template = template.replace(REQUEST_DIRECTORY_SEPARATOR,DIRECTORY_SEPARATOR)
             template = self.assetService.asset_rel_path(template,self.template_type)
-            if not template.startswith(permission):
+            if not assetTrie.allows(template):
                     raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,detail={'message':f'Assets [{template}] not allowed' })
 
-        content = flatten_dict(content)
-        return self.assetService.verify_asset_permission(content,self.model_keys,assetPermission,self.options)
+        return self.assetService.verify_asset_permission(scheduler,self.accessors,assetTrie,authPermission['allowed_assets'],self.options)
 
@@ -17,13 +17,15 @@ from fastapi import BackgroundTasks
 from app.interface.events import EventInterface
 from enum import Enum
 from ._utils_decorator import *
-from app.classes.auth_permission import FuncMetaData, Role, WSPathNotFoundError
-from slowapi import Limiter
+from app.classes.auth_permission import FuncMetaData, Role, RouteACL, WSPathNotFoundError, roles_to_mask
+from app.classes.rate_limiter import DistributedLimiter
+from app.services.config_service import ConfigService
 from slowapi.util import get_remote_address
 
 
 PATH_SEPARATOR = "/"
-GlobalLimiter = Limiter(get_remote_address) # BUG Need to change the datastructure to have more limiter
+# NOTE configured by the first ressource created, importing this module does not need the container
+GlobalLimiter = DistributedLimiter(get_remote_address)
 RequestLimit =0
 
 
@@ -55,6 +57,7 @@ This variable contains all the routes of the used ressources
 """
 
 DECORATOR_METADATA: dict[str, dict[str, list[tuple[Callable, float]]]] = {}
+ROUTE_ACL: dict[tuple[str, str], RouteACL] = {}
 """
 """
 
@@ -190,6 +193,8 @@ class BaseHTTPRessource(EventInterface,metaclass=HTTPRessourceMetaClass):
                 setattr(self, f, c)
     
     def _set_rate_limit(self):
+        configService: ConfigService = Get(ConfigService)
+        GlobalLimiter.configure(configService.RATE_LIMIT_REDIS_URL, configService.RATE_LIMIT_LOCAL_BATCH, configService.RATE_LIMIT_LEASE_TTL)
         for end in ROUTES[self.__class__.__name__]:
             func_name = end['endpoint']
             func_attr = getattr(self,func_name)
@@ -200,6 +205,13 @@ class BaseHTTPRessource(EventInterface,metaclass=HTTPRessourceMetaClass):
                 setattr(self,func_name,func_attr)
 
 
+    def _compile_acl(self):
+        # NOTE the class decorators are applied by now, the roles of each route are final
+        class_name = self.__class__.__name__
+        for end in ROUTES.get(class_name, []):
+            meta: FuncMetaData = getattr(self, end['endpoint']).meta
+            ROUTE_ACL[(class_name, meta['operation_id'])] = RouteACL(roles_to_mask(meta['roles']), roles_to_mask(meta['excludes']), tuple(meta['options']))
+
     def __init_subclass__(cls: Type) -> None:
 
         RESSOURCES[cls.__name__] = cls
@@ -217,6 +229,7 @@ class BaseHTTPRessource(EventInterface,metaclass=HTTPRessourceMetaClass):
         
         self.router = APIRouter(prefix=prefix, on_shutdown=[self.on_shutdown], on_startup=[self.on_startup],dependencies=dependencies)
         self._set_rate_limit()
+        self._compile_acl()
         self._stack_callback()
 
         self._add_routes()
@@ -323,6 +336,22 @@ def common_class_decorator(cls: Type[R] | Callable, decorator: Callable, handlin
     return None
 
 
+def compile_decorator_callables(decorator_functions: Iterable[Callable | DecoratorObj | Type[DecoratorObj]], base: Type[DecoratorObj], **kwargs) -> tuple[Callable, ...]:
+    """
+    Instantiate the decorator classes and bind the `do` methods once, when the router is built, so a request only
+    walks a tuple of callables
+    """
+    compiled: list[Callable] = []
+    for decorator_function in decorator_functions:
+        if isclass(decorator_function):
+            compiled.append(decorator_function(**kwargs).do)
+        elif isinstance(decorator_function, base):
+            compiled.append(decorator_function.do)
+        else:
+            compiled.append(decorator_function)
+    return tuple(compiled)
+
+
 def UsePermission(*permission_function: Callable[..., bool] | Permission | Type[Permission], default_error: HTTPExceptionParams =None):
 
     def decorator(func: Type[R] | Callable) -> Type[R] | Callable:
@@ -334,6 +363,7 @@ def UsePermission(*permission_function: Callable[..., bool] | Permission | Type[
         add_protected_route_metadata(class_name, func.meta['operation_id'])
 
         def wrapper(function: Callable):
+            permissions = compile_decorator_callables(permission_function, Permission)
 
             @functools.wraps(function)
             def callback(*args, **kwargs):
@@ -349,18 +379,9 @@ def UsePermission(*permission_function: Callable[..., bool] | Permission | Type[
                 kwargs_prime[SpecialKeyParameterConstant.META_SPECIAL_KEY_PARAMETER] = func.meta
                 
                 # TODO use the prefix here
-                for permission in permission_function:
+                for permission in permissions:
                     try:
-                        if type(permission) == type:
-                            flag = permission().do(*args, **kwargs_prime)
-                        elif isinstance(permission, Permission):
-                            flag = permission.do(*args, **kwargs_prime)
-                        else:
-                            flag = permission(*args, **kwargs_prime)
-                        
-                        if flag:
-                            continue
-                        else:
+                        if not permission(*args, **kwargs_prime):
                             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
                         
                     except PermissionDefaultException:
@@ -383,30 +404,17 @@ def UseHandler(*handler_function: Callable[..., Exception | None| Any] | Type[Ha
             return cls
 
         def wrapper(function: Callable):
+            if len(handler_function) == 0:
+                # TODO print a warning
+                return function
+
+            # NOTE the chain is built once: each handler receives the next one as its function
+            handler_prime = function
+            for handler in reversed(compile_decorator_callables(handler_function, Handler)):
+                handler_prime = functools.partial(handler, handler_prime)
 
             @functools.wraps(function)
             def callback(*args, **kwargs): # Function that will be called 
-                if len(handler_function) == 0:
-                    # TODO print a warning
-                    return function(*args, **kwargs)
-                
-
-                def handler_proxy(handler,f:Callable):
-
-                    def delegator(*a,**k):
-                        if type(handler) == type:
-                            handler_obj:Handler = handler()
-                            return handler_obj.do(f, *a, **k)
-                        elif isinstance(handler, Handler):
-                            return handler.do(f, *a, **k)
-                        else:
-                            return handler(f, *a, **k)
-                    return delegator
-                    
-                handler_prime = function
-                for handler in reversed(handler_function):
-                    handler_prime = handler_proxy(handler,handler_prime)
-                     
                 try:
                     return handler_prime(*args, **kwargs)
                 except HandlerDefaultException as e:
@@ -432,20 +440,14 @@ def UseGuard(*guard_function: Callable[..., tuple[bool, str]] | Type[Guard] | Gu
             return cls
 
         def wrapper(target_function: Callable):
+            guards = compile_decorator_callables(guard_function, Guard)
 
             @functools.wraps(target_function)
             def callback(*args, **kwargs):
 
-                for guard in guard_function:
-
+                for guard in guards:
                     # BUG check annotations of the guard function
-                    if type(guard) == type :
-                        flag, message = guard().do(*args, **kwargs)
-                    
-                    elif issubclass_of(Guard,type(guard)):
-                        flag, message = guard.do(*args, **kwargs)
-                    else:
-                        flag, message = guard(*args, **kwargs)
+                    flag, message = guard(*args, **kwargs)
 
                     if not flag:
                         if default_error == None:   
@@ -469,19 +471,15 @@ def UsePipe(*pipe_function: Callable[..., tuple[Iterable[Any], Mapping[str, Any]
             return cls
 
         def wrapper(function: Callable):
+            pipes = compile_decorator_callables(pipe_function, Pipe) if before else compile_decorator_callables(pipe_function, Pipe, before=False)
 
             @functools.wraps(function)
             def callback(*args, **kwargs):
                 try:
                     if before:
                         kwargs_prime = kwargs.copy()
-                        for pipe in pipe_function:  # verify annotation
-                            if type(pipe) == type:
-                                result = pipe().do(*args, **kwargs_prime)
-                            elif isinstance(pipe, Pipe):
-                                result = pipe.do(*args, **kwargs_prime)
-                            else:
-                                result = pipe(*args, **kwargs_prime)
+                        for pipe in pipes:  # verify annotation
+                            result = pipe(*args, **kwargs_prime)
 
                             if not isinstance(result,dict):
                                 raise PipeDefaultException
@@ -492,13 +490,8 @@ def UsePipe(*pipe_function: Callable[..., tuple[Iterable[Any], Mapping[str, Any]
                         return function(*args, **kwargs)
                     else:
                         result = function(*args, **kwargs)
-                        for pipe in pipe_function:
-                            if type(pipe) == type:
-                                result = pipe(before=False).do(result)
-                            elif isinstance(pipe, Pipe):
-                                result = pipe.do(result)
-                            else:
-                                result = pipe(result)
+                        for pipe in pipes:
+                            result = pipe(result)
 
                         return result
                 
@@ -13,6 +13,7 @@ AbstractServiceClasses: Dict[str, type] = {}
 BuildOnlyIfDependencies: Dict = {}
 PossibleDependencies: Dict[str, list[type]] = {}
 OptionalDependencies: Dict[str, list[type]] = {}
+LazyServices: set[str] = set()
 __DEPENDENCY: list[type] = []
 
 
@@ -76,6 +77,8 @@ class MethodServiceNotAvailableError(BuildError):
 
 
 class Service():
+    # NOTE the container builds the services of a same layer concurrently, a service prompting the user during its build stays on the main thread
+    BUILD_ON_MAIN_THREAD: bool = False
 
     def __init__(self) -> None:
         self.build_status: BuildErrorLevel = None
@@ -135,6 +138,20 @@ class Service():
     def log(self):
         pass
 
+    def before_fork(self):
+        """
+        Callback run in the parent process right before the workers are forked, the work done here is shared by every
+        child copy-on-write instead of being repeated in each of them
+        """
+        ...
+
+    def after_fork(self):
+        """
+        Callback run in the child process right after a fork. The connections, locks and threads held by the service
+        belong to the parent and must be re-created here, what was built stays shared copy-on-write
+        """
+        ...
+
     def __repr__(self) -> str:
         return super().__repr__()
 
@@ -240,10 +257,29 @@ def AbstractServiceClass(cls: S) -> S:
     return cls
 
 
-def ServiceClass(cls: S) -> S:
-    if cls.__name__ not in AbstractServiceClasses and cls not in __DEPENDENCY:
-        __DEPENDENCY.append(cls)
-    return cls
+def ServiceClass(cls: S = None, *, lazy: bool = False) -> S:
+    """
+    Register the service in the container. A `lazy` service is only created and built on its first `Get`/`Need`,
+    or at startup when a service that is not lazy depends on it.
+
+    `example::`
+
+    @ServiceClass
+    class ConfigService(Service): ...
+
+    @ServiceClass(lazy=True)
+    class FTPService(Service): ...
+    """
+    def decorator(cls: S) -> S:
+        if cls.__name__ not in AbstractServiceClasses and cls not in __DEPENDENCY:
+            __DEPENDENCY.append(cls)
+        if lazy:
+            LazyServices.add(cls.__name__)
+        return cls
+
+    if cls is None:
+        return decorator
+    return decorator(cls)
 
 
 @overload
@@ -1,5 +1,5 @@
 from typing import Callable
-from app.utils.dependencies import APIFilterInject
+from app.utils.dependencies import get_filter_plan
 from enum import Enum
 
 class DecoratorPriority(Enum):
@@ -19,10 +19,11 @@ class DecoratorObj:
     def __init__(self, ref_callback: Callable, filter=True):
         self.ref = ref_callback
         self.filter = filter
+        self.filter_plan = get_filter_plan(ref_callback) if filter else None
 
     def do(self, *args, **kwargs):
         if self.filter:
-            return APIFilterInject(self.ref)(*args, **kwargs)
+            return self.ref(*args, **self.filter_plan.filter(kwargs))
         return self.ref(*args, **kwargs)
 
 
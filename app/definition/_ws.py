@@ -13,7 +13,7 @@ import wrapt
 from pydantic import BaseModel
 from typing import Any, Callable, Optional, Type,TypeVar,Union,TypedDict,Literal
 from app.utils.prettyprint import PrettyPrinter_
-from app.utils.helper import generateId
+from app.utils.helper import generateUlid
 
 #########################################                ##############################################
 PATH_SEPARATOR = "/"
@@ -21,7 +21,7 @@ PATH_SEPARATOR = "/"
 
 class Room:
     def __init__(self):
-        self.room_id = generateId(20)
+        self.room_id = generateUlid()
         self.clients:list[WebSocket]  = []
     
 
@@ -85,19 +85,25 @@ class BaseWebSocketRessource(EventInterface,metaclass = WSRessMetaClass):
             func.meta['name'] = name
             func.meta['operation_id'] = BaseWebSocketRessource.build_operation_id(path,name)
 
+            # NOTE the filters are resolved once per endpoint, not on every message
+            websocket_injector = APIFilterInject(BaseWebSocketRessource._websocket_injector)
+            on_connect = APIFilterInject(BaseWebSocketRessource.on_connect)
+            on_disconnect = APIFilterInject(BaseWebSocketRessource.on_disconnect)
+            filtered_func = APIFilterInject(func)
+
             @functools.wraps(func)
             async def wrapper(*args,**kwargs):
                 path_conn_manager_ = path if path_conn_manager is None else path_conn_manager
                 self: BaseWebSocketRessource = args[0]
                 manager = self.connection_manager[path_conn_manager_]
                 
-                websocket:WebSocket= APIFilterInject(BaseWebSocketRessource._websocket_injector)(*args,**kwargs)
+                websocket:WebSocket= websocket_injector(*args,**kwargs)
 
                 kwargs_star = kwargs.copy()
                 kwargs_star['operation_id'] = func.meta['operation_id']
                 kwargs_star['manager'] = manager
 
-                flag = APIFilterInject(BaseWebSocketRessource.on_connect)(*args,**kwargs_star)
+                flag = on_connect(*args,**kwargs_star)
                 
                 if not flag:
                     websocket.close(status.WS_1002_PROTOCOL_ERROR,reason='Auth Token Not Present or not valid')
@@ -108,26 +114,26 @@ class BaseWebSocketRessource(EventInterface,metaclass = WSRessMetaClass):
                         if type_ == str:
                             message:str = await websocket.receive_text()
                             kwargs_star['message'] = message
-                            return  APIFilterInject(func)(*args,**kwargs_star)
+                            return  filtered_func(*args,**kwargs_star)
                         elif type_ == bytes:
                             message:bytes = await websocket.receive_bytes()
                             kwargs_star['message'] = message
-                            return  APIFilterInject(func)(*args,**kwargs_star)
+                            return  filtered_func(*args,**kwargs_star)
                         elif type_ == dict:
                             message:dict = await websocket.receive_json()
                             kwargs_star['message'] = message
-                            return  APIFilterInject(func)(*args,**kwargs_star)
+                            return  filtered_func(*args,**kwargs_star)
                         elif type_ == BaseModel:
                             message:dict = await websocket.receive_json()
                             kwargs_star['message'] = message
                             ... # TODO verify
-                            return  APIFilterInject(func)(*args,**kwargs_star)
+                            return  filtered_func(*args,**kwargs_star)
                         elif type_ == BaseProtocol:
                             ... # TODO verify
                             message:BaseProtocol = await websocket.receive_json()
                             kwargs_star['message'] = message
                             key = 'protocol_name' if set_protocol_key == None else 'protocol_name'
-                            c_result = APIFilterInject(func)(*args,**kwargs_star)
+                            c_result = filtered_func(*args,**kwargs_star)
                             h_protocol =APIFilterInject(self.protocol[message[key]])(message)
 
                             if handler =='current':
@@ -138,7 +144,7 @@ class BaseWebSocketRessource(EventInterface,metaclass = WSRessMetaClass):
                             return self._hybrid_protocol_handler(c_result,h_protocol)
 
                 except WebSocketDisconnect:
-                    APIFilterInject(BaseWebSocketRessource.on_disconnect)(*args,**kwargs_star)
+                    on_disconnect(*args,**kwargs_star)
                     manager.disconnect(websocket)
 
             return wrapper
@@ -168,7 +174,7 @@ class BaseWebSocketRessource(EventInterface,metaclass = WSRessMetaClass):
 
         self.jwtAuthService = jwtAuthService
         self.prettyPrinter = PrettyPrinter_
-        self.run_id = generateId(30)
+        self.run_id = generateUlid()
         self._register_protocol()
 
         self.bypass_auth = False
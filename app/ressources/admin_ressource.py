@@ -1,7 +1,10 @@
 from dataclasses import dataclass
 from typing import Annotated, Any, List, Optional
 from fastapi import Depends, Header, Request, Response,HTTPException,status
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
 from app.classes.celery import SchedulerModel, TaskType
 from app.decorators.guards import CeleryTaskGuard
 from app.services.assets_service import AssetService
@@ -12,7 +15,7 @@ from app.utils.dependencies import get_admin_token, get_auth_permission, get_req
 from app.container import InjectInMethod,Get
 from app.definition._ressource import Guard, UseGuard, UseHandler, UsePermission,BaseHTTPRessource,HTTPMethod,HTTPRessource, UsePipe, UseRoles,UseLimiter
 from app.decorators.permissions import JWTRouteHTTPPermission
-from app.classes.auth_permission import AuthPermission, Role,RoutePermission,AssetsPermission, TokensModel
+from app.classes.auth_permission import AuthPermission, Role,RoutePermission,AssetsPermission, TokensModel, mask_to_roles
 from pydantic import BaseModel, RootModel,field_validator
 from app.decorators.handlers import ServiceAvailabilityHandler
 from app.decorators.pipes import AuthPermissionPipe, CeleryTaskPipe
@@ -20,6 +23,8 @@ from app.utils.validation import ipv4_validator
 from slowapi.util import get_remote_address
 
 ADMIN_PREFIX = 'admin'
+ISSUE_CHUNK_SIZE = 128
+ISSUE_WORKERS = os.cpu_count() or 1
 
 
 async def verify_admin_token(x_admin_token: Annotated[str, Header()]):
@@ -63,9 +68,19 @@ class AdminRessource(BaseHTTPRessource):
     @UseGuard(CeleryTaskGuard(task_names=['task_blacklist_client'],task_types=[TaskType.ONCE]))
     @BaseHTTPRessource.HTTPRoute('/blacklist/{client_id}',methods=[HTTPMethod.DELETE])
     def blacklist_tokens(self,client_id:str,request:Request ,scheduler:BlacklistScheduler,authPermission=Depends(get_auth_permission)):
-        # TODO verify if already blacklisted
         # TODO add to database 
+        if not self.jwtAuthService.blacklist_shared:
+            # NOTE the task runs in the celery worker, without redis the revocation would never reach the api workers
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,detail='TOKEN_BLACKLIST_REDIS_URL not configured, the client cannot be blacklisted')
         return self.celeryService.trigger_task_from_scheduler(scheduler,client_id)
+
+    @UseLimiter(limit_value='100/day')
+    @BaseHTTPRessource.HTTPRoute('/revoke-tokens/',methods=[HTTPMethod.DELETE])
+    def revoke_tokens(self,tokens:TokensModel,request:Request,authPermission=Depends(get_auth_permission)):
+        tokens = tokens.tokens if isinstance(tokens.tokens,list) else [tokens.tokens]
+        for token in tokens:
+            self.jwtAuthService.revoke_token(token)
+        return JSONResponse(status_code=status.HTTP_200_OK,content={"message":"Tokens successfully revoked"})
     
     @UseLimiter(limit_value='1/day')
     @BaseHTTPRessource.HTTPRoute('/invalidate-all/',methods=[HTTPMethod.DELETE])
@@ -77,6 +92,20 @@ class AdminRessource(BaseHTTPRessource):
                                                                     "details": "Even if you're the admin old token wont be valid anymore",
                                                                     "tokens":tokens})
     
+    @UseLimiter(limit_value='100/day')
+    @BaseHTTPRessource.HTTPRoute('/invalidate-client/{client_id}',methods=[HTTPMethod.DELETE])
+    def invalidate_client_tokens(self,client_id:str,request:Request,authPermission=Depends(get_auth_permission)):
+        self.jwtAuthService.pingService()
+        self.jwtAuthService.rotate_client_generation(client_id)
+        return JSONResponse(status_code=status.HTTP_200_OK,content={"message":f"Tokens of client {client_id} successfully invalidated"})
+
+    @UseLimiter(limit_value='10/day')
+    @BaseHTTPRessource.HTTPRoute('/invalidate-role/{role}',methods=[HTTPMethod.DELETE])
+    def invalidate_role_tokens(self,role:Role,request:Request,authPermission=Depends(get_auth_permission)):
+        self.jwtAuthService.pingService()
+        self.jwtAuthService.rotate_role_generation(role)
+        return JSONResponse(status_code=status.HTTP_200_OK,content={"message":f"Tokens holding the role {role.value} successfully invalidated"})
+
     @UseLimiter(limit_value='4/day')
     @BaseHTTPRessource.HTTPRoute('/issue-auth/',methods=[HTTPMethod.GET])
     def issue_auth_token(self,authModel:AuthPermissionModel | List[AuthPermissionModel],request:Request, authPermission=Depends(get_auth_permission)):
@@ -96,17 +125,46 @@ class AdminRessource(BaseHTTPRessource):
         tokens = self._create_tokens(tokens)
         return JSONResponse(status_code=status.HTTP_200_OK,content={'tokens':tokens ,"message":"Tokens successfully invalidated"})
     
+    @BaseHTTPRessource.HTTPRoute('/token-cache/',methods=[HTTPMethod.GET])
+    def token_cache_metrics(self,request:Request,authPermission=Depends(get_auth_permission)):
+        return JSONResponse(status_code=status.HTTP_200_OK,content={"auth_token":self.jwtAuthService.token_cache_metrics,
+                                                                    "api_token":self.securityService.token_cache_metrics,
+                                                                    "blacklist":self.jwtAuthService.blacklist_metrics})
+
+    @BaseHTTPRessource.HTTPRoute('/background-tasks/',methods=[HTTPMethod.GET])
+    def background_task_metrics(self,request:Request,authPermission=Depends(get_auth_permission)):
+        return JSONResponse(status_code=status.HTTP_200_OK,content=Get(BackgroundTaskService).task_metrics)
+
+    @UseLimiter(limit_value='4/day')
+    @BaseHTTPRessource.HTTPRoute('/issue-auth/bulk/',methods=[HTTPMethod.POST])
+    def issue_auth_token_bulk(self,authModel:List[AuthPermissionModel],request:Request, authPermission=Depends(get_auth_permission)):
+        """
+        Issue the tokens of many clients at once, one json line per client streamed as soon as its chunk is encoded
+        """
+        self.jwtAuthService.pingService()
+        return StreamingResponse(self._stream_tokens(authModel),media_type='application/x-ndjson')
+
+    def _stream_tokens(self,tokens):
+        chunks = [tokens[i:i+ISSUE_CHUNK_SIZE] for i in range(0,len(tokens),ISSUE_CHUNK_SIZE)]
+        with ThreadPoolExecutor(ISSUE_WORKERS,thread_name_prefix='token-issue') as executor:
+            # NOTE map keeps the order of the chunks, the first ones are sent while the next ones are encoded
+            for issued in executor.map(lambda chunk: [self._issue_token(token) for token in chunk],chunks):
+                yield ''.join(json.dumps({'issued_for':issued_for,**secrets})+'\n' for issued_for,secrets in issued)
+
+    def _issue_token(self,token):
+        if isinstance(token,BaseModel):
+            token = token.model_dump()
+        issued_for = token['issued_for']
+        allowed_routes = token['allowed_routes']
+        # NOTE the refreshed tokens only carry the mask of their roles
+        roles = token['roles'] if 'roles' in token else [role.value for role in mask_to_roles(token['role_mask'])]
+        public = Role.PUBLIC.value
+        if public not in roles:
+            roles.append(public)
+        # allowed_assets = token['allowed_assets']
+        api_token  = self.securityService.generate_custom_api_key(issued_for)
+        auth_token = self.jwtAuthService.encode_auth_token(allowed_routes,roles,issued_for)
+        return issued_for,{"api_token":api_token,"auth_token":auth_token}
+
     def _create_tokens(self,tokens):
-        temp ={}
-        for token in tokens:
-            issued_for = token['issued_for']
-            allowed_routes = token['allowed_routes']
-            roles = token['roles']
-            public = Role.PUBLIC.value
-            if public not in roles:
-                roles.append(public)
-            # allowed_assets = token['allowed_assets']
-            api_token  = self.securityService.generate_custom_api_key(issued_for)
-            auth_token = self.jwtAuthService.encode_auth_token(allowed_routes,roles,issued_for)
-            temp[issued_for]={"api_token":api_token,"auth_token":auth_token}
-        return temp 
\ No newline at end of file
+        return dict(self._issue_token(token) for token in tokens)
@@ -87,7 +87,7 @@ class EmailTemplateRessource(BaseHTTPRessource):
             if scheduler.task_type == 'now' or scheduler.task_type == 'once':
                 return self.bkgTaskService.add_task( scheduler.heaviness,x_request_id,self.emailService.sendTemplateEmail, data, meta, template.images )
 
-        return self.celeryService.trigger_task_from_scheduler(scheduler,data, meta, template.images)
+        return self.celeryService.trigger_task_from_scheduler(scheduler,data, meta, self.assetService.imageStoreService.export_images_refs(template.images))
     
     @UseLimiter(limit_value='10000/minute')
     @UseGuard(guards.CeleryTaskGuard(task_names=['task_send_custom_mail']))
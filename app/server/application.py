@@ -2,7 +2,7 @@
 Contains the FastAPI app
 """
 from dataclasses import dataclass
-from app.container import Get
+from app.container import Get, InjectedServices
 from app.ressources import *
 from app.utils.prettyprint import PrettyPrinter_
 from starlette.types import ASGIApp
@@ -10,7 +10,7 @@ from app.services.config_service import ConfigService
 from app.services.security_service import JWTAuthService, SecurityService
 from fastapi import Request, Response, FastAPI
 from slowapi.middleware import SlowAPIMiddleware
-from starlette.middleware.base import BaseHTTPMiddleware, DispatchFunction
+from app.server.middleware import MiddleWare, RequestScopeMiddleware, TimeToFirstRequestMiddleware
 from typing import Any, Awaitable, Callable, Dict, Literal, MutableMapping, overload, TypedDict
 import uvicorn
 from slowapi.errors import RateLimitExceeded
@@ -19,6 +19,7 @@ import multiprocessing
 import threading
 import sys
 import datetime as dt
+import time
 from app.definition._ressource import RESSOURCES, BaseHTTPRessource, GlobalLimiter
 from app.interface.events import EventInterface
 
@@ -34,12 +35,12 @@ class AppParameter:
     summary: str
     description: str
     ressources: list[type[BaseHTTPRessource]]
-    middlewares: list[type[BaseHTTPMiddleware]]
+    middlewares: list[type[MiddleWare]]
     port: int = 8000
     log_level: str = 'debug'
     log_config: Any = None
 
-    def __init__(self, title: str, summary: str, description: str, ressources: list[type[BaseHTTPRessource]], middlewares: list[type[BaseHTTPMiddleware]] = [], port=8000, log_level='debug',):
+    def __init__(self, title: str, summary: str, description: str, ressources: list[type[BaseHTTPRessource]], middlewares: list[type[MiddleWare]] = [], port=8000, log_level='debug',):
         self.title: str = title
         self.summary: str = summary
         self.description: str = description
@@ -59,6 +60,21 @@ class AppParameter:
             'log_level': self.log_level,
         }
 
+    @property
+    def services(self) -> list[type]:
+        """
+        The services injected in the ressources of the app, their included routers and websockets, and its middlewares
+        """
+        funcs = [middleware.inject_middleware for middleware in self.middlewares if hasattr(middleware, 'inject_middleware')]
+        ressources = list(self.ressources)
+        while ressources:
+            ressource = ressources.pop()
+            funcs.append(ressource.__init__)
+            meta = getattr(ressource, 'meta', {})
+            ressources.extend(meta.get('routers', []))
+            ressources.extend(meta.get('websockets', []))
+        return InjectedServices(*funcs)
+
     def set_fromJSON(self, json: Dict[AppParameterKey, Any], RESSOURCES, MIDDLEWARE):
         clone = AppParameter.fromJSON(json, RESSOURCES, MIDDLEWARE)
         self.__dict__ = clone.__dict__
@@ -79,6 +95,10 @@ class AppParameter:
 
 
 class Application(EventInterface):
+    # NOTE perf_counter value at the start of the process, set by main.py
+    boot_time: float | None = None
+    # NOTE the services every application uses whatever its ressources, see __init__ and on_startup
+    services = [ConfigService, JWTAuthService, CeleryService]
 
     # TODO if it important add other on_start_up and on_shutdown hooks
     def __init__(self, appParameter: AppParameter):
@@ -159,6 +179,10 @@ class Application(EventInterface):
                 self.pretty_printer.success(f"[{now}] Ressource {ressource_type.__name__} added successfully",saveable=True)
                 self.pretty_printer.wait(0.25,press_to_continue=False)
             except Exception as e:
+                if self.pretty_printer.headless:
+                    # NOTE fail fast, nobody is there to press to continue
+                    self.pretty_printer.event('ressource_failed', app=self.appParameter.title, ressource=ressource_type.__name__, error=repr(e))
+                    sys.exit(1)
                 print(e.__class__)
                 print(e)
                 self.pretty_printer.error(f"[{now}] Error adding ressource {ressource_type.__name__} to the app",saveable=True)
@@ -170,15 +194,24 @@ class Application(EventInterface):
         self.app.add_middleware(SlowAPIMiddleware)
         for middleware in sorted(self.appParameter.middlewares,key=lambda x: x.priority.value, reverse=True):
             self.app.add_middleware(middleware)
+        self.app.add_middleware(RequestScopeMiddleware)
+        if self.pretty_printer.headless and self.boot_time is not None:
+            self.app.add_middleware(TimeToFirstRequestMiddleware, boot_time=self.boot_time, title=self.appParameter.title)
 
     def on_startup(self):
         jwtService = Get(JWTAuthService)
         jwtService.set_generation_id(False)
 
         celery_service:CeleryService = Get(CeleryService)
+        celery_service.start_monitor()
         celery_service.start_interval(60*60)
+        if self.boot_time is not None:
+            self.pretty_printer.event('app_ready', app=self.appParameter.title, port=self.appParameter.port,
+                                      seconds=round(time.perf_counter() - self.boot_time, 4))
 
     def on_shutdown(self):
+        celery_service:CeleryService = Get(CeleryService)
+        celery_service.stop_monitor()
         # for thread in threading.enumerate():
         #     if thread is not threading.current_thread():
         #         thread.join()
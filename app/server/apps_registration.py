@@ -3,6 +3,10 @@ from app.utils.prettyprint import printJSON, show, PrettyPrinter_
 from app.definition._ressource import RESSOURCES
 from app.utils.question import ListInputHandler, ask_question, SimpleInputHandler, NumberInputHandler, ConfirmInputHandler, CheckboxInputHandler, ExpandInputHandler,exactly_one,one_or_more,one_or_more_invalid_message,instruction
 from .application import AppParameter, Application
+from .supervisor import AppGroup, Supervisor, report
+from app.container import Get
+from app.services.config_service import ConfigService
+import os
 
 ressources_key: set = set(RESSOURCES.keys())
 middlewares_key = list(MIDDLEWARE.keys())
@@ -92,5 +96,31 @@ def editApps(json_file_app_data: list[dict]) -> list[AppParameter]:
 
 
 def start_applications(applications:list[AppParameter]):
-    for app in applications:
-        Application(appParameter=app).start()
\ No newline at end of file
+    if not hasattr(os, 'fork'):
+        # NOTE no fork on windows, only the first application is served
+        PrettyPrinter_.warning('Process fork not available, serving the applications one after the other in this process',saveable=False)
+        for app in applications:
+            Application(appParameter=app).start()
+        return
+
+    configService: ConfigService = Get(ConfigService)
+    if not configService.TOKEN_GENERATIONS_REDIS_URL:
+        # NOTE the token invalidations of a client or a role would only reach the worker receiving them
+        if configService.SERVER_WORKERS > 1:
+            report('error', 'invalid_config', f'TOKEN_GENERATIONS_REDIS_URL is required to serve with {configService.SERVER_WORKERS} workers per application',
+                   reason='TOKEN_GENERATIONS_REDIS_URL required', workers=configService.SERVER_WORKERS)
+            exit(1)
+        if len(applications) > 1:
+            report('warning', 'shared_generations_disabled', 'Without TOKEN_GENERATIONS_REDIS_URL a token invalidation only applies to the application receiving it until the others restart',
+                   applications=len(applications))
+
+    groups = []
+    for appParameter in applications:
+        application = Application(appParameter=appParameter)
+        ssl = {}
+        if application.mode == 'HTTPS':
+            ssl = {'ssl_keyfile': configService.HTTPS_KEY, 'ssl_certfile': configService.HTTPS_CERTIFICATE}
+        groups.append(AppGroup(appParameter.title, application.app, appParameter.port, configService.SERVER_WORKERS,
+                               configService.SERVER_ENGINE, configService.SERVER_REUSE_PORT, appParameter.log_level, **ssl))
+
+    Supervisor(groups, configService.SERVER_GRACEFUL_TIMEOUT).run()
\ No newline at end of file
@@ -1,22 +1,22 @@
-import asyncio
 from fastapi.responses import JSONResponse
 from app.classes.auth_permission import AuthPermission, Role
 from app.services.celery_service import BackgroundTaskService
 from app.services.config_service import ConfigService
 from app.services.security_service import SecurityService, JWTAuthService
-from app.container import InjectInMethod
+from app.container import InjectInMethod, RequestScope
 from fastapi import HTTPException, Request, Response, FastAPI,status
-from starlette.middleware.base import BaseHTTPMiddleware, DispatchFunction
 from starlette.datastructures import MutableHeaders,Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 from typing import Any, Awaitable, Callable, MutableMapping
 import time
 from app.interface.injectable_middleware import InjectableMiddlewareInterface
+from app.utils.prettyprint import PrettyPrinter_
 from app.utils.constant import ConfigAppConstant, HTTPHeaderConstant
-from app.utils.dependencies import get_api_key, get_client_ip,get_bearer_token_from_request, get_response_id
+from app.utils.dependencies import get_api_key, get_client_ip,get_bearer_token_from_request
 from cryptography.fernet import InvalidToken
 from enum import Enum
 
-from app.utils.helper import generateId
+from app.utils.helper import generateUlid
 
 
 MIDDLEWARE: dict[str, type] = {}
@@ -29,48 +29,73 @@ class MiddlewarePriority(Enum):
     BACKGROUND_TASK_SERVICE = 5
 
 
-class MiddleWare(BaseHTTPMiddleware):
+class MiddleWare:
+    """
+    Pure ASGI middleware: `dispatch` receives the http scope and either returns a response to short-circuit
+    the request or calls `self.app` itself. Other scopes (websocket, lifespan) go straight to the app.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
 
     def __init_subclass__(cls: type) -> None:
         MIDDLEWARE[cls.__name__] = cls
         #setattr(cls,'priority',None)
-        
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        response = await self.dispatch(scope, receive, send)
+        if response is not None:
+            await response(scope, receive, send)
+
+    async def dispatch(self, scope: Scope, receive: Receive, send: Send) -> Response | None:
+        await self.app(scope, receive, send)
+
+
 class ProcessTimeMiddleWare(MiddleWare):
     priority = MiddlewarePriority.PROCESS_TIME
-    def __init__(self, app, dispatch=None) -> None:
-        super().__init__(app, dispatch)
+    def __init__(self, app) -> None:
+        super().__init__(app)
 
-    async def dispatch(self, request: Request, call_next: Callable[..., Response]):
+    async def dispatch(self, scope: Scope, receive: Receive, send: Send):
         start_time = time.time()
-        response: Response = await call_next(request)
-        process_time = time.time() - start_time
-        response.headers["X-Process-Time"] = str(process_time) + ' (s)'
-        return response
+
+        async def send_wrapper(message: Message):
+            if message['type'] == 'http.response.start':
+                process_time = time.time() - start_time
+                headers = MutableHeaders(scope=message)
+                headers["X-Process-Time"] = str(process_time) + ' (s)'
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
 
 class SecurityMiddleWare(MiddleWare, InjectableMiddlewareInterface):
     priority = MiddlewarePriority.SECURITY
-    def __init__(self, app, dispatch=None) -> None:
-        MiddleWare.__init__(self, app, dispatch)
+    def __init__(self, app) -> None:
+        MiddleWare.__init__(self, app)
         InjectableMiddlewareInterface.__init__(self)
 
-    async def dispatch(self, request: Request, call_next: Callable[..., Response]):
+    async def dispatch(self, scope: Scope, receive: Receive, send: Send):
         current_time = time.time()
         timestamp =  self.configService.config_json_app.data[ConfigAppConstant.META_KEY][ConfigAppConstant.EXPIRATION_TIMESTAMP_KEY]
         diff = timestamp -current_time
         if diff< 0:
             return JSONResponse(status_code=status.HTTP_401_UNAUTHORIZED, content={"message": "Unauthorized", "detail": "All Access and Auth token are expired"})
         try:
+            request = Request(scope)
             request_api_key = get_api_key(request)
             if request_api_key is None:
                 return Response(status_code=status.HTTP_401_UNAUTHORIZED, content="Unauthorized")
             client_ip = get_client_ip(request)
             if not self.securityService.verify_server_access(request_api_key, client_ip):
                 return Response(status_code=status.HTTP_401_UNAUTHORIZED, content="Unauthorized")
-            response: Response = await call_next(request)
-            return response
         except InvalidToken:
             return Response(status_code=status.HTTP_401_UNAUTHORIZED, content='Unauthorized')
 
+        await self.app(scope, receive, send)
+
     @InjectInMethod
     def inject_middleware(self, securityService: SecurityService, configService: ConfigService):
         self.securityService = securityService
@@ -78,52 +103,105 @@ class SecurityMiddleWare(MiddleWare, InjectableMiddlewareInterface):
 
 class AnalyticsMiddleware(MiddleWare, InjectableMiddlewareInterface):
     priority = MiddlewarePriority.ANALYTICS
-    async def dispatch(self, request, call_next):
-        return await call_next(request)
 
 class JWTAuthMiddleware(MiddleWare, InjectableMiddlewareInterface):
     priority = MiddlewarePriority.AUTH
-    def __init__(self, app, dispatch=None) -> None:
-        MiddleWare.__init__(self, app, dispatch)
+    def __init__(self, app) -> None:
+        MiddleWare.__init__(self, app)
         InjectableMiddlewareInterface.__init__(self)
 
     @InjectInMethod
     def inject_middleware(self, jwtService: JWTAuthService):
         self.jwtService = jwtService
 
-    async def dispatch(self,  request: Request, call_next: Callable[..., Response]):  
+    async def dispatch(self, scope: Scope, receive: Receive, send: Send):
         try:
+            request = Request(scope)
             token = get_bearer_token_from_request(request)
             client_ip = get_client_ip(request)
             authPermission: AuthPermission = self.jwtService.verify_permission(token, client_ip)
-            authPermission["roles"] = [Role._member_map_[r] for r in authPermission["roles"]]
             request.state.authPermission = authPermission
             
         except KeyError as e:
             return JSONResponse('Error while getting value',status_code=status.HTTP_400_BAD_REQUEST)
+        except HTTPException as e:
+            # NOTE the exception handlers of the app only wrap the router, the middleware answers itself
+            return JSONResponse({'detail': e.detail}, status_code=e.status_code, headers=e.headers)
 
-        return await call_next(request)
+        await self.app(scope, receive, send)
        
 
 class BackgroundTaskMiddleware(MiddleWare,InjectableMiddlewareInterface):
     priority = MiddlewarePriority.BACKGROUND_TASK_SERVICE
-    def __init__(self, app, dispatch = None):
-        MiddleWare.__init__(self, app, dispatch)
+    def __init__(self, app):
+        MiddleWare.__init__(self, app)
         InjectableMiddlewareInterface.__init__(self)
     
     @InjectInMethod
     def inject_middleware(self,backgroundTaskService:BackgroundTaskService):
         self.backgroundTaskService = backgroundTaskService
     
-    async def dispatch(self, request:Request, call_next):
-        request_id = generateId(25)
+    async def dispatch(self, scope: Scope, receive: Receive, send: Send):
+        request_id = generateUlid()
         self.backgroundTaskService._register_tasks(request_id)
-        request.state.request_id = request_id
-        response = await call_next(request)
-        rq_response_id = get_response_id(response) #NOTE if theres no rq_response_id in the response this means we can safely remove the referencece
-        if rq_response_id:
-            asyncio.create_task(self.backgroundTaskService(rq_response_id)) 
-        else: 
-            self.backgroundTaskService._delete_tasks(request_id)
-        return response   
-        
+        scope.setdefault('state', {})['request_id'] = request_id
+        rq_response_id = None
+
+        async def send_wrapper(message: Message):
+            nonlocal rq_response_id
+            if message['type'] == 'http.response.start':
+                rq_response_id = Headers(raw=message['headers']).get(HTTPHeaderConstant.REQUEST_ID)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            #NOTE if theres no rq_response_id in the response this means we can safely remove the referencece
+            if rq_response_id:
+                # NOTE only queues the tasks, the executor of the service runs them
+                await self.backgroundTaskService(rq_response_id)
+            else: 
+                self.backgroundTaskService._delete_tasks(request_id)
+
+
+class RequestScopeMiddleware:
+    """
+    Outermost middleware of every application, opens the request scope of the container for each http and websocket
+    connection. Not a `MiddleWare` so that it is always added and never proposed when registering the apps.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] not in ('http', 'websocket'):
+            await self.app(scope, receive, send)
+            return
+        async with RequestScope():
+            await self.app(scope, receive, send)
+
+
+class TimeToFirstRequestMiddleware:
+    """
+    Report once the time between the boot of the process and the start of the first response, added in headless mode
+    """
+
+    def __init__(self, app: ASGIApp, boot_time: float, title: str) -> None:
+        self.app = app
+        self.boot_time = boot_time
+        self.title = title
+        self.reported = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if self.reported or scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message: Message):
+            if message['type'] == 'http.response.start' and not self.reported:
+                self.reported = True
+                PrettyPrinter_.event('first_request', app=self.title, path=scope['path'], status=message['status'],
+                                     seconds=round(time.perf_counter() - self.boot_time, 4))
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
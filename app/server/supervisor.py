@@ -0,0 +1,298 @@
+"""
+Runs every configured application in its own group of worker processes
+"""
+from dataclasses import dataclass
+import os
+import select
+import signal
+import socket
+import time
+from typing import Any, Callable
+import uvicorn
+from starlette.types import ASGIApp
+from app.container import PreloadForFork
+from app.utils.prettyprint import PrettyPrinter_
+
+HOST = '127.0.0.1'  # NOTE same default as uvicorn.run
+BACKLOG = 2048
+MIN_UPTIME = 5  # NOTE a worker exiting sooner is counted as a crash loop
+MAX_RESTART_DELAY = 30
+
+
+def resolve_engine(engine: str) -> tuple[str, str]:
+    """
+    The uvicorn loop and http implementations of the engine, uvloop and httptools are optional
+    """
+    if engine == 'uvloop':
+        try:
+            import uvloop
+            import httptools
+            return 'uvloop', 'httptools'
+        except ImportError:
+            report('warning', 'engine_fallback', 'uvloop or httptools is not installed, falling back on asyncio and h11')
+    return 'asyncio', 'h11'
+
+
+def bind_socket(port: int, reuse_port: bool) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((HOST, port))
+    sock.listen(BACKLOG)
+    return sock
+
+
+def report(level: str, event: str, message: str, **fields):
+    if PrettyPrinter_.headless:
+        PrettyPrinter_.event(event, **fields)
+    else:
+        getattr(PrettyPrinter_, level)(message, saveable=False)
+
+
+class ReadyServer(uvicorn.Server):
+    """
+    uvicorn server writing on a pipe once its sockets accept connections, so the supervisor knows a replacement is
+    ready before stopping the worker it replaces
+    """
+
+    def __init__(self, config: uvicorn.Config, ready_fd: int) -> None:
+        super().__init__(config)
+        self.ready_fd = ready_fd
+
+    async def startup(self, sockets: list[socket.socket] | None = None) -> None:
+        await super().startup(sockets)
+        if self.started:
+            os.write(self.ready_fd, b'1')
+
+
+@dataclass
+class Worker:
+    pid: int
+    ready_fd: int
+    started_at: float
+    ready: bool = False
+    stopping: bool = False
+
+
+class AppGroup:
+    """
+    The worker processes of one application, in their own process group. Without `reuse_port` the workers accept on
+    the socket bound once by the supervisor, otherwise each one binds its own SO_REUSEPORT socket and the kernel
+    balances the connections between them.
+    """
+
+    def __init__(self, title: str, app: ASGIApp, port: int, workers: int, engine: str, reuse_port: bool = False, log_level: str = 'info', **uvicorn_kwargs: Any) -> None:
+        self.title = title
+        self.app = app
+        self.port = port
+        self.size = workers
+        self.loop, self.http = resolve_engine(engine)
+        self.reuse_port = reuse_port
+        self.log_level = log_level
+        self.uvicorn_kwargs = uvicorn_kwargs
+
+        self.sock = None if reuse_port else bind_socket(port, False)
+        self.pgid = 0
+        self.workers: dict[int, Worker] = {}
+        self.crashes = 0
+        self.restarts: list[float] = []
+
+    def spawn(self) -> Worker:
+        # NOTE a new group is started once every worker of the previous one is reaped, zombies still hold it
+        pgid = self.pgid if self.workers else 0
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            code = 1
+            try:
+                code = self._serve(pgid, write_fd)
+            finally:
+                os._exit(code)
+
+        os.close(write_fd)
+        try:
+            # NOTE done on both sides of the fork, whichever runs first
+            os.setpgid(pid, pgid)
+        except OSError:
+            ...
+        self.pgid = pgid or pid
+        worker = Worker(pid, read_fd, time.monotonic())
+        self.workers[pid] = worker
+        report('info', 'worker_started', f'Worker {pid} of {self.title} started', app=self.title, pid=pid)
+        return worker
+
+    def _serve(self, pgid: int, ready_fd: int) -> int:
+        for sig in (signal.SIGINT, signal.SIGTERM, signal.SIGHUP, signal.SIGCHLD):
+            signal.signal(sig, signal.SIG_DFL)
+        try:
+            os.setpgid(0, pgid)
+        except OSError:
+            ...
+
+        sock = self.sock if self.sock is not None else bind_socket(self.port, True)
+        config = uvicorn.Config(self.app, host=HOST, port=self.port, loop=self.loop, http=self.http, log_level=self.log_level, **self.uvicorn_kwargs)
+        server = ReadyServer(config, ready_fd)
+        server.run(sockets=[sock])
+        return 0 if server.started else 3
+
+    def poll_ready(self):
+        pending = {w.ready_fd: w for w in self.workers.values() if not w.ready and w.ready_fd >= 0}
+        if not pending:
+            return
+        readable, _, _ = select.select(list(pending), [], [], 0)
+        for fd in readable:
+            worker = pending[fd]
+            data = os.read(fd, 1)
+            os.close(fd)
+            worker.ready_fd = -1
+            if data:
+                worker.ready = True
+                report('success', 'worker_ready', f'Worker {worker.pid} of {self.title} ready', app=self.title, pid=worker.pid,
+                       seconds=round(time.monotonic() - worker.started_at, 4))
+
+    def exited(self, pid: int, code: int, stopping_all: bool):
+        worker = self.workers.pop(pid)
+        if worker.ready_fd >= 0:
+            os.close(worker.ready_fd)
+        uptime = time.monotonic() - worker.started_at
+        if worker.stopping or stopping_all:
+            report('info', 'worker_stopped', f'Worker {pid} of {self.title} stopped', app=self.title, pid=pid, code=code)
+            return
+
+        self.crashes = self.crashes + 1 if uptime < MIN_UPTIME else 0
+        delay = min(MAX_RESTART_DELAY, 0.5 * 2 ** self.crashes) if self.crashes else 0
+        self.restarts.append(time.monotonic() + delay)
+        report('error', 'worker_crashed', f'Worker {pid} of {self.title} exited with code {code}, restarting in {delay}s',
+               app=self.title, pid=pid, code=code, uptime=round(uptime, 4), restart_in=delay)
+
+    def restart_due(self):
+        now = time.monotonic()
+        due = [t for t in self.restarts if t <= now]
+        self.restarts = [t for t in self.restarts if t > now]
+        for _ in due:
+            self.spawn()
+
+    def stop(self, worker: Worker, sig: signal.Signals = signal.SIGTERM):
+        worker.stopping = True
+        try:
+            os.kill(worker.pid, sig)
+        except ProcessLookupError:
+            ...
+
+    def signal_group(self, sig: signal.Signals):
+        if not self.pgid:
+            return
+        try:
+            os.killpg(self.pgid, sig)
+        except ProcessLookupError:
+            ...
+
+
+class Supervisor:
+    """
+    Forks `workers` processes per application after preloading the container, restarts the crashed ones with a
+    backoff and replaces them one by one on SIGHUP. SIGTERM and SIGINT stop every worker gracefully.
+    """
+
+    def __init__(self, groups: list[AppGroup], graceful_timeout: float = 30) -> None:
+        self.groups = groups
+        self.graceful_timeout = graceful_timeout
+        self.stopping = False
+        self.reload_requested = False
+
+    def _on_stop(self, signum, frame):
+        self.stopping = True
+
+    def _on_reload(self, signum, frame):
+        self.reload_requested = True
+
+    def run(self):
+        # NOTE the workers share the built services and parsed assets copy-on-write
+        PreloadForFork()
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_reload)
+
+        for group in self.groups:
+            for _ in range(group.size):
+                group.spawn()
+
+        while not self.stopping:
+            self._tick()
+            if self.reload_requested:
+                self.reload_requested = False
+                self.rolling_restart()
+            time.sleep(0.1)
+
+        self.shutdown()
+
+    def _tick(self):
+        self._reap()
+        for group in self.groups:
+            group.poll_ready()
+            if not self.stopping:
+                group.restart_due()
+
+    def _reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            code = os.waitstatus_to_exitcode(status)
+            for group in self.groups:
+                if pid in group.workers:
+                    group.exited(pid, code, self.stopping)
+                    break
+
+    def _wait(self, condition: Callable[[], bool], timeout: float, abort_on_stop: bool = False) -> bool:
+        # NOTE only a rolling restart gives up on a stop request, the shutdown waits for its workers to drain
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            self._tick()
+            if condition():
+                return True
+            if abort_on_stop and self.stopping:
+                return False
+            time.sleep(0.05)
+        return condition()
+
+    def rolling_restart(self):
+        """
+        Replace the workers one at a time: the new worker has to be ready before the old one is asked to stop, so the
+        application keeps serving with its full capacity minus at most one worker draining
+        """
+        report('info', 'rolling_restart', 'Rolling restart of the workers')
+        for group in self.groups:
+            for old in list(group.workers.values()):
+                if old.stopping or old.pid not in group.workers:
+                    continue
+                new = group.spawn()
+                if not self._wait(lambda: new.ready or new.pid not in group.workers, self.graceful_timeout, True) or not new.ready:
+                    report('error', 'rolling_restart_aborted', f'Worker {new.pid} of {group.title} did not get ready, rolling restart aborted',
+                           app=group.title, pid=new.pid)
+                    if new.pid in group.workers:
+                        group.stop(new, signal.SIGKILL)
+                    return
+                group.stop(old)
+                if not self._wait(lambda: old.pid not in group.workers, self.graceful_timeout, True):
+                    if self.stopping:
+                        return  # NOTE the old worker is draining, the shutdown waits for it with the others
+                    group.stop(old, signal.SIGKILL)
+        report('success', 'rolling_restart_done', 'Rolling restart done')
+
+    def shutdown(self):
+        for group in self.groups:
+            for worker in group.workers.values():
+                worker.stopping = True
+            group.signal_group(signal.SIGTERM)
+
+        if not self._wait(lambda: not any(group.workers for group in self.groups), self.graceful_timeout):
+            for group in self.groups:
+                group.signal_group(signal.SIGKILL)
+            self._wait(lambda: not any(group.workers for group in self.groups), 5)
+        report('info', 'supervisor_stopped', 'Every worker stopped')
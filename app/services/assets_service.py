@@ -1,11 +1,14 @@
 from fastapi import HTTPException,status
 from .config_service import ConfigService
 from app.utils.fileIO import FDFlag
-from app.classes.template import Asset, HTMLTemplate, PDFTemplate, SMSTemplate, PhoneTemplate, Template
+from app.classes.template import Asset, AssetNotFoundError, HTMLTemplate, PDFTemplate, SMSTemplate, PhoneTemplate, Template
+from app.classes.translation import TranslationMemory, TranslatorFactory
+from app.classes.prefix_trie import PrefixTrie
 from .security_service import SecurityService
 from .file_service import FileService, FTPService
 from app.definition import _service
 from injector import inject
+from hashlib import sha256
 from enum import Enum
 import os
 from threading import Thread
@@ -127,20 +130,81 @@ class ThreadedReader(Reader):
         return self.values
 
 
+@_service.ServiceClass
+class ImageStoreService(_service.Service):
+    """
+    The images of the assets indexed by their content-addressed reference, apart from the templates so the celery
+    worker resolves the images of a payload without loading the templates nor the translation memory
+    """
+    @inject
+    def __init__(self, fileService: FileService) -> None:
+        super().__init__()
+        self.fileService = fileService
+        self.images: dict[str, Asset] = {}
+        self.images_refs: dict[str, str] = {}
+        self.images_by_ref: dict[str, Asset] = {}
+
+    def build(self):
+        Reader.fileService = self.fileService
+        self.images = Reader()(Extension.JPEG, FDFlag.READ_BYTES, AssetType.IMAGES.value)
+        self.images_refs = {path: self.asset_ref(image.content) for path, image in self.images.items()}
+        self.images_by_ref = {self.images_refs[path]: image for path, image in self.images.items()}
+
+    @staticmethod
+    def asset_ref(content: bytes) -> str:
+        return sha256(content).hexdigest()
+
+    def export_images_refs(self, images: list[tuple[str, bytes]]) -> list[tuple[str, str]]:
+        """
+        Replace the images content by their content-addressed id, so the celery payloads only carry references
+        """
+        return [(path, self.images_refs[path] if path in self.images_refs else self.asset_ref(content)) for path, content in images]
+
+    def resolve_images(self, images_refs: list[tuple[str, str | bytes]]) -> list[tuple[str, bytes]]:
+        images = []
+        for path, ref in images_refs:
+            if isinstance(ref, bytes):
+                # NOTE payload queued before the references, the content is already there
+                images.append((path, ref))
+                continue
+            image = self.images_by_ref.get(ref)
+            if image is None:
+                image = self._fetch_image(path, ref)
+            images.append((path, image.content))
+        return images
+
+    def _fetch_image(self, path: str, ref: str) -> Asset:
+        """
+        Fallback when the image is not in the store of this process: read it again and only accept it if its hash matches
+        """
+        try:
+            filename, content, dirName = self.fileService.readFileDetail(path, FDFlag.READ_BYTES)
+        except OSError:
+            raise AssetNotFoundError(path)
+        if content is None or self.asset_ref(content) != ref:
+            raise AssetNotFoundError(path)
+        image = Asset(filename, content, dirName)
+        self.images_by_ref[ref] = image
+        return image
+
+
 @_service.PossibleDep([FTPService])
 @_service.ServiceClass
 class AssetService(_service.Service):
     @inject
-    def __init__(self, fileService: FileService, securityService: SecurityService, configService: ConfigService) -> None:
+    def __init__(self, fileService: FileService, securityService: SecurityService, configService: ConfigService, imageStoreService: ImageStoreService) -> None:
         super().__init__()
         self.fileService = fileService
         Template.LANG = configService.ASSET_LANG
+        Template.LANGUAGES = configService.ASSET_TRANSLATION_LANGS
+        Template.TRANSLATION_MEMORY = TranslationMemory(TranslatorFactory(configService.ASSET_TRANSLATOR),
+                                                        configService.ASSET_TRANSLATION_MEMORY, configService.ASSET_TRANSLATION_CACHE_SIZE)
 
         self.fileService:FileService = fileService
         self.securityService = securityService
         self.configService = configService
+        self.imageStoreService = imageStoreService
 
-        self.images: dict[str, Asset] = {}
         self.css: dict[str, Asset] = {}
 
         self.html: dict[str, HTMLTemplate] = {}
@@ -148,9 +212,16 @@ class AssetService(_service.Service):
         self.sms: dict[str, SMSTemplate] = {}
         self.phone: dict[str, PhoneTemplate] = {}
 
+    def before_fork(self):
+        # NOTE translated once in the parent, the workers share the translated contents
+        for template in self.html.values():
+            template.pretranslate()
+
+    def after_fork(self):
+        Template.TRANSLATION_MEMORY.after_fork()
+
     def build(self):
         Reader.fileService = self.fileService
-        self.images = Reader()(Extension.JPEG, FDFlag.READ_BYTES, AssetType.IMAGES.value)
         self.css = Reader()(Extension.CSS, FDFlag.READ, AssetType.HTML.value)
 
         htmlReader: ThreadedReader = ThreadedReader(HTMLTemplate, self.loadHTMLData)(
@@ -182,7 +253,7 @@ class AssetService(_service.Service):
             html.dirName, Extension.JPEG)
         for imagesPath in imagesInPath:
             try:
-                imageContent = self.images[imagesPath].content
+                imageContent = self.imageStoreService.images[imagesPath].content
                 html.loadImage(imagesPath,imageContent)
             except KeyError as e:
                 pass
@@ -210,19 +281,21 @@ class AssetService(_service.Service):
     def asset_rel_path(self,path,asset_type):
         return f"{self.configService.ASSET_DIR}{asset_type}\\{path}"
         
-    def verify_asset_permission(self,content,model_keys,assetPermission,options):
-        
-        permission = tuple(assetPermission)
-        for keys in model_keys:
-            s_content=content[keys]
+    def verify_asset_permission(self,model,accessors:list[tuple[str,Callable]],assetTrie:PrefixTrie,assetPermission,options):
+        """
+        `accessors` are the (key, `key_accessor(key)`) of the asset references in the model, each reference must start
+        with one of the allowed prefixes of `assetTrie`
+        """
+        for key,access in accessors:
+            s_content=access(model)
             if type(s_content) == list:
                 for c in s_content:
                     if type(c) == str:
-                        if not c.startswith(permission):
+                        if not assetTrie.allows(c):
                             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,detail={'message':f'Assets [{c}] not allowed' })
                     
             elif type(s_content)==str:
-                if not c.startswith(permission):
+                if not assetTrie.allows(s_content):
                             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,detail={'message':f'Assets [{s_content}] not allowed' })      
             else:
                 raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,detail={'message':'Entity not properly accessed'})
@@ -233,7 +306,8 @@ class AssetService(_service.Service):
 
         return True
     
-    def destroy(self): pass
+    def destroy(self):
+        Template.TRANSLATION_MEMORY.close()
 
     def encryptPdf(self, name):
         KEY=""
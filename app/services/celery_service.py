@@ -2,15 +2,15 @@ import asyncio
 from typing import Any, Callable, ParamSpec
 import typing
 from app.classes.celery import CelerySchedulerOptionError, CeleryTaskNotFoundError,SCHEDULER_RULES, TaskHeaviness
-from app.classes.celery import  CeleryTask, SchedulerModel
+from app.classes.celery import  CeleryTask, CeleryWorkerMonitor, SchedulerModel
+from app.classes.task_executor import BoundedTaskExecutor
 from app.definition._service import Service, ServiceClass, ServiceStatus
 from app.interface.timers import IntervalInterface
 from app.utils.constant import HTTPHeaderConstant
 from .config_service import ConfigService
-from app.utils.helper import generateId
+from app.utils.helper import generateUlid
 from app.task import TASK_REGISTRY,celery_app,AsyncResult,task_name
 from redbeat  import RedBeatSchedulerEntry
-from app.utils.helper import generateId
 import datetime as dt
 from fastapi import BackgroundTasks, Request, Response
 from starlette.background import BackgroundTask
@@ -24,9 +24,8 @@ P = ParamSpec("P")
 class BackgroundTaskService(BackgroundTasks,Service):
     def __init__(self,configService:ConfigService):
         self.configService = configService
-        self.running_tasks_count = 0
-        self.sharing_task: dict[str,list[Callable]] = {}
-        self.task_lock = asyncio.Lock()
+        self.sharing_task: dict[str,list[tuple[TaskHeaviness,BackgroundTask]]] = {}
+        self.executor = BoundedTaskExecutor(self.configService.BACKGROUND_TASK_WORKERS,self.configService.BACKGROUND_TASK_QUEUE_SIZE)
         super().__init__(None)
         Service.__init__(self)
          
@@ -35,13 +34,18 @@ class BackgroundTaskService(BackgroundTasks,Service):
     
     def _delete_tasks(self, request_id:str):
         try:
-            del self.sharing_task[request_id]
-        except:
-            ...
+            tasks = self.sharing_task.pop(request_id)
+        except KeyError:
+            return
+        # NOTE the response was not sent with the request id, the reserved slots are given back
+        for heaviness,_ in tasks:
+            self.executor.release(heaviness)
 
     def add_task(self,heaviness:TaskHeaviness, request_id:str,func: typing.Callable[P, typing.Any], *args: P.args, **kwargs: P.kwargs) -> None:
+        heaviness = heaviness if heaviness is not None else TaskHeaviness.MODERATE
+        self.executor.reserve(heaviness)
         task = BackgroundTask(func, *args, **kwargs)
-        self.sharing_task[request_id].append(task)
+        self.sharing_task[request_id].append((heaviness,task))
         now = dt.datetime.now()
 
         return {'data':now,
@@ -49,23 +53,20 @@ class BackgroundTaskService(BackgroundTasks,Service):
     def build(self):
         ...
 
+    def after_fork(self):
+        self.executor.after_fork()
+
     @property
     async def global_task_count(self):
-        async with self.task_lock:
-            return self.running_tasks_count
+        return self.executor.count
+
+    @property
+    def task_metrics(self):
+        return self.executor.metrics
     
     async def __call__(self,request_id:str) -> None:
-        
-        async with self.task_lock:
-            self.running_tasks_count += len(self.sharing_task[request_id])  # Increase count based on new tasks
-
-        for task in self.sharing_task[request_id]:
-            await asyncio.sleep(0)
-            await task()
-
-        async with self.task_lock:
-            self.running_tasks_count -= len(self.sharing_task[request_id])  # Decrease count after tasks complete
-            self._delete_tasks(request_id)
+        for heaviness,task in self.sharing_task.pop(request_id,[]):
+            self.executor.submit(heaviness,task)
 
     @staticmethod
     def populate_response_with_request_id(request:Request, response: Response):
@@ -84,8 +85,8 @@ class CeleryService(Service, IntervalInterface):
         self.available_workers_count = -1
         self.worker_not_available_count = 0
 
-        self.timeout_count = 0
         self.task_lock = asyncio.Lock()
+        self.workerMonitor = CeleryWorkerMonitor(self._celery_app, self.configService.CELERY_MONITOR_INTERVAL, self._on_workers_change)
     
         #self.redis_client = Redis(host='localhost', port=6379, db=0)# set from config
         
@@ -98,7 +99,7 @@ class CeleryService(Service, IntervalInterface):
         return self._trigger_task(celery_task,schedule_name)
 
     def _trigger_task(self,celery_task:CeleryTask,schedule_name:str=None):
-        schedule_id = schedule_name if schedule_name is not None else generateId(25)
+        schedule_id = schedule_name if schedule_name is not None else generateUlid()
         c_type = celery_task['task_type']
         t_name = celery_task['task_name']
         now = dt.datetime.now()
@@ -181,37 +182,38 @@ class CeleryService(Service, IntervalInterface):
     def build(self):
         ...
 
-    @property
-    def set_next_timeout(self):
-        if self.timeout_count >= 30:
-            return 60
-        return 1 *(1.1 ** self.timeout_count)
+    def after_fork(self):
+        # NOTE the monitor threads of the parent are gone, the child starts its own monitor
+        self.workerMonitor = CeleryWorkerMonitor(self._celery_app, self.configService.CELERY_MONITOR_INTERVAL, self._on_workers_change)
+
+    def start_monitor(self):
+        self.workerMonitor.start()
+
+    def stop_monitor(self):
+        self.workerMonitor.stop()
+
+    def _on_workers_change(self, available_workers_count: int):
+        # NOTE called from the monitor thread, only plain assignments here
+        self.available_workers_count = available_workers_count
+        self.worker_not_available_count = self.configService.CELERY_WORKERS_COUNT - available_workers_count
+        if available_workers_count == 0:
+            self.service_status = ServiceStatus.TEMPORARY_NOT_AVAILABLE
+        elif self.service_status == ServiceStatus.TEMPORARY_NOT_AVAILABLE:
+            self.service_status = ServiceStatus.AVAILABLE
 
     async def _check_workers_status(self):
-        try:
-            response = celery_app.control.ping(timeout=self.set_next_timeout)
-            available_workers_count = len(response)
-            if  available_workers_count == 0:
-                self.service_status = ServiceStatus.TEMPORARY_NOT_AVAILABLE
-                async with self.task_lock:
-                    self.available_workers_count = 0
-            
-            async with self.task_lock:
-                self.available_workers_count = available_workers_count 
-            self.worker_not_available = self.configService.CELERY_WORKERS_COUNT - available_workers_count       
-            self.timeout_count=0             
-        except Exception as e:
-            self.timeout_count +=1
-            async with self.task_lock:
-                    self.available_workers_count = 0
+        self._on_workers_change(self.workerMonitor.available_workers_count)
     
     @property
     async def get_available_workers_count(self)->float:
-        async with self.task_lock:
-            return self.available_workers_count
+        return self.available_workers_count
+
+    @property
+    def workers_table(self):
+        return self.workerMonitor.table
 
     async def pingService(self,ratio:float=None,count:int=None):
-        response_count = await self.get_available_workers_count
+        response_count = self.available_workers_count
         if ratio:
             # TODO check in which interval the ratio is in
             return super().pingService()
@@ -2,7 +2,7 @@ from app.definition._service import ServiceClass,Service
 from .database_service import MongooseService
 
 
-@ServiceClass
+@ServiceClass(lazy=True)
 class ChatService(Service):
     def __init__(self,mongooseService:MongooseService) -> None:
         super().__init__()
@@ -10,7 +10,7 @@ class ChatService(Service):
     pass
 
 
-@ServiceClass
+@ServiceClass(lazy=True)
 class SupportService(Service):
     def __init__(self,chatService:ChatService) -> None:
         super().__init__()
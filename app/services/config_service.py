@@ -110,6 +110,11 @@ class ConfigService(_service.Service):
         self.HTTPS_CERTIFICATE=self.getenv("HTTPS_CERTIFICATE",'cert.pem')
         self.HTTPS_KEY =self.getenv("HTTPS_KEY",'key.pem')
 
+        self.SERVER_WORKERS = ConfigService.parseToInt(self.getenv("SERVER_WORKERS"),1)
+        self.SERVER_ENGINE = self.getenv("SERVER_ENGINE",'asyncio') # asyncio | uvloop
+        self.SERVER_REUSE_PORT = ConfigService.parseToBool(self.getenv("SERVER_REUSE_PORT"),False)
+        self.SERVER_GRACEFUL_TIMEOUT = ConfigService.parseToInt(self.getenv("SERVER_GRACEFUL_TIMEOUT"),30)
+
         self.OAUTH_METHOD_RETRIEVER = self.getenv('OAUTH_METHOD_RETRIEVER','oauth_custom') #OAuthFlow | OAuthLib
         self.OAUTH_JSON_KEY_FILE = self.getenv('OAUTH_JSON_KEY_FILE')  # JSON key file
         self.OAUTH_TOKEN_DATA_FILE = self.getenv('OAUTH_DATA_FILE','mail_provider.tokens.json')
@@ -126,6 +131,9 @@ class ConfigService(_service.Service):
         self.SMTP_PASS = self.getenv("SMTP_EMAIL_PASS")
         self.SMTP_EMAIL_CONN_METHOD= self.getenv("SMTP_EMAIL_CONN_METHOD")
         self.SMTP_EMAIL_LOG_LEVEL= ConfigService.parseToInt(self.getenv("SMTP_EMAIL_LOG_LEVEL"),0)
+        self.SMTP_POOL_SIZE = ConfigService.parseToInt(self.getenv("SMTP_POOL_SIZE"),4)
+        self.SMTP_POOL_KEEPALIVE = ConfigService.parseToInt(self.getenv("SMTP_POOL_KEEPALIVE"),60)
+        self.SMTP_POOL_IDLE_TIMEOUT = ConfigService.parseToInt(self.getenv("SMTP_POOL_IDLE_TIMEOUT"),300)
 
         # self.IMAP_EMAIL_HOST = self.getenv("IMAP_EMAIL_HOST").upper()
         # self.IMAP_EMAIL_PORT = ConfigService.parseToInt(self.getenv("IMAP_EMAIL_PORT"))
@@ -134,6 +142,10 @@ class ConfigService(_service.Service):
         # self.IMAP_EMAIL_CONN_METHOD= self.getenv("IMAP_EMAIL_CONN_METHOD")
 
         self.ASSET_LANG = self.getenv("ASSET_LANG")
+        self.ASSET_TRANSLATOR = self.getenv("ASSET_TRANSLATOR",'google') # google | fake
+        self.ASSET_TRANSLATION_LANGS = [lang.strip() for lang in self.getenv("ASSET_TRANSLATION_LANGS",'').split(',') if lang.strip()]
+        self.ASSET_TRANSLATION_MEMORY = self.getenv("ASSET_TRANSLATION_MEMORY",'translation_memory.db')
+        self.ASSET_TRANSLATION_CACHE_SIZE = ConfigService.parseToInt(self.getenv("ASSET_TRANSLATION_CACHE_SIZE"),4096)
 
         self.TWILIO_ACCOUNT_SID = self.getenv("TWILIO_ACCOUNT_SID")
         self.TWILIO_AUTH_TOKEN= self.getenv("TWILIO_AUTH_TOKEN")
@@ -148,15 +160,29 @@ class ConfigService(_service.Service):
         self.AUTH_EXPIRATION = ConfigService.parseToInt(self.getenv("AUTH_EXPIRATION"), 36000000)
         self.ALL_ACCESS_EXPIRATION = ConfigService.parseToInt(self.getenv("ALL_ACCESS_EXPIRATION"), 36000000000)
         self.ADMIN_KEY = self.getenv("ADMIN_KEY")
+        self.AUTH_TOKEN_CACHE_SIZE = ConfigService.parseToInt(self.getenv("AUTH_TOKEN_CACHE_SIZE"), 4096)
+        self.TOKEN_FORMAT_VERSION = ConfigService.parseToInt(self.getenv("TOKEN_FORMAT_VERSION"), 1)
+        self.TOKEN_BLACKLIST_REDIS_URL = self.getenv("TOKEN_BLACKLIST_REDIS_URL")
+        self.TOKEN_BLACKLIST_CAPACITY = ConfigService.parseToInt(self.getenv("TOKEN_BLACKLIST_CAPACITY"), 100000)
+        self.TOKEN_GENERATIONS_REDIS_URL = self.getenv("TOKEN_GENERATIONS_REDIS_URL") or self.TOKEN_BLACKLIST_REDIS_URL
 
         
                                 # CELERY CONFIG #
 
         self.CELERY_MESSAGE_BROKER_URL = self.getenv("CELERY_MESSAGE_BROKER_URL")
         self.CELERY_BACKEND_URL = self.getenv("CELERY_BACKEND_URL")
-        self.CELERY_WORKERS_COUNT = self.getenv("CELERY_WORKERS_COUNT",1)
+        self.CELERY_WORKERS_COUNT = ConfigService.parseToInt(self.getenv("CELERY_WORKERS_COUNT"),1)
+        self.CELERY_MONITOR_INTERVAL = ConfigService.parseToInt(self.getenv("CELERY_MONITOR_INTERVAL"),5)
         self.REDBEAT_REDIS_URL = self.getenv("REDBEAT_REDIS_URL",self.CELERY_MESSAGE_BROKER_URL)
         self.CELERY_RESULT_EXPIRES=ConfigService.parseToInt(self.getenv("CELERY_RESULT_EXPIRES"),60*60*24)
+        self.BACKGROUND_TASK_WORKERS = ConfigService.parseToInt(self.getenv("BACKGROUND_TASK_WORKERS"),8)
+        self.BACKGROUND_TASK_QUEUE_SIZE = ConfigService.parseToInt(self.getenv("BACKGROUND_TASK_QUEUE_SIZE"),256)
+
+                                # RATE LIMIT CONFIG #
+
+        self.RATE_LIMIT_REDIS_URL = self.getenv("RATE_LIMIT_REDIS_URL")
+        self.RATE_LIMIT_LOCAL_BATCH = ConfigService.parseToInt(self.getenv("RATE_LIMIT_LOCAL_BATCH"),50)
+        self.RATE_LIMIT_LEASE_TTL = ConfigService.parseToInt(self.getenv("RATE_LIMIT_LEASE_TTL"),5)
 
 
                                 # CHAT CONFIG #
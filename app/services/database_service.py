@@ -18,14 +18,14 @@ class SQLiteService(DatabaseService):
         super().__init__(configService,fileService)
 
 
-@ServiceClass
+@ServiceClass(lazy=True)
 class CSVService(DatabaseService): # analytics
 
     def __init__(self,configService:ConfigService,fileService:FileService):
         super().__init__(configService,fileService)
     ...
 
-@ServiceClass
+@ServiceClass(lazy=True)
 class MongooseService(DatabaseService): # Chat data
     def __init__(self,configService:ConfigService,fileService:FileService):
         super().__init__(configService,fileService)
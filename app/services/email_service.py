@@ -4,11 +4,12 @@ import smtplib as smtp
 import imaplib as imap
 import poplib as pop
 import socket
+from threading import Event, Thread
 from typing import Callable
 
 from app.utils.prettyprint import SkipInputException
 from app.classes.mail_oauth_access import OAuth, MailOAuthFactory, OAuthFlow
-from app.classes.mail_provider import SMTPConfig, IMAPConfig, MailAPI
+from app.classes.mail_provider import SMTPConfig, IMAPConfig, MailAPI, SMTPConnectionPool
 
 from .model_service import LLMModelService
 from app.utils.constant import EmailHostConstant
@@ -23,6 +24,9 @@ from app.utils.validation import email_validator
 
 @_service.AbstractServiceClass
 class BaseEmailService(_service.Service):
+    # NOTE the oauth flow may ask the authorization code in the terminal
+    BUILD_ON_MAIN_THREAD = True
+
     def __init__(self, configService: ConfigService, loggerService: LoggerService):
         super().__init__()
         self.configService: ConfigService = configService
@@ -32,23 +36,59 @@ class BaseEmailService(_service.Service):
         self.state = None
         self.last_connectionTime: float = ...
         self.emailHost: EmailHostConstant = ...
+        self.connectionPool: SMTPConnectionPool | None = None
 
     @staticmethod
     def task_lifecycle(func: Callable):
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
             self: BaseEmailService = args[0]
-            connector = self.connect()
-            if connector == None:
-                return 
-            if not self.authenticate(connector):
-                return
-            kwargs['connector'] = connector # BUG if the name changes it will not work
-            result = func(*args, **kwargs)
-            self.logout(connector)
-            return result
+            if self.connectionPool is None:
+                connector = self.connect()
+                if connector == None:
+                    return 
+                if not self.authenticate(connector):
+                    return
+                kwargs['connector'] = connector # BUG if the name changes it will not work
+                result = func(*args, **kwargs)
+                self.logout(connector)
+                return result
+
+            connector = self.connectionPool.acquire()
+            for attempt in range(2):
+                if connector == None:
+                    return
+                kwargs['connector'] = connector
+                try:
+                    result = func(*args, **kwargs)
+                except smtp.SMTPServerDisconnected as e:
+                    # NOTE the server dropped a pooled session, retry once on a freshly authenticated one unless the
+                    # message was already sent: the server might have accepted it and a retry would deliver it twice
+                    if attempt == 0 and not BaseEmailService.reached_data(e):
+                        connector = self.connectionPool.reconnect(connector)
+                        continue
+                    self.connectionPool.release(connector, discard=True)
+                    self.service_status = _service.ServiceStatus.TEMPORARY_NOT_AVAILABLE
+                    return
+                except:
+                    self.connectionPool.release(connector, discard=True)
+                    raise
+                self.connectionPool.release(connector)
+                return result
         return wrapper
 
+    @staticmethod
+    def reached_data(error: smtp.SMTPServerDisconnected) -> bool:
+        """
+        Whether the session dropped once the DATA command was started, ie the message may have been delivered
+        """
+        tb = error.__traceback__
+        while tb is not None:
+            if tb.tb_frame.f_code is smtp.SMTP.data.__code__:
+                return True
+            tb = tb.tb_next
+        return False
+
     def build(self):
         if self.emailHost in [EmailHostConstant.ICLOUD, EmailHostConstant.GMAIL, EmailHostConstant.GMAIL_RELAY, EmailHostConstant.GMAIL_RESTRICTED] and self.configService.SMTP_PASS != None:
             return 
@@ -84,7 +124,8 @@ class BaseEmailService(_service.Service):
         self.prettyPrinter.show()
 
     def destroy(self):
-        ...
+        if self.connectionPool is not None:
+            self.connectionPool.close()
 
     def authenticate(self): pass
 
@@ -111,6 +152,50 @@ class EmailSenderService(BaseEmailService):
 
         self.emailHost = EmailHostConstant._member_map_[
             self.configService.SMTP_EMAIL_HOST]
+
+        self.connectionPool = SMTPConnectionPool(self._open_session, self.logout, self.configService.SMTP_POOL_SIZE,
+                                                 self.configService.SMTP_POOL_KEEPALIVE, self.configService.SMTP_POOL_IDLE_TIMEOUT)
+        self._keepalive_stop = Event()
+        self._keepalive_thread: Thread | None = None
+
+    def build(self):
+        super().build()
+        self._start_keepalive()
+
+    def destroy(self):
+        self._keepalive_stop.set()
+        super().destroy()
+
+    def after_fork(self):
+        self.connectionPool.after_fork()
+        self._keepalive_stop = Event()
+        self._keepalive_thread = None
+        # NOTE the keepalive thread did not survive the fork
+        self._start_keepalive()
+
+    def _open_session(self) -> smtp.SMTP | None:
+        connector = self.connect()
+        if connector == None:
+            return None
+        if not self.authenticate(connector):
+            self.logout(connector)
+            return None
+        return connector
+
+    def _start_keepalive(self):
+        if self._keepalive_thread is not None and self._keepalive_thread.is_alive():
+            return
+        self._keepalive_stop.clear()
+        self._keepalive_thread = Thread(target=self._keepalive_loop, name='smtp-keepalive', daemon=True)
+        self._keepalive_thread.start()
+
+    def _keepalive_loop(self):
+        while not self._keepalive_stop.wait(self.connectionPool.keepalive):
+            self.connectionPool.ping_idle()
+
+    @property
+    def pool_metrics(self):
+        return self.connectionPool.metrics
     
     def _load_valid_from_email(self):
         config_str:str = ...
@@ -217,13 +302,7 @@ class EmailSenderService(BaseEmailService):
             self.service_status = _service.ServiceStatus.NOT_AVAILABLE
 
         except smtp.SMTPServerDisconnected as e:
-            print('Server disconnected')
-            print(e)
-            self._builded = False
-            # BUG service destroyed too ?
-            self.service_status = _service.ServiceStatus.TEMPORARY_NOT_AVAILABLE
-            # TODO retry getting the access token
-            ...
+            raise # NOTE handled by the task lifecycle which reconnects through the pool
 
 # @_service.ServiceClass
 class EmailReaderService(BaseEmailService):
@@ -47,7 +47,7 @@ class FileService(Service):
         
     pass
 
-@ServiceClass
+@ServiceClass(lazy=True)
 class FTPService(Service):
     def __init__(self, configService: ConfigService, fileService: FileService) -> None:
         super().__init__()
@@ -72,7 +72,7 @@ class FTPService(Service):
             self.ftpClient.close()
     pass
 
-@ServiceClass
+@ServiceClass(lazy=True)
 class GitCloneRepoService(Service):
     def __init__(self,configService:ConfigService,fileService:FileService) -> None:
         super().__init__()
@@ -3,7 +3,7 @@ from .file_service import FileService
 from app.definition import _service
 from injector import inject
 
-@_service.ServiceClass
+@_service.ServiceClass(lazy=True)
 class LLMModelService(_service.Service):
     @inject
     def __init__(self, configService: ConfigService, fileService: FileService) -> None:
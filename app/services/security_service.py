@@ -5,6 +5,7 @@ from app.definition._interface import Interface, IsInterface
 from app.services.database_service import SQLService
 from .config_service import ConfigService
 from dataclasses import dataclass
+from functools import lru_cache
 from .file_service import FileService
 from app.definition._service import AbstractServiceClass, Service, ServiceClass
 import jwt
@@ -12,28 +13,54 @@ from cryptography.fernet import Fernet, InvalidToken
 import base64
 from fastapi import HTTPException, status
 import time
-from app.classes.auth_permission import AuthPermission, Role, RoutePermission, WSPermission
-from random import randint, random
-from app.utils.helper import generateId
+import json
+from app.classes.auth_permission import ALL_ROUTES, AuthPermission, Role, RoutePermission, WSPermission, mask_to_roles, roles_to_mask
+import sys
+from app.classes.token_cache import VerifiedTokenCache
+from app.classes.token_blacklist import TokenBlacklist
+from app.classes.generation_map import GenerationMap
+from app.classes.prefix_trie import PrefixTrie
+from redis import Redis
+from redis.exceptions import RedisError
+from threading import Lock
+from app.utils.helper import generateUlid
 from app.utils.constant import ConfigAppConstant
 from datetime import datetime, timezone
+try:
+    import fcntl
+except ImportError:
+    # NOTE no fork on windows either, the applications are served by a single process
+    fcntl = None
 
 
 SEPARATOR = "|"
-ID_LENGTH = 25
+
+
+V2_PREFIX = "v2."
+
+
+@lru_cache(maxsize=16)
+def get_cipher(key: bytes | str) -> Fernet:
+    return Fernet(key)
 
 
 @IsInterface
 class EncryptDecryptInterface(Interface):
+    """
+    v1 values are base64 encoded before the Fernet encryption, which base64 encodes them again. v2 values are
+    encrypted as is and prefixed with `V2_PREFIX`, both are decoded.
+    """
 
-    def _encode_value(self, value: str, key: bytes | str) -> str:
-        value = base64.b64encode(value.encode()).decode()
-        cipher_suite = Fernet(key)
-        return cipher_suite.encrypt(value.encode()).decode()
+    def _encode_value(self, value: str, key: bytes | str, version: int = 1) -> str:
+        if version == 1:
+            value = base64.b64encode(value.encode()).decode()
+            return get_cipher(key).encrypt(value.encode()).decode()
+        return V2_PREFIX + get_cipher(key).encrypt(value.encode()).decode()
 
     def _decode_value(self, value: str, key: bytes | str) -> str:
-        cipher_suite = Fernet(key)
-        value = cipher_suite.decrypt(value.encode())
+        if value.startswith(V2_PREFIX):
+            return get_cipher(key).decrypt(value[len(V2_PREFIX):].encode()).decode()
+        value = get_cipher(key).decrypt(value.encode())
         return base64.b64decode(value).decode()
 
 
@@ -44,11 +71,16 @@ class JWTAuthService(Service, EncryptDecryptInterface):
         self.configService = configService
         self.fileService = fileService
         self.sqlService = sqlService
+        self.tokenCache: VerifiedTokenCache[AuthPermission] = VerifiedTokenCache(self.configService.AUTH_TOKEN_CACHE_SIZE)
+        blacklist_redis = Redis.from_url(self.configService.TOKEN_BLACKLIST_REDIS_URL) if self.configService.TOKEN_BLACKLIST_REDIS_URL else None
+        self.blacklist = TokenBlacklist(blacklist_redis, self.configService.TOKEN_BLACKLIST_CAPACITY, self.configService.AUTH_EXPIRATION)
+        generations_redis = Redis.from_url(self.configService.TOKEN_GENERATIONS_REDIS_URL) if self.configService.TOKEN_GENERATIONS_REDIS_URL else None
+        self.generations = GenerationMap(generations_redis, self.configService.AUTH_EXPIRATION)
 
 
     def set_generation_id(self, gen=False) -> None:
         if gen:
-            self.generation_id = generateId(ID_LENGTH)
+            self.generation_id = generateUlid()
             self.configService.config_json_app.data[ConfigAppConstant.META_KEY][
                 ConfigAppConstant.GENERATION_ID_KEY] = self.generation_id
             current_utc = datetime.now(timezone.utc)
@@ -59,10 +91,40 @@ class JWTAuthService(Service, EncryptDecryptInterface):
             self.configService.config_json_app.data[ConfigAppConstant.META_KEY][ConfigAppConstant.EXPIRATION_DATE_KEY] = expired_utc.strftime("%Y-%m-%d %H:%M:%S")
             self.configService.config_json_app.data[ConfigAppConstant.META_KEY][ConfigAppConstant.EXPIRATION_TIMESTAMP_KEY] = expired_
             self.configService.config_json_app.save()
+            self.tokenCache.invalidate()
 
         else:
             self.generation_id = self.configService.config_json_app.data[
                 ConfigAppConstant.META_KEY][ConfigAppConstant.GENERATION_ID_KEY]
+            self.generations.load(self.configService.config_json_app.data[ConfigAppConstant.META_KEY].get(ConfigAppConstant.GENERATION_MAP_KEY, {}))
+
+    def rotate_client_generation(self, client_id: str):
+        """
+        Invalidate the tokens issued to one client, the other clients keep theirs
+        """
+        self.generations.rotate_client(client_id)
+        self._save_generations()
+
+    def rotate_role_generation(self, role: Role):
+        """
+        Invalidate the tokens holding the role
+        """
+        self.generations.rotate_role(role)
+        self._save_generations()
+
+    def _save_generations(self):
+        # NOTE the file is re-read and merged under a lock, the processes rotating at the same time keep each other's rotations
+        config_json_app = self.configService.config_json_app
+        with open(config_json_app.file, 'r+', encoding='utf-8') as fd:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            data = json.load(fd)
+            self.generations.merge(data[ConfigAppConstant.META_KEY].get(ConfigAppConstant.GENERATION_MAP_KEY, {}))
+            data[ConfigAppConstant.META_KEY][ConfigAppConstant.GENERATION_MAP_KEY] = self.generations.data
+            fd.seek(0)
+            json.dump(data, fd)
+            fd.truncate()
+        config_json_app.data[ConfigAppConstant.META_KEY][ConfigAppConstant.GENERATION_MAP_KEY] = data[ConfigAppConstant.META_KEY][ConfigAppConstant.GENERATION_MAP_KEY]
 
     def encode_auth_token(self,data: Dict[str, RoutePermission],roles:list[str], issue_for: str,allowed_assets:list[str]=[]) -> str:
         try:
@@ -70,7 +132,7 @@ class JWTAuthService(Service, EncryptDecryptInterface):
                 data = {}
             created_time = time.time()
             permission = AuthPermission(generation_id=self.generation_id, issued_for=issue_for, created_at=created_time,
-                                        expired_at=created_time + self.configService.AUTH_EXPIRATION, allowed_routes=data,roles=roles,allowed_assets=allowed_assets
+                                        expired_at=created_time + self.configService.AUTH_EXPIRATION, allowed_routes=data,role_mask=roles_to_mask(roles),allowed_assets=allowed_assets
                                         )
             token = self._encode_token(permission)
             return token
@@ -89,7 +151,7 @@ class JWTAuthService(Service, EncryptDecryptInterface):
     def _encode_token(self, obj):
         encoded = jwt.encode(obj, self.configService.JWT_SECRET_KEY,
                                  algorithm=self.configService.JWT_ALGORITHM)
-        token = self._encode_value(encoded, self.configService.ON_TOP_SECRET_KEY)
+        token = self._encode_value(encoded, self.configService.ON_TOP_SECRET_KEY, self.configService.TOKEN_FORMAT_VERSION)
         return token
 
     def decode_token(self, token: str) -> dict:
@@ -125,9 +187,15 @@ class JWTAuthService(Service, EncryptDecryptInterface):
             status_code=status.HTTP_403_FORBIDDEN, detail="Invalid token")
 
     def verify_permission(self, token: str,issued_for: str) -> AuthPermission:
+        # NOTE the cached permission is shared between the requests using the same token, it must not be mutated
+        permission = self.tokenCache.get(token, issued_for, self.generation_id)
+        if permission is not None:
+            self._verify_generation(permission)
+            self._verify_not_revoked(token, permission)
+            return permission
 
-        token = self.decode_token(token)
-        permission: AuthPermission = AuthPermission(**token)
+        decoded = self.decode_token(token)
+        permission: AuthPermission = AuthPermission(**decoded)
         try:
             if issued_for != permission["issued_for"]:
                 raise HTTPException(
@@ -140,12 +208,73 @@ class JWTAuthService(Service, EncryptDecryptInterface):
             if permission["generation_id"] != self.generation_id:
                 raise HTTPException(
                     status_code=status.HTTP_403_FORBIDDEN, detail="Old Token not valid anymore")
-            return permission
         except KeyError as e:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,detail='Data missing')
 
+        self._compile_permission(permission)
+        self._verify_generation(permission)
+        self._verify_not_revoked(token, permission)
+        self.tokenCache.set(token, issued_for, self.generation_id, permission["expired_at"], permission)
+        return permission
+
+    @staticmethod
+    def _compile_permission(permission: AuthPermission):
+        """
+        Role mask, route index and asset trie of a verified token, compiled once and cached with the token so the
+        permissions of each request only cost integer, set and trie lookups
+        """
+        try:
+            if "role_mask" not in permission:
+                permission["role_mask"] = roles_to_mask(permission["roles"])
+            permission["roles"] = mask_to_roles(permission["role_mask"])
+            permission["route_index"] = {ressource: ALL_ROUTES if route["scope"] == "all" else frozenset(sys.intern(r) for r in route.get("custom_routes", ()))
+                                         for ressource, route in permission["allowed_routes"].items()}
+            permission["asset_trie"] = PrefixTrie(permission.get("allowed_assets") or ())
+        except KeyError as e:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,detail='Data missing')
+
+    def _verify_generation(self, permission: AuthPermission):
+        if self.generations.is_outdated(permission["issued_for"], permission["role_mask"], permission["created_at"]):
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Old Token not valid anymore")
+
+    def _verify_not_revoked(self, token: str, permission: AuthPermission):
+        # NOTE checked on cache hits too, a cached token can be revoked afterward
+        try:
+            revoked = self.blacklist.is_revoked(self.tokenCache.digest(token), permission["issued_for"], permission["created_at"])
+        except RedisError:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Cannot verify the token revocation")
+        if revoked:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Token revoked")
+
+    def revoke_token(self, token: str):
+        self.blacklist.revoke_token(self.tokenCache.digest(token))
+
+    def revoke_client(self, client_id: str):
+        self.blacklist.revoke_client(client_id)
+
+    @property
+    def blacklist_shared(self) -> bool:
+        """
+        Whether the revocations reach the other processes, the celery worker revoking the clients included
+        """
+        return self.blacklist.redis is not None
+
+    @property
+    def token_cache_metrics(self):
+        return self.tokenCache.metrics
+
+    @property
+    def blacklist_metrics(self):
+        return {**self.blacklist.metrics, 'generations': self.generations.metrics}
+
+    def after_fork(self):
+        self.tokenCache.after_fork()
+        self.blacklist.after_fork()
+        self.generations.after_fork()
+
     def build(self):
-        ...
+        self.blacklist.start()
+        self.generations.start()
 
 @ServiceClass
 class SecurityService(Service, EncryptDecryptInterface):
@@ -155,32 +284,60 @@ class SecurityService(Service, EncryptDecryptInterface):
         self.configService = configService
         self.fileService = fileService
         self.sqlService  = sqlService
+        self.apiKeyCache: VerifiedTokenCache[bool] = VerifiedTokenCache(self.configService.AUTH_TOKEN_CACHE_SIZE)
+        self.nonceLock = Lock()
+        self.last_nonce = 0
+
+    @property
+    def generation_id(self) -> str | None:
+        return self.configService.config_json_app.data[ConfigAppConstant.META_KEY].get(ConfigAppConstant.GENERATION_ID_KEY)
 
     def verify_server_access(self, token: str, sent_ip_addr) -> bool:
-        token = self._decode_value(token, self.configService.API_ENCRYPT_TOKEN)
-        token = token.split("|")
+        generation_id = self.generation_id
+        if self.apiKeyCache.get(token, sent_ip_addr, generation_id):
+            return True
+
+        api_key = self._decode_value(token, self.configService.API_ENCRYPT_TOKEN)
+        api_key = api_key.split("|")
         # TODO invalidate with generation id
 
-        if len(token) != 3:
+        if len(api_key) != 3:
             return False
-        ip_addr = token[0]
+        ip_addr = api_key[0]
 
         if ip_addr != sent_ip_addr:
             return False
 
-        if time.time() - float(token[1]) > self.configService.API_EXPIRATION:
+        # NOTE the key carries its nonce, a time in nanoseconds
+        issued_at = int(api_key[1]) / 1e9
+        if time.time() - issued_at > self.configService.API_EXPIRATION:
             return False
 
-        if token[2] != self.configService.API_KEY:
+        if api_key[2] != self.configService.API_KEY:
             return False
 
+        # NOTE only granted keys are cached, a refused key always goes through the full verification
+        self.apiKeyCache.set(token, sent_ip_addr, generation_id, issued_at + self.configService.API_EXPIRATION, True)
         return True
 
+    @property
+    def token_cache_metrics(self):
+        return self.apiKeyCache.metrics
+
+    def after_fork(self):
+        self.apiKeyCache.after_fork()
+        self.nonceLock = Lock()
+
+    def _next_nonce(self) -> int:
+        # NOTE strictly increasing clock in nanoseconds, two keys never share it so no need to wait for the clock
+        with self.nonceLock:
+            self.last_nonce = max(time.time_ns(), self.last_nonce + 1)
+            return self.last_nonce
+
     def generate_custom_api_key(self, ip_address: str):
-        time.sleep(random()/100)
         data = ip_address + SEPARATOR +  \
-            str(time.time_ns()) + SEPARATOR + self.configService.API_KEY
-        return self._encode_value(data, self.configService.API_ENCRYPT_TOKEN)
+            str(self._next_nonce()) + SEPARATOR + self.configService.API_KEY
+        return self._encode_value(data, self.configService.API_ENCRYPT_TOKEN, self.configService.TOKEN_FORMAT_VERSION)
 
     def build(self):
         ...
\ No newline at end of file
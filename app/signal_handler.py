@@ -10,24 +10,37 @@ def default_term_handler(signal,frame):
     result = bool(result)
     if result:
         sys.exit(0)
-    
+
+def headless_term_handler(signum,frame):
+    PrettyPrinter_.event('shutdown', signal=signal.Signals(signum).name)
+    sys.exit(0)
+
 class SignalHandler:
-    
+
     ValidSignal= signal.valid_signals()
 
     def __init__(self):
         # self.signal:dict[str, Callable] = {}
+        # NOTE the interactive modes keep the default handlers: a SIGTERM from docker or systemd must not wait for a prompt
+        # self.register_signal(signal.SIGINT,default_term_handler)
+        # self.register_signal(signal.SIGTERM,default_term_handler)
+        ...
 
-        self.register_signal(signal.SIGINT,default_term_handler)
-        self.register_signal(signal.SIGTERM,default_term_handler)
-        self.register_signal(signal.CTRL_C_EVENT,default_term_handler)
-
+    def set_headless(self):
+        """
+        Exit right away on SIGINT and SIGTERM, without prompting. Once the server runs, uvicorn handles them itself
+        and raises them again after its graceful shutdown.
+        """
+        self.register_signal(signal.SIGINT,headless_term_handler)
+        self.register_signal(signal.SIGTERM,headless_term_handler)
 
     def register_signal(self, signal_val:signal.Signals,handler:Callable[[signal.Signals,Any],None | Exception]):
-        ...
-    
+        if signal_val not in self.ValidSignal:
+            return
+        signal.signal(signal_val,handler)
+
     def raise_signal(self, signal_val:signal.Signals):
-       ... 
+       ...
 
     def get_signal(self, signal_val:signal.Signals):
         ...
@@ -6,7 +6,9 @@ from celery.result import AsyncResult
 from app.classes.celery import CeleryTaskNameNotExistsError, TaskHeaviness
 from app.services.config_service import ConfigService
 from app.services.email_service import EmailSenderService
-from app.container import Get, build_container
+from app.services.assets_service import ImageStoreService
+from app.container import Get, PreloadForFork, build_container
+from app.definition._service import Service
 from app.services.security_service import JWTAuthService
 from app.utils.prettyprint import PrettyPrinter_
 import shutil
@@ -15,11 +17,13 @@ import shutil
 
 
 exe_path = shutil.which("celery").replace(".EXE", "")
+WORKER_PROCESS = sys.argv[0] == exe_path
 ##############################################           ##################################################
 
-if sys.argv[0] == exe_path:
+if WORKER_PROCESS:
     PrettyPrinter_.message('Building container for the celery worker')
-    build_container(False)
+    # NOTE nothing is built yet, the services needed by the tasks are preloaded once they are all registered
+    build_container(False, roots=[])
 
 ##############################################           ##################################################
 
@@ -38,6 +42,18 @@ def task_name(t):
     return f'{CELERY_MODULE_NAME}.{t}'
 
 
+def task_services(task: Callable) -> list[type[Service]]:
+    """
+    The services a task retrieves: the service classes among the global names its code refers to
+    """
+    services = []
+    for name in task.__code__.co_names:
+        obj = task.__globals__.get(name)
+        if isinstance(obj, type) and issubclass(obj, Service):
+            services.append(obj)
+    return services
+
+
 TASK_REGISTRY: dict[str, dict[str, Any]] = {}
 
 ##############################################           ##################################################
@@ -71,7 +87,8 @@ def RegisterTask(heaviness: TaskHeaviness, **kwargs):
 
         TASK_REGISTRY[task_name(task.__qualname__)] = {
             'heaviness': heaviness,
-            'task': celery_app.task(**kwargs)(task)
+            'task': celery_app.task(**kwargs)(task),
+            'services': task_services(task),
         }
 
         return task
@@ -83,7 +100,8 @@ def SharedTask(heaviness: TaskHeaviness, **kwargs):
     def decorator(task: Callable):
         TASK_REGISTRY[task_name(task.__qualname__)] = {
             'heaviness':heaviness,
-            'task':shared_task(**kwargs)(task)
+            'task':shared_task(**kwargs)(task),
+            'services': task_services(task),
         }
         
         return task
@@ -95,7 +113,8 @@ def SharedTask(heaviness: TaskHeaviness, **kwargs):
 @RegisterTask(TaskHeaviness.LIGHT)
 def task_send_template_mail(data, meta, images):
     emailService: EmailSenderService = Get(EmailSenderService)
-    return emailService.sendTemplateEmail(data, meta, images)
+    imageStoreService: ImageStoreService = Get(ImageStoreService)
+    return emailService.sendTemplateEmail(data, meta, imageStoreService.resolve_images(images))
 
 
 @RegisterTask(TaskHeaviness.LIGHT)
@@ -106,5 +125,12 @@ def task_send_custom_mail(content, meta, images, attachment):
 @RegisterTask(TaskHeaviness.VERY_LIGHT)
 def task_blacklist_client(client_id:str):
     jwtAuthService = Get(JWTAuthService)
+    jwtAuthService.revoke_client(client_id)
+
+##############################################           ##################################################
+
+if WORKER_PROCESS:
+    # NOTE the prefork children of the worker share the services built here
+    PreloadForFork(*{s for t in TASK_REGISTRY.values() for s in t['services']})
 
 ##############################################           ##################################################
@@ -32,6 +32,7 @@ class ConfigAppConstant:
     META_KEY = 'meta'
     APPS_KEY = 'apps'
     GENERATION_ID_KEY = 'generation_id'
+    GENERATION_MAP_KEY = 'generation_map'
     CREATION_DATE_KEY = 'creation_date'
     EXPIRATION_DATE_KEY = 'expiration_date'
     EXPIRATION_TIMESTAMP_KEY = 'expiration_timestamp'
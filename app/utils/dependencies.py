@@ -10,22 +10,50 @@ from .helper import reverseDict
 
 D = TypeVar('D',bound=type)
 
+class FilterPlan:
+    """
+    Precomputed parameter filter of a callable: the accepted keyword names and the Literal coercions
+    """
+    __slots__ = ('accepted', 'coercions')
+
+    def __init__(self, func: Callable | Type):
+        if type(func) == type:
+            annotations = func.__init__.__annotations__.copy()
+        else:
+            annotations = func.__annotations__.copy()
+            annotations.pop('return', None)
+
+        self.accepted: frozenset[str] = frozenset(annotations)
+        self.coercions: dict[str, Any] = {key: annotation for key, annotation in annotations.items() if annotation == Literal}
+
+    def filter(self, kwargs: dict[str, Any]) -> dict[str, Any]:
+        if not self.coercions and kwargs.keys() <= self.accepted:
+            return kwargs
+        coercions = self.coercions
+        return {
+            key: (coercions[key](value) if key in coercions and isinstance(value, (str, int, float, bool, list, dict)) else value)
+            for key, value in kwargs.items()
+            if key in self.accepted
+        }
+
+
+FILTER_PLANS: dict[Callable | Type, FilterPlan] = {}
+
+
+def get_filter_plan(func: Callable | Type) -> FilterPlan:
+    # NOTE bound methods are created on every attribute access, their plan is stored under the underlying function
+    key = getattr(func, '__func__', func)
+    plan = FILTER_PLANS.get(key)
+    if plan is None:
+        plan = FILTER_PLANS[key] = FilterPlan(func)
+    return plan
+
+
 def APIFilterInject(func:Callable | Type):
-    
-    if type(func) == type:
-        annotations = func.__init__.__annotations__.copy()
-    else:
-        annotations = func.__annotations__.copy()
-        annotations.pop('return',None)
+    plan = get_filter_plan(func)
 
     def wrapper(*args,**kwargs):
-        filtered_kwargs = {
-            key: (annotations[key](value) if isinstance(value, (str, int, float, bool, list, dict)) and annotations[key] == Literal  else value)
-            for key, value in kwargs.items()
-            if key in annotations
-        }
-        
-        return func(*args, **filtered_kwargs)
+        return func(*args, **plan.filter(kwargs))
     return wrapper
 
 def GetDependency(kwargs:dict[str,Any],key:str|None = None,cls:type|None = None):
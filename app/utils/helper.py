@@ -1,6 +1,7 @@
 from inspect import getmro
 from abc import ABC
-from random import choice, seed
+from random import choices
+from app.classes.ulid import ULIDGenerator
 from string import hexdigits, digits, ascii_letters
 import time
 from inspect import currentframe, getargvalues
@@ -160,6 +161,21 @@ def flatten_dict(current_dict: dict[str, Any], from_keys: str = None, flattenedD
     return flattenedDict
 
 
+def key_accessor(key: str) -> Callable[[Any], Any]:
+    """
+    Getter of a flattened key (`content->images`) built once, reads the value straight from the nested dicts or
+    models instead of flattening the whole object on each access
+    """
+    parts = tuple(key.split(DICT_SEP))
+
+    def access(obj: Any) -> Any:
+        for part in parts:
+            obj = obj[part] if isinstance(obj, dict) else getattr(obj, part)
+        return obj
+
+    return access
+
+
 ################################   ** Class Helper **      #################################
 
 def getParentClass(cls: type):
@@ -224,19 +240,27 @@ def isprimitive_type(typ:type):
 
 ################################   ** Generate Helper **      #################################
 
+# NOTE the random module is seeded from the os at import and again in each forked child, seeding it with the clock
+# gave the same ids to the calls of the same tick
 def generateId(len):
-    seed(time.time())
-    return "".join(choice(alphanumeric) for _ in range(len))
+    return "".join(choices(alphanumeric, k=len))
 
 
 def generateRndNumber(len):
-    seed(time.time())
-    return "".join(choice(digits) for _ in range(len))
+    return "".join(choices(digits, k=len))
 
 
 def generateRndNumber(len):
-    seed(time.time())
-    return "".join(choice(hexdigits) for _ in range(len))
+    return "".join(choices(hexdigits, k=len))
+
+
+_ULID_GENERATOR = ULIDGenerator()
+
+def generateUlid() -> str:
+    """
+    Time sortable and unique id of 26 characters, see `ULIDGenerator`
+    """
+    return _ULID_GENERATOR.new()
 
 
 ################################## ** Base64 Helper ** #############################################
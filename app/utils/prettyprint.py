@@ -5,11 +5,13 @@ from colorama import Fore, Back, Style
 from colorama.ansi import clear_line, clear_screen, set_title
 import emoji
 from typing import Any, Callable, List, Literal
+import json
 import pprint
 import pyfiglet
 import time
 import sys
 from functools import wraps
+from threading import RLock
 import datetime as dt
 
 
@@ -145,6 +147,8 @@ def get_toggle_kwargs(key: str, kwargs: dict,):
 
 
 class PrettyPrinter:
+    # NOTE set for the whole process: no screen clears, sleeps nor prompts, the messages are written as json lines
+    headless: bool = False
 
     @staticmethod
     def cache(func: Callable) -> Callable:
@@ -157,13 +161,19 @@ class PrettyPrinter:
                 kwargs['show'] = True
 
             self: PrettyPrinter = args[0]
-            if saveable:
-                kwargs_prime = kwargs.copy()
-                kwargs_prime['saveable'] = False
-                kwargs_prime['show'] = True
-                self.buffer.append(
-                    {'func': func, 'args': args, 'kwargs': kwargs_prime,'now':dt.datetime.now()})
-            return func(*args, **kwargs)
+            if self.headless:
+                if func.__name__ != 'space_line':
+                    message = args[1] if len(args) > 1 else kwargs.get('message', kwargs.get('content'))
+                    self.event('log', level=func.__name__, message=message)
+                return
+            with self.lock:
+                if saveable:
+                    kwargs_prime = kwargs.copy()
+                    kwargs_prime['saveable'] = False
+                    kwargs_prime['show'] = True
+                    self.buffer.append(
+                        {'func': func, 'args': args, 'kwargs': kwargs_prime,'now':dt.datetime.now()})
+                return func(*args, **kwargs)
         return wrapper
 
     @staticmethod
@@ -179,6 +189,7 @@ class PrettyPrinter:
     def __init__(self):
         self.buffer: list[Callable] = []
         self.quiet= False
+        self.lock = RLock()  # NOTE the services of a same layer are built and print from several threads
 
     @if_show
     @cache
@@ -227,10 +238,23 @@ class PrettyPrinter:
             print()
 
     def clearScreen(self):
-        clearscreen()
+        if not self.headless:
+            clearscreen()
 
     def clearline(self):
-        clearline()
+        if not self.headless:
+            clearline()
+
+    def event(self, event: str, **fields):
+        """
+        Write a structured log line, only when headless
+        """
+        if not self.headless or self.quiet:
+            return
+        line = json.dumps({'ts': dt.datetime.now().isoformat(), 'event': event, **fields}, default=str)
+        with self.lock:
+            sys.stdout.write(line + '\n')
+            sys.stdout.flush()
 
     def show(self, pause_after=1, title='Communication - Service', pause_before=0, color=Fore.WHITE, clear_screen_after=False, print_stack=True, clear_stack=False, space_line=False):
         """
@@ -253,6 +277,8 @@ class PrettyPrinter:
         Returns:
         None
         """
+        if self.headless:
+            return
         time.sleep(pause_before)
         self.clearScreen()
         settitle(title)
@@ -278,6 +304,8 @@ class PrettyPrinter:
         ...
 
     def wait(self, timeout: float, press_to_continue: bool = True):
+        if self.headless:
+            return
         time.sleep(timeout)
         if press_to_continue:
             self.warning('Press to continue', saveable=False, position='both')
@@ -289,6 +317,8 @@ class PrettyPrinter:
         clear_line()
 
     def input(self, message: str, color=Fore.WHITE, emoji_code: str = '', position: EmojiPosition = 'none') -> None | str:
+        if self.headless:
+            raise SkipInputException
         try:
             message = base_message(
                 message, color, emoji_code=emoji_code, position=position,)
@@ -1,7 +1,9 @@
+import time
+BOOT_TIME = time.perf_counter()
 from argparse import ArgumentParser
 from enum import Enum
 from app.signal_handler import SignalHandler_
-from app.utils.prettyprint import PrettyPrinter_
+from app.utils.prettyprint import PrettyPrinter, PrettyPrinter_
 
 
 class RunMode(Enum):
@@ -9,6 +11,7 @@ class RunMode(Enum):
     CREATE = "create"
     EDIT = "edit"
     REGISTER = "register"
+    SERVE = "serve"  # NOTE non interactive: no prompts, sleeps nor screen clears, json logs
 
 
 parser = ArgumentParser(description="Communication Service Application")
@@ -21,12 +24,20 @@ args = parser.parse_args()
 mode = RunMode(args.mode)
 config_file = args.config
 
+if mode == RunMode.SERVE:
+    PrettyPrinter.headless = True
+    SignalHandler_.set_headless()
+    PrettyPrinter_.event('boot', mode=mode.value, config=config_file)
+
 PrettyPrinter_.show(1, print_stack=False)
 ########################################################################
-from app.container import build_container, Get
-build_container()
+from app.container import build_container, Get, Preload
+# NOTE the config file is read through ConfigService and the ressources import app.task, which needs the container, so
+# it is built before the config is parsed: in serve mode nothing is built yet, the closure of the services of the
+# selected ressources is preloaded once the apps are known
+build_container(roots=[] if mode == RunMode.SERVE else None)
 
-from app.server.application import AppParameter, RESSOURCES
+from app.server.application import AppParameter, Application, RESSOURCES
 from app.server.apps_registration import createApps, editApps,start_applications
 from app.server.access_registration import prompt_client_registration
 from app.server.middleware import MIDDLEWARE
@@ -53,8 +64,26 @@ apps_data = configService.config_json_app.data
 #         config_file = inputFilePath("Enter a valid path to the config file",)
 #     else:
 #         c_flag = False
+
+Application.boot_time = BOOT_TIME
+
+def fail_fast(reason: str, **fields):
+    PrettyPrinter_.event('invalid_config', config=config_file, reason=reason, **fields)
+    exit(1)
+
 valid = True
-if not apps_data or ConfigAppConstant.META_KEY not in apps_data or ConfigAppConstant.APPS_KEY not in apps_data or not apps_data[ConfigAppConstant.APPS_KEY]:
+if mode == RunMode.SERVE:
+    if not configService.config_json_app.exists:
+        fail_fast('not found')
+    if not apps_data or ConfigAppConstant.META_KEY not in apps_data or ConfigAppConstant.APPS_KEY not in apps_data or not apps_data[ConfigAppConstant.APPS_KEY]:
+        fail_fast('no apps data')
+    for app in apps_data[ConfigAppConstant.APPS_KEY]:
+        # NOTE AppParameter.fromJSON silently drops the unknown names
+        unknown = [r for r in app.get('ressources', []) if r not in RESSOURCES] + [m for m in app.get('middlewares', []) if m not in MIDDLEWARE]
+        if unknown:
+            fail_fast('unknown ressources or middlewares', app=app.get('title'), unknown=unknown)
+
+elif not apps_data or ConfigAppConstant.META_KEY not in apps_data or ConfigAppConstant.APPS_KEY not in apps_data or not apps_data[ConfigAppConstant.APPS_KEY]:
     mode = RunMode.CREATE
     valid = False
     PrettyPrinter_.show(0, print_stack=False)
@@ -97,6 +126,15 @@ while True:
             PrettyPrinter_.success(f"Apps Config successfully loaded")
             break
 
+        case RunMode.SERVE:
+            try:
+                apps_data = [AppParameter.fromJSON(app, RESSOURCES, MIDDLEWARE) for app in apps_data[ConfigAppConstant.APPS_KEY]]
+            except KeyError as e:
+                fail_fast('missing key', key=str(e))
+            PrettyPrinter_.event('config_loaded', apps=[app.title for app in apps_data], seconds=round(time.perf_counter() - BOOT_TIME, 4))
+            Preload(*Application.services, *{service for app in apps_data for service in app.services})
+            break
+
         case RunMode.REGISTER:
             #PrettyPrinter_.error("{EDIT} mode disabled for now")
             #exit(0) # BUG DISABLED FOR
@@ -0,0 +1,35 @@
+"""
+Throughput of the id generators: the previous generateId, which seeded the random module with the clock on every call,
+against the ULID generator used for the request, schedule, room, run and generation ids. Also counts the duplicates
+drawn in a tight loop.
+
+usage: python -m scripts.bench_ids [--ids 200000]
+"""
+from argparse import ArgumentParser
+from random import choice, seed
+import time
+from app.utils.helper import alphanumeric, generateId, generateUlid
+
+
+def clock_seeded_id(len):
+    seed(time.time())
+    return "".join(choice(alphanumeric) for _ in range(len))
+
+
+def measure(generate, ids: int):
+    start = time.perf_counter()
+    drawn = [generate() for _ in range(ids)]
+    elapsed = time.perf_counter() - start
+    return ids / elapsed, ids - len(set(drawn)), drawn == sorted(drawn)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Id generators benchmark')
+    parser.add_argument('--ids', type=int, default=200_000)
+    args = parser.parse_args()
+
+    for name, generate in (('clock seeded generateId(25)', lambda: clock_seeded_id(25)),
+                           ('generateId(25)', lambda: generateId(25)),
+                           ('generateUlid()', generateUlid)):
+        rate, duplicates, ordered = measure(generate, args.ids)
+        print(f'{name:<28}: {rate:>12,.0f} ids/s  {duplicates} duplicates  sorted: {ordered}')
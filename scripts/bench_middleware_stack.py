@@ -0,0 +1,196 @@
+"""
+In-process load test of the middleware stack: the previous BaseHTTPMiddleware implementations against the pure ASGI ones.
+
+Both stacks wrap the same FastAPI app behind SlowAPIMiddleware, in the order given by MiddlewarePriority, with offline
+stand-ins of the security, auth and background task services. The requests are driven directly through the ASGI
+interface with a fixed concurrency, so the figures only hold the cost of the stack, not the one of the network.
+
+usage: python -m scripts.bench_middleware_stack [--requests 5000] [--concurrency 50]
+"""
+from argparse import ArgumentParser
+import asyncio
+import time
+from app.container import build_container
+build_container(quiet=True)
+from fastapi import FastAPI, Request, Response, status
+from fastapi.responses import JSONResponse
+from slowapi.middleware import SlowAPIMiddleware
+from starlette.middleware.base import BaseHTTPMiddleware
+from app.server.application import GlobalLimiter
+from app.server.middleware import AnalyticsMiddleware, BackgroundTaskMiddleware, JWTAuthMiddleware, ProcessTimeMiddleWare, SecurityMiddleWare
+from app.utils.constant import ConfigAppConstant, HTTPHeaderConstant
+from app.utils.dependencies import get_api_key, get_bearer_token_from_request, get_client_ip, get_response_id
+from app.utils.helper import generateId
+
+
+class FakeConfig:
+    config_json_app = type('ConfigJSON', (), {'data': {ConfigAppConstant.META_KEY: {ConfigAppConstant.EXPIRATION_TIMESTAMP_KEY: time.time() + 3600}}})
+
+
+class FakeSecurityService:
+    def verify_server_access(self, token: str, sent_ip_addr) -> bool:
+        return token == 'api-key'
+
+
+class FakeJWTAuthService:
+    permission = {'roles': [], 'allowed_routes': {}, 'allowed_assets': [], 'issued_for': '127.0.0.1'}
+
+    def verify_permission(self, token: str, issued_for: str):
+        return self.permission
+
+
+class FakeBackgroundTaskService:
+    def __init__(self):
+        self.sharing_task = {}
+
+    def _register_tasks(self, request_id: str):
+        self.sharing_task[request_id] = []
+
+    def _delete_tasks(self, request_id: str):
+        self.sharing_task.pop(request_id, None)
+
+    async def __call__(self, request_id: str):
+        self._delete_tasks(request_id)
+
+
+SERVICES = {
+    'configService': FakeConfig(),
+    'securityService': FakeSecurityService(),
+    'jwtService': FakeJWTAuthService(),
+    'backgroundTaskService': FakeBackgroundTaskService(),
+}
+
+
+def offline(cls):
+    # NOTE replace the container injection with the stand-ins
+    def inject_middleware(self, *args, **kwargs):
+        for name, service in SERVICES.items():
+            setattr(self, name, service)
+    return type(cls.__name__, (cls,), {'inject_middleware': inject_middleware, '__module__': __name__})
+
+
+######################################################                 ######################################################
+
+class LegacyProcessTimeMiddleWare(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        start_time = time.time()
+        response: Response = await call_next(request)
+        response.headers["X-Process-Time"] = str(time.time() - start_time) + ' (s)'
+        return response
+
+
+class LegacyAnalyticsMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        return await call_next(request)
+
+
+class LegacySecurityMiddleWare(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        configService = SERVICES['configService']
+        timestamp = configService.config_json_app.data[ConfigAppConstant.META_KEY][ConfigAppConstant.EXPIRATION_TIMESTAMP_KEY]
+        if timestamp - time.time() < 0:
+            return JSONResponse(status_code=status.HTTP_401_UNAUTHORIZED, content={"message": "Unauthorized"})
+        request_api_key = get_api_key(request)
+        if request_api_key is None or not SERVICES['securityService'].verify_server_access(request_api_key, get_client_ip(request)):
+            return Response(status_code=status.HTTP_401_UNAUTHORIZED, content="Unauthorized")
+        return await call_next(request)
+
+
+class LegacyJWTAuthMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        try:
+            token = get_bearer_token_from_request(request)
+            request.state.authPermission = SERVICES['jwtService'].verify_permission(token, get_client_ip(request))
+        except KeyError:
+            return JSONResponse('Error while getting value', status_code=status.HTTP_400_BAD_REQUEST)
+        return await call_next(request)
+
+
+class LegacyBackgroundTaskMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        backgroundTaskService = SERVICES['backgroundTaskService']
+        request_id = generateId(25)
+        backgroundTaskService._register_tasks(request_id)
+        request.state.request_id = request_id
+        response = await call_next(request)
+        rq_response_id = get_response_id(response)
+        if rq_response_id:
+            asyncio.create_task(backgroundTaskService(rq_response_id))
+        else:
+            backgroundTaskService._delete_tasks(request_id)
+        return response
+
+
+######################################################                 ######################################################
+
+def build_app(middlewares: list[type]):
+    app = FastAPI()
+    app.state.limiter = GlobalLimiter
+
+    @app.get('/ping')
+    def ping(request: Request):
+        return {'request_id': request.state.request_id, 'roles': request.state.authPermission['roles']}
+
+    app.add_middleware(SlowAPIMiddleware)
+    # NOTE the middlewares are given in the same order as Application.add_middlewares: highest priority value first
+    for middleware in middlewares:
+        app.add_middleware(middleware)
+    return app
+
+
+LEGACY_STACK = [LegacyBackgroundTaskMiddleware, LegacyJWTAuthMiddleware, LegacySecurityMiddleWare, LegacyAnalyticsMiddleware, LegacyProcessTimeMiddleWare]
+ASGI_STACK = [offline(BackgroundTaskMiddleware), offline(JWTAuthMiddleware), offline(SecurityMiddleWare), offline(AnalyticsMiddleware), ProcessTimeMiddleWare]
+
+
+async def request(app, latencies: list[float]):
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': '/ping', 'raw_path': b'/ping', 'query_string': b'', 'root_path': '',
+        'headers': [(HTTPHeaderConstant.API_KEY_HEADER.lower().encode(), b'api-key'), (b'authorization', b'Bearer token')],
+        'client': ('127.0.0.1', 50000), 'server': ('127.0.0.1', 8000),
+    }
+    status_code = None
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        nonlocal status_code
+        if message['type'] == 'http.response.start':
+            status_code = message['status']
+
+    start = time.perf_counter()
+    await app(scope, receive, send)
+    latencies.append(time.perf_counter() - start)
+    assert status_code == 200, status_code
+
+
+async def load(app, requests: int, concurrency: int):
+    latencies: list[float] = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded():
+        async with semaphore:
+            await request(app, latencies)
+
+    await request(app, [])  # NOTE builds the middleware stack
+    start = time.perf_counter()
+    await asyncio.gather(*(bounded() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return requests / elapsed, latencies[int(len(latencies) * 0.99) - 1]
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Middleware stack load test')
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    args = parser.parse_args()
+
+    legacy_rps, legacy_p99 = asyncio.run(load(build_app(LEGACY_STACK), args.requests, args.concurrency))
+    asgi_rps, asgi_p99 = asyncio.run(load(build_app(ASGI_STACK), args.requests, args.concurrency))
+
+    print(f'{args.requests} requests, concurrency {args.concurrency}, 5 middlewares + SlowAPIMiddleware')
+    print(f'BaseHTTPMiddleware stack : {legacy_rps:8.0f} req/s  p99 {legacy_p99 * 1000:.2f} ms')
+    print(f'pure ASGI stack          : {asgi_rps:8.0f} req/s  p99 {asgi_p99 * 1000:.2f} ms')
+    print(f'speedup                  : x{asgi_rps / legacy_rps:.2f}')
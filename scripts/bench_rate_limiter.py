@@ -0,0 +1,66 @@
+"""
+Benchmark of the distributed rate limiter: every hit going through the GCRA script against the local token bucket
+pre-admission, and the number of requests admitted when several processes share the same limit.
+
+Runs against fakeredis (pip install fakeredis lupa) unless a redis url is given. fakeredis lives in the same process,
+so the gain of the local buckets only grows with the network round trip of a real redis.
+
+usage: python -m scripts.bench_rate_limiter [--hits 20000] [--processes 4] [--redis-url redis://localhost:6379/0]
+"""
+from argparse import ArgumentParser
+import time
+from limits import parse
+from redis import Redis
+from app.classes.rate_limiter import DistributedRateLimiter
+
+
+def redis_factory(redis_url: str | None):
+    if redis_url:
+        return lambda: Redis.from_url(redis_url)
+    import fakeredis
+    server = fakeredis.FakeServer()
+    return lambda: fakeredis.FakeRedis(server=server)
+
+
+def timeit(limiter: DistributedRateLimiter, limit: str, hits: int):
+    item = parse(limit)
+    limiter.clear(item, 'bench', 'timeit')
+    start = time.perf_counter()
+    for _ in range(hits):
+        limiter.hit(item, 'bench', 'timeit')
+    return (time.perf_counter() - start) / hits
+
+
+def shared_limit(limiters: list[DistributedRateLimiter], limit: str, hits: int):
+    item = parse(limit)
+    limiters[0].clear(item, 'bench', 'shared')
+    admitted = 0
+    for i in range(hits):
+        admitted += limiters[i % len(limiters)].hit(item, 'bench', 'shared')
+    return admitted
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Distributed rate limiter benchmark')
+    parser.add_argument('--hits', type=int, default=20_000)
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--redis-url', type=str, default=None)
+    args = parser.parse_args()
+
+    factory = redis_factory(args.redis_url)
+    limit = '1000000/minute'
+
+    redis_only = DistributedRateLimiter(factory(), batch_max=1)
+    local = DistributedRateLimiter(factory())
+    redis_time = timeit(redis_only, limit, args.hits)
+    local_time = timeit(local, limit, args.hits)
+
+    print(f'{args.hits} hits on {limit}')
+    print(f'redis on every hit    : {redis_time * 1e6:.2f} us/hit ({redis_only.metrics["redis_calls"]} scripts)')
+    print(f'local pre-admission   : {local_time * 1e6:.2f} us/hit ({local.metrics["redis_calls"]} scripts)')
+    print(f'speedup               : x{redis_time / local_time:.1f}')
+
+    limiters = [DistributedRateLimiter(factory()) for _ in range(args.processes)]
+    for shared in ('10000/minute', '20/minute'):
+        admitted = shared_limit(limiters, shared, 3 * int(shared.split('/')[0]))
+        print(f'{args.processes} processes sharing {shared:<13}: {admitted} admitted out of {3 * int(shared.split("/")[0])} hits')
@@ -0,0 +1,206 @@
+"""
+Micro benchmark of the per-call overhead of the decorator pipeline of EmailTemplateRessource.send_emailTemplate.
+
+The route stack (class and method decorators) is replayed with offline stand-ins of the same kind: permissions,
+handlers, pipes and guards given as classes or instances. The `legacy` stack reproduces the previous callbacks that
+instantiated the classes and rebuilt the handler chain on every call, the `compiled` stack goes through the current
+decorators and `BaseHTTPRessource._stack_callback`.
+
+usage: python -m scripts.bench_route_pipeline [--calls 100000]
+"""
+from argparse import ArgumentParser
+import functools
+import time
+from app.container import build_container
+build_container(quiet=True)
+from app.definition._ressource import BaseHTTPRessource, HTTPRessourceMetaClass, UseHandler, UsePermission, UsePipe, UseGuard
+from app.definition._utils_decorator import Guard, Handler, Permission, Pipe
+from app.utils.constant import SpecialKeyParameterConstant
+
+
+class RoutePermission(Permission):
+    def permission(self, class_name: str, func_meta: dict, authPermission: dict):
+        return True
+
+
+class AssetPermission(Permission):
+    def permission(self, template: str, scheduler: dict, authPermission: dict):
+        return True
+
+
+class ServiceHandler(Handler):
+    def handle(self, function, *args, **kwargs):
+        return function(*args, **kwargs)
+
+
+class TaskHandler(Handler):
+    def handle(self, function, *args, **kwargs):
+        return function(*args, **kwargs)
+
+
+class TemplateHandler(Handler):
+    def handle(self, function, *args, **kwargs):
+        return function(*args, **kwargs)
+
+
+class TaskPipe(Pipe):
+    def __init__(self):
+        super().__init__(True)
+
+    def pipe(self, scheduler: dict):
+        return {'scheduler': scheduler}
+
+
+class TemplatePipe(Pipe):
+    def __init__(self):
+        super().__init__(True)
+
+    def pipe(self, template: str):
+        return {'template': template}
+
+
+class TaskGuard(Guard):
+    def guard(self, scheduler: dict):
+        return True, ''
+
+
+######################################################                 ######################################################
+
+def legacy_permission(permissions, class_name, meta):
+    def wrapper(function):
+        @functools.wraps(function)
+        def callback(*args, **kwargs):
+            kwargs_prime = kwargs.copy()
+            kwargs_prime[SpecialKeyParameterConstant.CLASS_NAME_SPECIAL_KEY_PARAMETER] = class_name
+            kwargs_prime[SpecialKeyParameterConstant.META_SPECIAL_KEY_PARAMETER] = meta
+            for permission in permissions:
+                if type(permission) == type:
+                    flag = permission().do(*args, **kwargs_prime)
+                elif isinstance(permission, Permission):
+                    flag = permission.do(*args, **kwargs_prime)
+                else:
+                    flag = permission(*args, **kwargs_prime)
+                if not flag:
+                    raise PermissionError
+            return function(*args, **kwargs)
+        return callback
+    return wrapper
+
+
+def legacy_handler(handlers):
+    def wrapper(function):
+        @functools.wraps(function)
+        def callback(*args, **kwargs):
+            def handler_proxy(handler, f):
+                def delegator(*a, **k):
+                    if type(handler) == type:
+                        return handler().do(f, *a, **k)
+                    elif isinstance(handler, Handler):
+                        return handler.do(f, *a, **k)
+                    return handler(f, *a, **k)
+                return delegator
+
+            handler_prime = function
+            for handler in reversed(handlers):
+                handler_prime = handler_proxy(handler, handler_prime)
+            return handler_prime(*args, **kwargs)
+        return callback
+    return wrapper
+
+
+def legacy_pipe(pipes):
+    def wrapper(function):
+        @functools.wraps(function)
+        def callback(*args, **kwargs):
+            kwargs_prime = kwargs.copy()
+            for pipe in pipes:
+                if type(pipe) == type:
+                    result = pipe().do(*args, **kwargs_prime)
+                elif isinstance(pipe, Pipe):
+                    result = pipe.do(*args, **kwargs_prime)
+                else:
+                    result = pipe(*args, **kwargs_prime)
+                kwargs_prime.update(result)
+            kwargs.update(kwargs_prime)
+            return function(*args, **kwargs)
+        return callback
+    return wrapper
+
+
+def legacy_guard(guards):
+    def wrapper(function):
+        @functools.wraps(function)
+        def callback(*args, **kwargs):
+            for guard in guards:
+                if type(guard) == type:
+                    flag, message = guard().do(*args, **kwargs)
+                else:
+                    flag, message = guard.do(*args, **kwargs)
+                if not flag:
+                    raise PermissionError(message)
+            return function(*args, **kwargs)
+        return callback
+    return wrapper
+
+
+######################################################                 ######################################################
+
+@UseHandler(ServiceHandler, TaskHandler)
+@UsePermission(RoutePermission)
+@UsePipe(TaskPipe)
+class BenchEmailRessource(metaclass=HTTPRessourceMetaClass):
+
+    @UsePermission(AssetPermission())
+    @UseHandler(TemplateHandler)
+    @UsePipe(TemplatePipe())
+    @UseGuard(TaskGuard())
+    @BaseHTTPRessource.HTTPRoute("/template/{template}")
+    def send_emailTemplate(self, template: str, scheduler: dict, x_request_id: str = None, authPermission: dict = None):
+        return template
+
+
+def send_emailTemplate(self, template: str, scheduler: dict, x_request_id: str = None, authPermission: dict = None):
+    return template
+
+
+def build_legacy(instance):
+    meta = BenchEmailRessource.send_emailTemplate.meta
+    class_name = BenchEmailRessource.__name__
+    # NOTE same order as the priorities: permissions > handlers > pipes > guards > route
+    callback = functools.partial(send_emailTemplate, instance)
+    callback = legacy_guard((TaskGuard(),))(callback)
+    callback = legacy_pipe((TemplatePipe(),))(callback)
+    callback = legacy_pipe((TaskPipe,))(callback)
+    callback = legacy_handler((TemplateHandler,))(callback)
+    callback = legacy_handler((ServiceHandler, TaskHandler))(callback)
+    callback = legacy_permission((AssetPermission(),), class_name, meta)(callback)
+    callback = legacy_permission((RoutePermission,), class_name, meta)(callback)
+    return callback
+
+
+def timeit(func, calls: int):
+    kwargs = {'template': 'otp', 'scheduler': {'task_name': 'task_send_template_mail'}, 'x_request_id': 'rq', 'authPermission': {}}
+    start = time.perf_counter()
+    for _ in range(calls):
+        func(**kwargs)
+    return (time.perf_counter() - start) / calls
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Route decorator pipeline benchmark')
+    parser.add_argument('--calls', type=int, default=100_000)
+    args = parser.parse_args()
+
+    instance = BenchEmailRessource()
+    BaseHTTPRessource._stack_callback(instance)
+    legacy = build_legacy(instance)
+    direct = functools.partial(send_emailTemplate, instance)
+
+    direct_time = timeit(direct, args.calls)
+    legacy_time = timeit(legacy, args.calls)
+    compiled_time = timeit(instance.send_emailTemplate, args.calls)
+
+    print(f'{args.calls} calls of send_emailTemplate with 2 permissions, 3 handlers, 2 pipes and 1 guard')
+    print(f'legacy pipeline   : {(legacy_time - direct_time) * 1e6:.2f} us/call overhead')
+    print(f'compiled pipeline : {(compiled_time - direct_time) * 1e6:.2f} us/call overhead')
+    print(f'speedup           : x{(legacy_time - direct_time) / (compiled_time - direct_time):.1f}')
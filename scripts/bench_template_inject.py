@@ -0,0 +1,61 @@
+"""
+Benchmark the compiled placeholder engine of HTMLTemplate against the previous per-key regex substitution.
+
+usage: python -m scripts.bench_template_inject [--keys 200] [--size 200000] [--runs 50]
+"""
+from argparse import ArgumentParser
+import re
+import time
+from app.classes.template import CompiledContent
+from app.utils.helper import flatten_dict
+
+
+def regex_inject(content_html: str, flattened_data: dict):
+    # NOTE previous HTMLTemplate.inject path: one compile and one full pass over the document per key
+    for key in flattened_data:
+        regex = re.compile(rf"{{{{{key}}}}}")
+        content_html = regex.sub(str(flattened_data[key]), content_html)
+    return content_html
+
+
+def build_document(keys: int, size: int):
+    data = {'section': {}}
+    parts = ['<html><head><title>bench</title></head><body>']
+    filler = '<p>' + 'lorem ipsum dolor sit amet ' * 8 + '</p>\n'
+    for i in range(keys):
+        data['section'][f'key{i}'] = f'value {i}'
+        parts.append(f'<span>{{{{section->key{i}}}}}</span>\n')
+    while sum(len(p) for p in parts) < size:
+        parts.append(filler)
+    parts.append('</body></html>')
+    return ''.join(parts), data
+
+
+def timeit(func, runs: int):
+    start = time.perf_counter()
+    for _ in range(runs):
+        func()
+    return (time.perf_counter() - start) / runs
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='HTMLTemplate.inject benchmark')
+    parser.add_argument('--keys', type=int, default=200)
+    parser.add_argument('--size', type=int, default=200_000)
+    parser.add_argument('--runs', type=int, default=50)
+    args = parser.parse_args()
+
+    content, data = build_document(args.keys, args.size)
+    flattened = flatten_dict(data, flattenedDict={})
+    compiled = CompiledContent(content)
+
+    assert compiled.render(flattened) == regex_inject(content, flattened)
+
+    regex_time = timeit(lambda: regex_inject(content, flattened), args.runs)
+    compiled_time = timeit(lambda: compiled.render(flatten_dict(data, flattenedDict={})), args.runs)
+    compile_time = timeit(lambda: CompiledContent(content), args.runs)
+
+    print(f'document: {len(content)} chars, {args.keys} keys, {args.runs} runs')
+    print(f'regex path    : {regex_time * 1000:.3f} ms/render')
+    print(f'compiled path : {compiled_time * 1000:.3f} ms/render (one-time compile {compile_time * 1000:.3f} ms)')
+    print(f'speedup       : x{regex_time / compiled_time:.1f}')
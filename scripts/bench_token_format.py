@@ -0,0 +1,56 @@
+"""
+Encode and decode time and size of the auth tokens: the v1 layout (base64 then Fernet, a new Fernet per call) against
+the v2 layout (Fernet over the jwt, cipher cached per key). Runs on a sample AuthPermission, no container needed.
+
+usage: python -m scripts.bench_token_format [--tokens 20000] [--routes 10]
+"""
+from argparse import ArgumentParser
+import base64
+import time
+from cryptography.fernet import Fernet
+import jwt
+from app.services.security_service import EncryptDecryptInterface
+
+SECRET = 'bench-secret'
+
+
+def v1_encode(value: str, key: bytes) -> str:
+    value = base64.b64encode(value.encode()).decode()
+    return Fernet(key).encrypt(value.encode()).decode()
+
+
+def v1_decode(value: str, key: bytes) -> str:
+    return base64.b64decode(Fernet(key).decrypt(value.encode())).decode()
+
+
+def timeit(func, values: list, key: bytes):
+    start = time.perf_counter()
+    results = [func(value, key) for value in values]
+    return (time.perf_counter() - start) / len(values), results
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Token format benchmark')
+    parser.add_argument('--tokens', type=int, default=20_000)
+    parser.add_argument('--routes', type=int, default=10)
+    args = parser.parse_args()
+
+    key = Fernet.generate_key()
+    codec = EncryptDecryptInterface()
+    permission = {'generation_id': '01M53ZCB0N8QTVH694E01HT7CM', 'issued_for': '10.0.0.1', 'created_at': time.time(),
+                  'expired_at': time.time() + 3600, 'role_mask': 9, 'allowed_assets': [],
+                  'allowed_routes': {f'Ressource{i}': {'scope': 'custom', 'custom_routes': [f'_route_{i}POST']} for i in range(args.routes)}}
+    jwts = [jwt.encode({**permission, 'created_at': permission['created_at'] + i}, SECRET, algorithm='HS256') for i in range(args.tokens)]
+
+    v1_enc, v1_tokens = timeit(v1_encode, jwts, key)
+    v2_enc, v2_tokens = timeit(lambda value, key: codec._encode_value(value, key, 2), jwts, key)
+    v1_dec, v1_values = timeit(v1_decode, v1_tokens, key)
+    v2_dec, v2_values = timeit(codec._decode_value, v2_tokens, key)
+    v1_by_v2, _ = timeit(codec._decode_value, v1_tokens, key)
+    assert v1_values == v2_values == jwts
+
+    print(f'{args.tokens} tokens, jwt of {len(jwts[0])} bytes')
+    print(f'encode  v1 {v1_enc * 1e6:7.2f} us   v2 {v2_enc * 1e6:7.2f} us   x{v1_enc / v2_enc:.2f}')
+    print(f'decode  v1 {v1_dec * 1e6:7.2f} us   v2 {v2_dec * 1e6:7.2f} us   x{v1_dec / v2_dec:.2f}')
+    print(f'decode of v1 tokens through the v2 decoder: {v1_by_v2 * 1e6:.2f} us')
+    print(f'size    v1 {len(v1_tokens[0])} bytes   v2 {len(v2_tokens[0])} bytes   -{1 - len(v2_tokens[0]) / len(v1_tokens[0]):.0%}')
@@ -0,0 +1,56 @@
+"""
+Token issuance throughput: the previous generate_custom_api_key, which slept random()/100 seconds per key, against the
+monotonic nonce, serial and through the chunked executor of the bulk route.
+
+Builds the container, the same environment as the server is needed (JWT_SECRET_KEY, ON_TOP_SECRET_KEY,
+API_ENCRYPT_TOKEN, SMTP_EMAIL_* ...).
+
+usage: python -m scripts.bench_token_issuance [--clients 2000] [--sleeping 50]
+"""
+from argparse import ArgumentParser
+from random import random
+import time
+from app.container import build_container, Get
+
+
+def sleeping_api_key(securityService, ip_address: str):
+    time.sleep(random() / 100)
+    data = ip_address + '|' + str(time.time_ns()) + '|' + securityService.configService.API_KEY
+    return securityService._encode_value(data, securityService.configService.API_ENCRYPT_TOKEN)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Token issuance benchmark')
+    parser.add_argument('--clients', type=int, default=2000)
+    parser.add_argument('--sleeping', type=int, default=50, help='clients issued with the previous sleeping keys')
+    args = parser.parse_args()
+
+    build_container(quiet=True)
+    from app.ressources.admin_ressource import AdminRessource
+    from app.services.security_service import JWTAuthService, SecurityService
+    Get(JWTAuthService).generation_id = 'bench'
+    securityService: SecurityService = Get(SecurityService)
+    admin = AdminRessource()
+    clients = [{'issued_for': f'10.0.{i // 256}.{i % 256}', 'allowed_routes': {}, 'roles': ['PUBLIC']} for i in range(args.clients)]
+
+    start = time.perf_counter()
+    for client in clients[:args.sleeping]:
+        sleeping_api_key(securityService, client['issued_for'])
+    sleeping = (time.perf_counter() - start) / args.sleeping
+
+    start = time.perf_counter()
+    admin._create_tokens(clients)
+    serial = (time.perf_counter() - start) / args.clients
+
+    start = time.perf_counter()
+    first_line = None
+    for lines in admin._stream_tokens(clients):
+        first_line = first_line or time.perf_counter() - start
+    streamed = (time.perf_counter() - start) / args.clients
+
+    keys = [securityService.generate_custom_api_key('10.0.0.1') for _ in range(10_000)]
+    print(f'{args.clients} clients')
+    print(f'sleeping api key only : {sleeping * 1e3:.2f} ms/client ({sleeping * args.clients:.1f}s for all)')
+    print(f'serial issuance       : {serial * 1e3:.3f} ms/client ({serial * args.clients:.2f}s)')
+    print(f'bulk ndjson stream    : {streamed * 1e3:.3f} ms/client ({streamed * args.clients:.2f}s, first chunk after {first_line * 1e3:.1f} ms)')
+    print(f'duplicate api keys    : {len(keys) - len(set(keys))} out of {len(keys)} issued for the same ip')
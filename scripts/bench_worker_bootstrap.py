@@ -0,0 +1,67 @@
+"""
+Cold start and memory of a celery worker process: the full container build against the worker bootstrap of app.task,
+which only builds the services the registered tasks refer to.
+
+Each mode runs in a fresh interpreter that imports app.task, the figures are the wall time of the import (container
+build included) and the peak RSS of the process. The same environment as the worker is needed (SMTP_EMAIL_* ...).
+
+usage: python -m scripts.bench_worker_bootstrap [--runs 3]
+"""
+from argparse import ArgumentParser
+import json
+import subprocess
+import sys
+
+FULL = """
+import resource, time
+start = time.perf_counter()
+from app.container import build_container
+build_container(False)
+import app.task
+"""
+
+WORKER = """
+import resource, shutil, sys, time
+start = time.perf_counter()
+sys.argv[0] = shutil.which('celery').replace('.EXE', '')
+import app.task
+"""
+
+REPORT = """
+from app.container import CONTAINER
+elapsed = time.perf_counter() - start
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+built = len(CONTAINER.build_times)
+print('RESULT', __import__('json').dumps({'elapsed': elapsed, 'rss': rss, 'built': built}))
+"""
+
+
+def run(code: str) -> dict:
+    process = subprocess.run([sys.executable, '-c', code + REPORT], capture_output=True, text=True)
+    for line in reversed(process.stdout.splitlines()):
+        if line.startswith('RESULT '):
+            return json.loads(line[len('RESULT '):])
+    raise RuntimeError(process.stderr[-2000:])
+
+
+def measure(code: str, runs: int) -> dict:
+    results = [run(code) for _ in range(runs)]
+    return {
+        'elapsed': min(r['elapsed'] for r in results),
+        'rss': min(r['rss'] for r in results),
+        'built': results[0]['built'],
+    }
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Celery worker bootstrap benchmark')
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    full = measure(FULL, args.runs)
+    worker = measure(WORKER, args.runs)
+
+    print(f'best of {args.runs} runs')
+    print(f'full build       : {full["elapsed"]:.2f}s  {full["rss"] / 1024:.1f} MiB  {full["built"]} services built')
+    print(f'worker bootstrap : {worker["elapsed"]:.2f}s  {worker["rss"] / 1024:.1f} MiB  {worker["built"]} services built')
+    print(f'cold start       : x{full["elapsed"] / worker["elapsed"]:.2f}')